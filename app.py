@@ -1,14 +1,34 @@
 # ====================================================
 # 0. アプリケーション開発に必要なライブラリの読み込み
 # ====================================================
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, session
+from flask import Flask, render_template, stream_template, request, redirect, url_for, send_from_directory, flash, session, jsonify, Response, stream_with_context, g
 import os
+import json
+import time
+import base64
+import hashlib
+import hmac
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 import pandas as pd
-import joblib # 機械学習モデルの読み込み用
 import numpy as np # 数値計算用
+import lookup_table # (Z, ωτe) ルックアップテーブルによる高速予測
+import inverse_fit # 測定した G', G'' からの Z・τe の推定 (逆フィット)
+import model_registry # バージョン付きのモデル置き場と無停止の切り替え
+from prediction_cache import PredictionCache # 予測結果のメモ化キャッシュ
+import measurement_cache # アップロードファイルの解析結果キャッシュ
+import summary_stats # ファイルごとのマージ可能な要約統計
+import blob_store # アップロードファイルのコンテンツアドレス型ストレージ
+import jobs # バックグラウンドジョブ (分析の非同期実行)
+import exact_physics # LM(2002) の計算を直接使う厳密予測
+import metrics # ルート・処理段階ごとの計測と /metrics の出力
+import request_profiler # 遅いリクエストのプロファイル記録
+import downsample # グラフ表示用の曲線の間引き
+import measurement_query # 測定データの中身による横断検索
+import bulk_import # 複数ファイル・ZIP の一括登録
 
 # ====================================================
 # 1. アプリケーションの初期設定
@@ -26,57 +46,548 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# アップロードファイルを内容のハッシュで保存するフォルダの設定 (同じ内容のファイルは1つだけ保存する)
+app.config['OBJECTS_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'objects')
+
+# 解析済みデータ (列ごとの .npz サイドカー) を保存するフォルダの設定
+app.config['PARSED_FOLDER'] = measurement_cache.PARSED_FOLDER
+
+# 分析時にファイルを並列で読み込むスレッド数と、1ファイルあたりのタイムアウト (秒)
+# (ディスク読み込みの待ち時間も重ねられるよう、CPU数より少し多めにする)
+app.config['ANALYZE_MAX_WORKERS'] = min(8, (os.cpu_count() or 1) + 4)
+app.config['ANALYZE_FILE_TIMEOUT'] = 60
+
+# 一括登録 (/upload/bulk, python bulk_import.py) の設定
+# 1回に登録できるファイル数と合計サイズ (ZIP は展開後のサイズ)、保存・解析を並列に行うスレッド数
+app.config['BULK_MAX_FILES'] = 1000
+app.config['BULK_MAX_BYTES'] = 2 * 1024**3
+app.config['BULK_MAX_WORKERS'] = app.config['ANALYZE_MAX_WORKERS']
+
+# バックグラウンド分析ジョブの設定 (同時実行数・受け付ける実行待ち件数・保存する終了済みジョブ数)
+app.config['JOB_MAX_WORKERS'] = 2
+app.config['JOB_MAX_PENDING'] = 20
+app.config['JOB_MAX_STORED'] = 1000
+# 待機中・実行中のジョブの生存確認 (heartbeat_at) を更新する間隔と、途絶えたジョブを中断とみなすまでの秒数
+# (複数のワーカープロセスで動かす場合も、異常終了したプロセスのジョブが残り続けないようにする)
+app.config['JOB_HEARTBEAT_SECONDS'] = jobs.HEARTBEAT_SECONDS
+app.config['JOB_STALE_SECONDS'] = jobs.STALE_SECONDS
+
 # データベースファイルの定義
 DATABASE = 'database.db'
 
-# 機械学習モデルとスケーラーの読み込み
-# アプリケーション起動時に一度だけ実行される
+# 実験データ一覧のページ設定 (1ページの件数の既定値と上限)
+app.config['DATA_PAGE_SIZE'] = 50
+app.config['DATA_MAX_PAGE_SIZE'] = 500
+# ストリーミング表示 (?stream=1) の場合は1ページに大きな件数を指定できる
+app.config['DATA_MAX_STREAM_PAGE_SIZE'] = 20000
+
+# リクエストの計測 (ルートごとのレイテンシ、分析・アップロード・一覧の処理段階ごとの時間、読み込んだバイト数、モデルの呼び出し回数)
+# 結果は /metrics で Prometheus のテキスト形式で返す。ログインしているか、METRICS_TOKEN を設定した場合は
+# Authorization: Bearer <トークン> が必要 (トークンを設定しなければ収集ツールからは読めない)
+app.config['METRICS_ENABLED'] = True
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+request_metrics = metrics.Metrics(enabled=app.config['METRICS_ENABLED'])
+request_metrics.describe('http_request_duration_seconds', 'ルートごとのリクエスト処理時間 (レスポンスを返すまで)')
+request_metrics.describe('phase_duration_seconds', '分析・アップロード・一覧の処理段階ごとの時間')
+request_metrics.describe('bytes_read_total', '読み込んだファイルのバイト数 (upload: 受信, original: 元ファイルの解析, sidecar: 解析済みデータ)')
+request_metrics.describe('files_read_total', '分析で読み込んだファイル数 (summary: 保存済みの要約統計のみ使用)')
+request_metrics.describe('model_calls_total', 'サロゲートモデル (predict) の呼び出し回数 (キャッシュにない点がある場合のみ呼ぶ)')
+request_metrics.describe('model_rows_total', 'サロゲートモデルに渡した行数')
+request_metrics.describe('predicted_points_total', '予測エンジンごとの予測点数 (キャッシュから返した点を含む)')
+request_metrics.describe('query_files_total', '測定データの横断検索で対象にしたファイル数 (skipped: ゾーンマップで除外, scanned: 読み込んで判定)')
+
+# リクエスト単位のプロファイラー (遅いルートの原因調査用)。既定では無効で、その場合は各リクエストで設定を確認するだけ
+# PROFILER_ENABLED: True にすると全リクエストを cProfile で記録する
+# PROFILER_HEADER: ログイン中のユーザーがこのヘッダーに 1 を指定したリクエストを cProfile で記録する (None で無効)
+# PROFILER_SLOW_SECONDS: 秒数を指定すると全リクエストをサンプリングし、処理時間がこれ以上のものだけ保存する
+app.config['PROFILER_ENABLED'] = False
+app.config['PROFILER_HEADER'] = 'X-Profile'
+app.config['PROFILER_SLOW_SECONDS'] = None
+# 記録の保存先・保存する件数 (古いものから削除)・サンプリング間隔 (秒)
+app.config['PROFILER_FOLDER'] = 'profiles'
+app.config['PROFILER_MAX_CAPTURES'] = 100
+app.config['PROFILER_SAMPLE_INTERVAL'] = 0.005
+profiler = request_profiler.RequestProfiler(
+    folder=app.config['PROFILER_FOLDER'],
+    max_captures=app.config['PROFILER_MAX_CAPTURES'],
+    interval=app.config['PROFILER_SAMPLE_INTERVAL'],
+)
+
+# 機械学習モデルの読み込み
+# run.py が trained_models/versions/<バージョン>/ に保存したモデルのうち、versions/CURRENT に書かれたものを使う
+# (versions/ が無い場合は trained_models/*.pkl)。起動時は manifest を読むだけで、モデル本体は最初の予測時に読み込む。
+# CURRENT が変わると、新しいバージョンを別スレッドで読み込み・ウォームアップしてから無停止で切り替える。
 MODEL_DIR = 'trained_models'
-GP_MODEL_PATH = os.path.join(MODEL_DIR, 'lgbm_gp_model.pkl')
-GPP_MODEL_PATH = os.path.join(MODEL_DIR, 'lgbm_gpp_model.pkl')
-SCALER_PATH = os.path.join(MODEL_DIR, 'scaler.pkl')
-
-# モデルとスケーラーをグローバル変数として保持
-# アプリケーション起動時に存在しない場合はエラーを出す
-try:
-    if not os.path.exists(GP_MODEL_PATH) or \
-       not os.path.exists(GPP_MODEL_PATH) or \
-       not os.path.exists(SCALER_PATH):
-        raise FileNotFoundError("機械学習モデルまたはスケーラーファイルが見つかりません。'run.py'を実行してモデルを生成してください。")
-        
-    loaded_gp_model = joblib.load(GP_MODEL_PATH)
-    loaded_gpp_model = joblib.load(GPP_MODEL_PATH)
-    loaded_scaler = joblib.load(SCALER_PATH)
-    print("機械学習モデルとスケーラーを正常に読み込みました。")
-except FileNotFoundError as e:
-    print(f"モデル読み込みエラー: {e}")
-    loaded_gp_model = None
-    loaded_gpp_model = None
-    loaded_scaler = None
-except Exception as e:
-    print(f"モデル読み込み中に予期せぬエラーが発生しました: {e}")
-    loaded_gp_model = None
-    loaded_gpp_model = None
-    loaded_scaler = None
+TABLE_PATH = os.path.join(MODEL_DIR, 'gp_gpp_table.npz')
+# CURRENT の変更を確認する間隔 (秒)
+app.config['MODEL_RELOAD_POLL_SECONDS'] = 5.0
+registry = model_registry.ModelRegistry(MODEL_DIR, poll_interval=app.config['MODEL_RELOAD_POLL_SECONDS'])
+if registry.active() is None:
+    print("モデル読み込みエラー: 機械学習モデルまたはスケーラーファイルが見つかりません。'run.py'を実行してモデルを生成してください。")
+else:
+    print(f"機械学習モデルを確認しました。(バージョン: {registry.active().name})")
+
+# 予測キャッシュの設定 (同じ (Z, ωτe) の再計算を避ける)
+app.config['PREDICTION_CACHE_MAX_ENTRIES'] = 200_000
+# ディスク層のSQLiteファイル。環境変数で指定した場合のみ有効になり、複数のワーカープロセスで共有される
+app.config['PREDICTION_CACHE_DISK_PATH'] = os.environ.get('PREDICTION_CACHE_DISK_PATH')
+# 重複を除いた (Z, ωτe) がこの数を超えるバッチはキャッシュを通さずに計算する (大きなスイープでLRUを追い出さない)
+app.config['PREDICTION_CACHE_MAX_BATCH_KEYS'] = 10_000
+prediction_cache = PredictionCache(
+    max_entries=app.config['PREDICTION_CACHE_MAX_ENTRIES'],
+    disk_path=app.config['PREDICTION_CACHE_DISK_PATH'],
+    max_batch_keys=app.config['PREDICTION_CACHE_MAX_BATCH_KEYS'],
+)
+
+# 一括予測API (/api/predict) の設定
+# 1リクエストで予測できる最大点数 (Zの数 × ωτeの数)
+app.config['PREDICT_MAX_POINTS'] = 2_000_000
+# この点数を超える場合は、Zごとに区切ってNDJSON形式でストリーミング返却する
+app.config['PREDICT_STREAM_THRESHOLD'] = 200_000
+
+# グラフ表示用の間引きデータ (/api/experiments/<id>/curves, /api/predict/curves) の設定
+# width (表示幅のピクセル数) の既定値と範囲、(内容ハッシュ, 幅, 方法) ごとの結果のキャッシュ件数
+app.config['CURVE_DEFAULT_WIDTH'] = 800
+app.config['CURVE_WIDTH_RANGE'] = (16, 4096)
+app.config['CURVE_CACHE_MAX_ENTRIES'] = 512
+curve_cache = downsample.CurveCache(max_entries=app.config['CURVE_CACHE_MAX_ENTRIES'])
+
+# 測定データの横断検索 (/api/query) で、1ファイルあたりに返す一致した行数の既定値と上限
+app.config['QUERY_DEFAULT_ROWS'] = 20
+app.config['QUERY_MAX_ROWS'] = 1000
+
+# Z と ωτe の組 (同じ長さの1次元配列) をまとめて G'/Ge, G''/Ge を予測
+# 予測済みの点はキャッシュから返し、未計算の点だけをモデルに渡す
+# model (ModelVersion) を省略すると有効なバージョンを使う。1つのリクエストの中では同じ model を渡し、
+# 途中で切り替わっても結果に2つのバージョンが混ざらないようにする
+def predict_gp_gpp(z_values, omega_values, model=None):
+    model = model or registry.active()
+
+    def compute(z, omega):
+        input_data = np.column_stack([
+            np.asarray(z, dtype=float),
+            np.asarray(omega, dtype=float),
+        ])
+        request_metrics.inc('model_calls_total')
+        request_metrics.inc('model_rows_total', input_data.shape[0])
+        return model.load().predict(input_data)
+
+    return prediction_cache.get_or_compute(model.content_hash, z_values, omega_values, compute)
+
+# ルックアップテーブル (python lookup_table.py で作成) は初回使用時に一度だけ読み込む
+_lookup_table = None
+
+def get_lookup_table():
+    global _lookup_table
+    if _lookup_table is None and os.path.exists(TABLE_PATH):
+        _lookup_table = lookup_table.load_table(TABLE_PATH)
+        print(f"ルックアップテーブルを読み込みました: {TABLE_PATH}")
+    return _lookup_table
+
+# 逆フィットの索引はルックアップテーブルの曲線から作り、初回使用時に一度だけ準備する
+_inverse_index = None
+
+def get_inverse_index():
+    global _inverse_index
+    if _inverse_index is None:
+        table = get_lookup_table()
+        if table is not None:
+            _inverse_index = inverse_fit.InverseIndex(table)
+    return _inverse_index
+
+# 厳密計算モード (engine='exact') の設定
+# generate_data.py と同じ LM(2002) -> Prony -> G', G'' の計算を、粗いグリッドでその場で行う
+app.config['EXACT_N_T'] = exact_physics.DEFAULT_N_T
+app.config['EXACT_N_TERMS'] = exact_physics.DEFAULT_N_TERMS
+# 1リクエストあたりの計算時間の上限 (秒)。リクエストで time_budget を指定する場合も EXACT_MAX_TIME_BUDGET まで
+app.config['EXACT_TIME_BUDGET'] = 5.0
+app.config['EXACT_MAX_TIME_BUDGET'] = 30.0
+# 計算できる Z の範囲と、1リクエストあたりの異なる Z の個数の上限
+app.config['EXACT_Z_RANGE'] = (1.0, 1000.0)
+app.config['EXACT_MAX_Z_VALUES'] = 200
+# リクエストで指定できるグリッドの範囲 (t/τe の点数, Prony 項数)
+app.config['EXACT_N_T_RANGE'] = (100, 3000)
+app.config['EXACT_N_TERMS_RANGE'] = (20, 400)
+# Z ごとの Prony 係数 (taus, Gp) のキャッシュ件数
+app.config['EXACT_CACHE_MAX_ENTRIES'] = 512
+exact_engine = exact_physics.ExactPhysics(
+    n_t=app.config['EXACT_N_T'],
+    n_terms=app.config['EXACT_N_TERMS'],
+    max_entries=app.config['EXACT_CACHE_MAX_ENTRIES'],
+)
+
+# サロゲートモデル (LightGBM) の学習データの範囲 (generate_data.py の既定値)
+SURROGATE_Z_RANGE = (1.0, 100.0)
+SURROGATE_OMEGA_RANGE = (1e-12, 1e1)
+
+# 予測エンジン: 'lgbm' (LightGBMモデル) / 'table' (ルックアップテーブル補間) / 'exact' (LM(2002) の厳密計算)
+PREDICT_ENGINES = ('lgbm', 'table', 'exact')
+
+# 厳密計算の入力 (Z の範囲・個数) を確認する
+def validate_exact_inputs(z_values):
+    z_min, z_max = app.config['EXACT_Z_RANGE']
+    if np.any(z_values < z_min) or np.any(z_values > z_max):
+        raise ValueError(f"厳密計算の Z は {z_min:g} 以上 {z_max:g} 以下で指定してください。")
+    n_distinct = np.unique(z_values).size
+    if n_distinct > app.config['EXACT_MAX_Z_VALUES']:
+        raise ValueError(
+            f"厳密計算で指定できる Z は {app.config['EXACT_MAX_Z_VALUES']} 個までです。(指定: {n_distinct} 個)")
+
+# 厳密計算の結果に対するサロゲートモデルのずれ ((サロゲート - 厳密) / 厳密) を集計する
+# モデルが読み込まれていない場合は None
+def surrogate_deviation(z_values, omega_values, exact_gp, exact_gpp, model=None):
+    model = model or registry.active()
+    if model is None:
+        return None
+    predicted_gp, predicted_gpp = predict_gp_gpp(z_values, omega_values, model)
+    in_range = ((z_values >= SURROGATE_Z_RANGE[0]) & (z_values <= SURROGATE_Z_RANGE[1]) &
+                (omega_values >= SURROGATE_OMEGA_RANGE[0]) & (omega_values <= SURROGATE_OMEGA_RANGE[1]))
+
+    def summarize(predicted, exact):
+        valid = exact > 0
+        relative = np.full(exact.size, np.nan)
+        relative[valid] = (predicted[valid] - exact[valid]) / exact[valid]
+        summary = {}
+        for name, rows in (('all', valid), ('in_training_range', valid & in_range)):
+            values = np.abs(relative[rows])
+            summary[name] = {
+                'max_abs_relative': float(values.max()) if values.size else None,
+                'mean_abs_relative': float(values.mean()) if values.size else None,
+            }
+        return relative, summary
+
+    relative_gp, summary_gp = summarize(predicted_gp, exact_gp)
+    relative_gpp, summary_gpp = summarize(predicted_gpp, exact_gpp)
+    return {
+        'Gp_over_Ge': predicted_gp,
+        'Gpp_over_Ge': predicted_gpp,
+        'relative_Gp': relative_gp,
+        'relative_Gpp': relative_gpp,
+        'summary': {'Gp_over_Ge': summary_gp, 'Gpp_over_Ge': summary_gpp},
+        'n_in_training_range': int(in_range.sum()),
+        'model_version': model.name,
+    }
+
+# 指定したエンジンで予測する
+# 'table' の場合、テーブルの範囲外の点だけ LightGBM モデルで予測する
+# 'exact' の場合、EXACT_TIME_BUDGET を超えると exact_physics.TimeBudgetExceeded を送出する
+def predict_with_engine(z_values, omega_values, engine='lgbm', model=None):
+    if engine not in PREDICT_ENGINES:
+        raise ValueError(f"未対応の予測エンジンです: {engine}")
+    request_metrics.inc('predicted_points_total', np.size(z_values), engine=engine)
+    if engine == 'lgbm':
+        return predict_gp_gpp(z_values, omega_values, model)
+    if engine == 'exact':
+        z_values = np.asarray(z_values, dtype=float)
+        validate_exact_inputs(z_values)
+        predicted_gp, predicted_gpp, _ = exact_engine.predict(
+            z_values, omega_values, time_budget=app.config['EXACT_TIME_BUDGET'])
+        return predicted_gp, predicted_gpp
+
+    table = get_lookup_table()
+    if table is None:
+        raise RuntimeError("ルックアップテーブルが見つかりません。'python lookup_table.py' を実行して作成してください。")
+
+    z_values = np.asarray(z_values, dtype=float)
+    omega_values = np.asarray(omega_values, dtype=float)
+    in_table = table.in_range(z_values, omega_values)
+    predicted_gp = np.empty(z_values.size)
+    predicted_gpp = np.empty(z_values.size)
+    predicted_gp[in_table], predicted_gpp[in_table] = table.predict(z_values[in_table], omega_values[in_table])
+    if not in_table.all():
+        outside = ~in_table
+        predicted_gp[outside], predicted_gpp[outside] = predict_gp_gpp(z_values[outside], omega_values[outside], model)
+    return predicted_gp, predicted_gpp
+
+# 予測用の入力値を1次元配列に変換
+# リスト [1, 2, 3] / 単一の数値 / 範囲指定 {"start": 1e-3, "stop": 10, "num": 100, "scale": "log"} を受け付ける
+# 範囲指定の num は配列を作る前に max_points 以下か確認する (巨大な num でメモリを使い切らないように)
+def parse_sweep_values(spec, name, max_points):
+    if isinstance(spec, dict):
+        try:
+            start = float(spec['start'])
+            stop = float(spec['stop'])
+            num = int(spec.get('num', 50))
+        except (KeyError, TypeError, ValueError, OverflowError):
+            raise ValueError(f"'{name}' の範囲指定には数値の start, stop, num が必要です。")
+        if num < 1:
+            raise ValueError(f"'{name}' の num は1以上にしてください。")
+        if num > max_points:
+            raise ValueError(f"'{name}' の num ({num}) が上限 ({max_points}) を超えています。")
+        scale = spec.get('scale', 'linear')
+        if scale == 'log':
+            if start <= 0 or stop <= 0:
+                raise ValueError(f"'{name}' を対数スケールで指定する場合、start と stop は正の値にしてください。")
+            values = np.geomspace(start, stop, num)
+        elif scale == 'linear':
+            values = np.linspace(start, stop, num)
+        else:
+            raise ValueError(f"'{name}' の scale は 'linear' または 'log' を指定してください。")
+    elif isinstance(spec, list):
+        try:
+            values = np.asarray(spec, dtype=float)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{name}' のリストには数値のみを指定してください。")
+    elif isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        values = np.array([spec], dtype=float)
+    else:
+        raise ValueError(f"'{name}' はリスト、数値、または範囲指定で入力してください。")
+
+    if values.ndim != 1 or values.size == 0:
+        raise ValueError(f"'{name}' に値が指定されていません。")
+    if not np.all(np.isfinite(values)):
+        raise ValueError(f"'{name}' に有限でない値が含まれています。")
+    return values
 
 # ====================================================
 # 2. データベースの初期設定
 # ====================================================
 
-# アプリケーションとデータベースの接続
-def get_db():
-    db = sqlite3.connect(DATABASE)
+# 接続ごとに設定するPRAGMA
+# WALモードで読み込みと書き込みが互いにブロックしないようにし、キャッシュ等を拡張する
+DB_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-16000',        # 約16MB
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',      # 256MB
+)
+
+# データベースへの新しい接続を作成
+def connect_db():
+    db = sqlite3.connect(DATABASE, timeout=30)
     db.row_factory = sqlite3.Row
+    for pragma in DB_PRAGMAS:
+        db.execute(pragma)
     return db
 
+# アプリケーションとデータベースの接続
+# 接続はアプリケーションコンテキスト (リクエスト) ごとに1つ作り、同じリクエスト内では使い回す
+def get_db():
+    if '_database' not in g:
+        g._database = connect_db()
+    return g._database
+
+# リクエスト終了時に接続を閉じる
+@app.teardown_appcontext
+def close_db(exception):
+    db = g.pop('_database', None)
+    if db is not None:
+        db.close()
+
+# schema.sql の後に実行する追加のスキーマ (既存のデータベースにも繰り返し適用できるもの)
+EX_EXTRA_SCHEMAS = (
+    'schema_search.sql',
+    'schema_blobs.sql',
+    'schema_jobs.sql',
+    'schema_zones.sql',
+)
+
 # 実験データ用テーブル（experiments）の設定
 def init_ex_db():
     with app.app_context():
         db = get_db()
         with open('schema.sql', 'r') as f:
             db.executescript(f.read())
+        for schema_path in EX_EXTRA_SCHEMAS:
+            with open(schema_path, 'r') as f:
+                db.executescript(f.read())
         db.commit()
 
+# 既存の experiments テーブルに後から追加した列を補う
+EX_UPGRADE_COLUMNS = {
+    'parsed_path': 'TEXT',
+    'parsed_mtime': 'REAL',
+    'parsed_size': 'INTEGER',
+    'summary_json': 'TEXT',
+    'content_hash': 'TEXT',
+}
+# 既存の jobs テーブルに後から追加した列
+JOBS_UPGRADE_COLUMNS = {
+    'heartbeat_at': 'REAL',
+}
+
+def upgrade_ex_db():
+    with app.app_context():
+        db = get_db()
+        existing = {row['name'] for row in db.execute('PRAGMA table_info(experiments)')}
+        for column, column_type in EX_UPGRADE_COLUMNS.items():
+            if column not in existing:
+                db.execute(f'ALTER TABLE experiments ADD COLUMN {column} {column_type}')
+
+        # インデックス・全文検索テーブル等を作成し、全文検索テーブルを新しく作った場合は既存の行から索引を構築する
+        had_fts = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'experiments_fts'"
+        ).fetchone() is not None
+        for schema_path in EX_EXTRA_SCHEMAS:
+            with open(schema_path, 'r') as f:
+                db.executescript(f.read())
+        if not had_fts:
+            db.execute("INSERT INTO experiments_fts (experiments_fts) VALUES ('rebuild')")
+        existing = {row['name'] for row in db.execute('PRAGMA table_info(jobs)')}
+        for column, column_type in JOBS_UPGRADE_COLUMNS.items():
+            if column not in existing:
+                db.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+
+        # 要約統計はあるがゾーンマップがない行 (ゾーンマップ追加前のアップロード) は、要約統計から作る
+        missing_zones = db.execute(
+            'SELECT id, summary_json FROM experiments WHERE summary_json IS NOT NULL '
+            'AND id NOT IN (SELECT experiment_id FROM measurement_zones)'
+        ).fetchall()
+        for row in missing_zones:
+            save_zone_map(db, row['id'], json.loads(row['summary_json']))
+
+        # 以前のアップロード (ファイル名で保存したもの) にも内容のハッシュを付け、参照数に数える
+        legacy = db.execute('SELECT id, file_path FROM experiments WHERE content_hash IS NULL').fetchall()
+        for row in legacy:
+            if not os.path.exists(row['file_path']):
+                continue
+            content_hash = blob_store.file_sha256(row['file_path'])
+            acquire_blob(db, content_hash, row['file_path'], os.path.getsize(row['file_path']))
+            db.execute('UPDATE experiments SET content_hash = ? WHERE id = ?', (content_hash, row['id']))
+        db.commit()
+
+# 実験データ・ゾーンマップ・blobs の行を追加するSQL (単体のアップロードと一括登録で共通)
+INSERT_EXPERIMENT_SQL = (
+    'INSERT INTO experiments (device_name, sample_name, experiment_date, file_name, file_path, parsed_path, '
+    'parsed_mtime, parsed_size, summary_json, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+INSERT_ZONE_SQL = (
+    'INSERT INTO measurement_zones (experiment_id, column_name, min_value, max_value, n_values) VALUES (?, ?, ?, ?, ?)'
+)
+ACQUIRE_BLOB_SQL = (
+    'INSERT INTO blobs (content_hash, file_path, size, ref_count) VALUES (?, ?, ?, 1) '
+    'ON CONFLICT (content_hash) DO UPDATE SET ref_count = ref_count + 1'
+)
+
+# 要約統計の列ごとの最小値・最大値を、その実験データのゾーンマップとして保存する (既存の分は置き換える)
+def save_zone_map(db, experiment_id, summary):
+    db.execute('DELETE FROM measurement_zones WHERE experiment_id = ?', (experiment_id,))
+    db.executemany(INSERT_ZONE_SQL, [(experiment_id,) + zone for zone in measurement_query.zone_rows(summary)])
+
+# blobs テーブルの参照数を増やす (初めての内容なら行を追加する)
+def acquire_blob(db, content_hash, file_path, size):
+    db.execute(ACQUIRE_BLOB_SQL, (content_hash, file_path, size))
+
+# blobs テーブルに登録済みで、ファイルが残っている保存先 (以前のアップロードの objects/ の外のパスを含む)
+# blob_store.save_stream の find_existing として、ワーカースレッドからも呼ぶため、呼び出しごとに別の接続を使う
+def find_blob_path(content_hash):
+    connection = connect_db()
+    try:
+        row = connection.execute('SELECT file_path FROM blobs WHERE content_hash = ?', (content_hash,)).fetchone()
+    finally:
+        connection.close()
+    if row is None or not os.path.exists(row['file_path']):
+        return None
+    return row['file_path']
+
+# 保存したファイルが blobs のどの行からも参照されていなければ削除する (コミットまたはロールバックの後に呼ぶ)
+def discard_unreferenced_blob(db, content_hash, file_path):
+    if db.execute('SELECT 1 FROM blobs WHERE content_hash = ?', (content_hash,)).fetchone() is None:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+# 同じ内容のファイルを解析済みの実験データがあれば、その解析結果 (サイドカー・要約統計) を返す
+def find_parsed_content(db, content_hash):
+    known = db.execute(
+        'SELECT parsed_path, parsed_mtime, parsed_size, summary_json FROM experiments '
+        'WHERE content_hash = ? AND parsed_path IS NOT NULL AND summary_json IS NOT NULL '
+        'ORDER BY id DESC LIMIT 1',
+        (content_hash,)
+    ).fetchone()
+    if known is None or not os.path.exists(known['parsed_path']):
+        return None
+    return known
+
+# 実験装置名・サンプル名の部分一致検索条件を作る
+# 3文字以上の検索語は全文検索 (trigram) の索引を使い、それより短い語は LIKE で絞り込む
+FTS_MIN_TERM_LENGTH = 3
+
+def experiment_search_clause(search_device='', search_sample=''):
+    clauses = []
+    params = []
+    fts_terms = []
+    for column, term in (('device_name', search_device), ('sample_name', search_sample)):
+        if not term:
+            continue
+        if len(term) >= FTS_MIN_TERM_LENGTH:
+            quoted = term.replace('"', '""')
+            fts_terms.append(f'{column} : "{quoted}"')
+        else:
+            clauses.append(f'{column} LIKE ?')
+            params.append(f'%{term}%')
+    if fts_terms:
+        clauses.insert(0, 'id IN (SELECT rowid FROM experiments_fts WHERE experiments_fts MATCH ?)')
+        params.insert(0, ' AND '.join(fts_terms))
+    where = ' AND '.join(clauses) if clauses else '1=1'
+    return where, params
+
+# ページ位置 (カーソル) は、前のページ最後の行の (uploaded_at, id) をURLで扱える文字列にしたもの
+def encode_cursor(row):
+    raw = json.dumps([row['uploaded_at'], row['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(token):
+    try:
+        uploaded_at, experiment_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return str(uploaded_at), int(experiment_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("ページの指定 (cursor) が不正です。")
+
+# 1ページ分の実験データ
+# 行はDBカーソルから順に読み出し (ストリーミング表示でも全件をメモリに載せない)、
+# 読み終わった時点で次のページがあるか (next_cursor) が決まる
+class ExperimentPage:
+    def __init__(self, rows, page_size, connection=None):
+        self._rows = rows
+        self.page_size = page_size
+        self.last_row = None
+        self.has_next = False
+        # 専用の接続で読み出す場合 (ストリーミング表示) は、読み終わったときに閉じる
+        self._connection = connection
+
+    def __iter__(self):
+        try:
+            for i, row in enumerate(self._rows):
+                if i == self.page_size:
+                    self.has_next = True
+                    break
+                self.last_row = row
+                yield row
+        finally:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.last_row) if self.has_next else None
+
+# (uploaded_at, id) の降順で、cursor の次から page_size 件を取得する
+# 複合インデックス idx_experiments_uploaded_at を使うため、どのページも同じ速さで取得できる
+def query_experiment_page(db, search_device='', search_sample='', cursor=None, page_size=50, close_db=False):
+    where, params = experiment_search_clause(search_device, search_sample)
+    if cursor:
+        uploaded_at, experiment_id = decode_cursor(cursor)
+        where += ' AND (uploaded_at, id) < (?, ?)'
+        params = params + [uploaded_at, experiment_id]
+    query = f'SELECT * FROM experiments WHERE {where} ORDER BY uploaded_at DESC, id DESC LIMIT ?'
+    # 次のページの有無を判定するため1件多く取得する
+    rows = db.execute(query, params + [page_size + 1])
+    return ExperimentPage(rows, page_size, db if close_db else None)
+
+# リクエストの page_size を上限内の整数にする
+def requested_page_size(max_page_size):
+    try:
+        page_size = int(request.args.get('page_size', app.config['DATA_PAGE_SIZE']))
+    except ValueError:
+        page_size = app.config['DATA_PAGE_SIZE']
+    return min(max(page_size, 1), max_page_size)
+
+# JSONで返す実験データの列
+EXPERIMENT_JSON_FIELDS = ('id', 'device_name', 'sample_name', 'experiment_date', 'file_name', 'uploaded_at')
+
 # ユーザー情報用テーブル（users）の設定
 def init_user_db():
     with app.app_context():
@@ -104,13 +615,66 @@ def add_admin_user(username, password):
             print(f"ユーザー '{username}' が正常に登録されました。")
         except sqlite3.IntegrityError:
             print(f"ユーザー名 '{username}' は既に存在します。")
-        db.close()
 
 
 # ====================================================
 # 3. ルーティング設定
 # ====================================================
 
+# リクエストごとの処理時間を計測する (ルートはURLのパターンごとに集計し、IDなどの値ごとには分けない)
+@app.before_request
+def start_request_timer():
+    g._request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('_request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                                route=route, method=request.method, status=response.status_code)
+    return response
+
+# プロファイルの記録を始める (設定・ヘッダー・しきい値のどれかで有効な場合のみ)
+@app.before_request
+def start_request_profile():
+    header = app.config['PROFILER_HEADER']
+    deterministic = app.config['PROFILER_ENABLED'] or bool(
+        header and request.headers.get(header) == '1' and session.get('logged_in'))
+    if deterministic or app.config['PROFILER_SLOW_SECONDS'] is not None:
+        g._profile = profiler.begin(deterministic=deterministic)
+
+@app.after_request
+def record_profile_status(response):
+    if '_profile' in g:
+        g._profile_status = response.status_code
+    return response
+
+# 明示的に要求された記録と、しきい値より遅かったリクエストの記録を保存する (例外で終わった場合もステータス500として保存)
+@app.teardown_request
+def finish_request_profile(exception):
+    capture = g.pop('_profile', None)
+    if capture is None:
+        return
+    capture.stop()
+    slow_seconds = app.config['PROFILER_SLOW_SECONDS']
+    if capture.deterministic or (slow_seconds is not None and capture.duration >= slow_seconds):
+        try:
+            profiler.save(capture, {
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'route': request.url_rule.rule if request.url_rule is not None else None,
+                'status': g.pop('_profile_status', 500),
+                'trigger': 'request' if capture.deterministic else 'slow',
+                'error': repr(exception) if exception is not None else None,
+            })
+        except OSError as e:
+            print(f"プロファイルを保存できませんでした: {e}")
+
+# 処理段階の時間を計測する with ブロック (operation は処理の名前、name は段階の名前)
+def phase(operation, name):
+    return request_metrics.span('phase_duration_seconds', operation=operation, phase=name)
+
 # ホームページの設定
 @app.route('/')
 def index():
@@ -129,7 +693,6 @@ def login():
         
         db = get_db()
         user = db.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        db.close()
 
         if user and check_password_hash(user['password'], password):
             session['logged_in'] = True
@@ -154,30 +717,111 @@ def data_list():
         flash('ログインが必要です。')
         return redirect(url_for('login'))
  
-    db = get_db()
     search_device = request.args.get('search_device', '')
     search_sample = request.args.get('search_sample', '')
+    cursor = request.args.get('cursor') or None
+    stream = request.args.get('stream') == '1'
+    page_size = requested_page_size(
+        app.config['DATA_MAX_STREAM_PAGE_SIZE'] if stream else app.config['DATA_MAX_PAGE_SIZE'])
 
-    query = 'SELECT * FROM experiments WHERE 1=1'
-    params = []
+    # ストリーミング表示ではリクエスト終了後も行を読み出すため、専用の接続を使う
+    db = connect_db() if stream else get_db()
+
+    with phase('data', 'query'):
+        try:
+            page = query_experiment_page(db, search_device, search_sample, cursor, page_size, close_db=stream)
+        except ValueError as e:
+            flash(str(e), 'warning')
+            cursor = None
+            page = query_experiment_page(db, search_device, search_sample, None, page_size, close_db=stream)
 
-    if search_device:
-        query += ' AND device_name LIKE ?'
-        params.append(f'%{search_device}%')
+    template_args = dict(search_device=search_device,
+                         search_sample=search_sample,
+                         page_size=page_size,
+                         cursor=cursor,
+                         stream=stream)
 
-    if search_sample:
-        query += ' AND sample_name LIKE ?'
-        params.append(f'%{search_sample}%')
+    # ストリーミング表示では、行をDBから読みながら少しずつHTMLを返す
+    if stream:
+        return stream_template('data_list.html', experiments=page, page=page, **template_args)
+
+    with phase('data', 'fetch'):
+        experiments = list(page)
+    with phase('data', 'render'):
+        return render_template('data_list.html', 
+                               experiments=experiments,
+                               page=page,
+                               **template_args)
+
+# 実験データ一覧のJSON版 (スクリプトからのページ送り用)
+# 例: /api/experiments?search_sample=CMC&page_size=100&cursor=<前のレスポンスの next_cursor>
+@app.route('/api/experiments')
+def api_experiments():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+
+    page_size = requested_page_size(app.config['DATA_MAX_PAGE_SIZE'])
+    try:
+        page = query_experiment_page(get_db(),
+                                     request.args.get('search_device', ''),
+                                     request.args.get('search_sample', ''),
+                                     request.args.get('cursor') or None,
+                                     page_size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    items = [{field: row[field] for field in EXPERIMENT_JSON_FIELDS} for row in page]
+    return jsonify({
+        'items': items,
+        'page_size': page_size,
+        'next_cursor': page.next_cursor,
+    })
+
+# 複数ファイル・ZIP の一括登録
+# フォームの files に複数のファイルや ZIP を指定する。装置名・サンプル名・日付はファイルごとに
+# マニフェスト (manifest.csv または manifest 欄) > ファイルのヘッダー > フォームの入力値 の順に決める
+@app.route('/upload/bulk', methods=['POST'])
+def bulk_upload():
+    if not session.get('logged_in'):
+        flash('ログインが必要です。')
+        return redirect(url_for('login'))
 
-    query += ' ORDER BY uploaded_at DESC'
+    # 入力欄は空でもよい (ヘッダー・マニフェストにない項目だけに使う)
+    defaults = {
+        'device_name': request.form.get('experiment_device', '').strip() or None,
+        'sample_name': request.form.get('sample_name', '').strip() or None,
+        'experiment_date': request.form.get('experiment_date', '').strip() or None,
+    }
+    if defaults['experiment_date'] and bulk_import.parse_date(defaults['experiment_date']) is None:
+        flash("日付の形式が正しくありません。YYYY-MM-DD形式で入力してください。", "error")
+        return render_template('upload.html'), 400
 
-    experiments = db.execute(query, params).fetchall()
-    db.close()
+    sources = []
+    try:
+        with phase('bulk_upload', 'receive'):
+            for file in request.files.getlist('files'):
+                if not file.filename:
+                    continue
+                if file.filename.lower().endswith('.zip'):
+                    sources += bulk_import.zip_sources(zipfile.ZipFile(file.stream), file.filename)
+                else:
+                    # 受信済みのファイルの大きさ (multipart の各部分には Content-Length がない)
+                    file.stream.seek(0, os.SEEK_END)
+                    size = file.stream.tell()
+                    file.stream.seek(0)
+                    sources.append(bulk_import.Source(file.filename, lambda file=file: file.stream, size))
+            manifest = None
+            manifest_file = request.files.get('manifest')
+            if manifest_file is not None and manifest_file.filename:
+                manifest = bulk_import.read_manifest(manifest_file.stream)
+        outcomes, counts = run_bulk_import(get_db(), sources, defaults, manifest)
+    except (ValueError, zipfile.BadZipFile, UnicodeDecodeError) as e:
+        flash(f"一括登録できませんでした - {e}", "error")
+        return render_template('upload.html'), 400
 
-    return render_template('data_list.html', 
-                           experiments=experiments,
-                           search_device=search_device,
-                           search_sample=search_sample)
+    flash(f"{counts['imported']} 件のファイルを登録しました。(スキップ: {counts['skipped']} 件, エラー: {counts['error']} 件)",
+          "success" if not counts['error'] else "warning")
+    return render_template('upload.html', bulk_outcomes=outcomes)
 
 # ファイルダウンロード機能
 @app.route('/download/<int:experiment_id>')
@@ -189,11 +833,12 @@ def download_file(experiment_id):
 
     db = get_db()
     experiment = db.execute('SELECT file_name, file_path FROM experiments WHERE id = ?', (experiment_id,)).fetchone()
-    db.close()
 
     if experiment:
         directory = os.path.dirname(experiment['file_path'])
         filename = os.path.basename(experiment['file_path'])
+        # 保存名はハッシュなので、ダウンロード時はアップロード時のファイル名を使う
+        download_name = os.path.basename(experiment['file_name']) or filename
         
         absolute_upload_folder = os.path.abspath(app.config['UPLOAD_FOLDER'])
         absolute_filepath = os.path.abspath(experiment['file_path'])
@@ -202,11 +847,39 @@ def download_file(experiment_id):
         if os.path.commonpath([absolute_upload_folder, absolute_filepath]) == absolute_upload_folder:
             print(f"ダウンロードリクエスト: {filename} from {directory}")
             # 指定されたディレクトリからファイルを送信（as_attachment=Trueでダウンロードを強制）
-            return send_from_directory(directory, filename, as_attachment=True)
+            return send_from_directory(directory, filename, as_attachment=True, download_name=download_name)
         else:
             return "ファイルパスが不正です。", 400
     return "ファイルが見つかりません。", 404
 
+# 実験データの削除
+# blobs の参照数は experiments の削除トリガー (schema_blobs.sql) で減らし、どこからも参照されなくなったファイルと
+# サイドカーは削除する (同じ内容の別の行が再利用しているものは残す)
+@app.route('/data/<int:experiment_id>/delete', methods=['POST'])
+def delete_experiment(experiment_id):
+    if not session.get('logged_in'):
+        flash('ログインが必要です。')
+        return redirect(url_for('login'))
+
+    db = get_db()
+    experiment = db.execute(
+        'SELECT file_path, parsed_path, content_hash FROM experiments WHERE id = ?', (experiment_id,)
+    ).fetchone()
+    if experiment is None:
+        flash("指定された実験データが見つかりません。", "error")
+        return redirect(url_for('data_list'))
+    db.execute('DELETE FROM measurement_zones WHERE experiment_id = ?', (experiment_id,))
+    db.execute('DELETE FROM experiments WHERE id = ?', (experiment_id,))
+    db.commit()
+    if experiment['content_hash'] is not None:
+        discard_unreferenced_blob(db, experiment['content_hash'], experiment['file_path'])
+    parsed_path = experiment['parsed_path']
+    if parsed_path and os.path.exists(parsed_path) and db.execute(
+            'SELECT 1 FROM experiments WHERE parsed_path = ? LIMIT 1', (parsed_path,)).fetchone() is None:
+        os.remove(parsed_path)
+    flash(f"実験データ (ID: {experiment_id}) を削除しました。", "success")
+    return redirect(url_for('data_list'))
+
 # ファイルアップロード機能
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -234,27 +907,462 @@ def upload_file():
 
         if file:
             filename = file.filename
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            # 受信しながらSHA-256を計算し、内容のハッシュをファイル名として保存する
+            # (同名ファイルで上書きされず、同じ内容のファイルは1つだけ保存される)
+            extension = os.path.splitext(filename)[1]
+            with phase('upload', 'receive'):
+                content_hash, filepath, size, is_new = blob_store.save_stream(
+                    file.stream, app.config['OBJECTS_FOLDER'], extension, find_blob_path)
+            request_metrics.inc('bytes_read_total', size, source='upload')
 
             db = get_db()
-            db.execute(
-                'INSERT INTO experiments (device_name, sample_name, experiment_date, file_name, file_path) VALUES (?, ?, ?, ?, ?)',
-                (experiment_device, sample_name, experiment_date, filename, filepath)
-            )
-            db.commit()
-            db.close()
+            # 同じ内容のファイルを解析済みなら、その結果を再利用する
+            # なければアップロード時に一度だけ解析し、分析時に使うサイドカーと要約統計を作っておく
+            known = find_parsed_content(db, content_hash)
+            if known is not None:
+                parsed = {key: known[key] for key in ('parsed_path', 'parsed_mtime', 'parsed_size')}
+                summary_json = known['summary_json']
+                print(f"同じ内容のファイルが登録済みのため、解析結果を再利用します。(SHA-256: {content_hash})")
+            else:
+                parsed = {'parsed_path': None, 'parsed_mtime': None, 'parsed_size': None}
+                summary_json = None
+                try:
+                    with phase('upload', 'parse'):
+                        df, parsed = measurement_cache.parse_to_sidecar(filepath, app.config['PARSED_FOLDER'])
+                        request_metrics.inc('bytes_read_total', size, source='original')
+                        summary_json = json.dumps(summary_stats.summarize_frame(df))
+                except Exception as e:
+                    flash(f"ファイル '{filename}' を解析できませんでした。分析時に再度読み込みを試みます - {e}", "warning")
+
+            try:
+                with phase('upload', 'db'):
+                    acquire_blob(db, content_hash, filepath, size)
+                    cursor = db.execute(
+                        INSERT_EXPERIMENT_SQL,
+                        (experiment_device, sample_name, experiment_date, filename, filepath,
+                         parsed['parsed_path'], parsed['parsed_mtime'], parsed['parsed_size'], summary_json, content_hash)
+                    )
+                    if summary_json is not None:
+                        save_zone_map(db, cursor.lastrowid, json.loads(summary_json))
+                    db.commit()
+            except sqlite3.Error:
+                db.rollback()
+                # どの行からも参照されない新しいファイルは残さない
+                if is_new:
+                    discard_unreferenced_blob(db, content_hash, filepath)
+                raise
 
             print(f"ファイル名: {filename}")
             print(f"実験装置名: {experiment_device}")
             print(f"サンプル名: {sample_name}")
             print(f"日付: {experiment_date}")
             print(f"ファイルパス: {filepath}")
+            print(f"SHA-256: {content_hash}")
             print(f"データベースに保存しました。")
 
             return redirect(url_for('data_list'))
     return "アップロードエラー", 400
 
+# 複数ファイル・ZIP の一括登録 (Web と python bulk_import.py で共通)
+# sources は bulk_import.Source のリスト。ファイルの保存・解析はスレッドプールで並列に行い、
+# 実験データ・blobs・ゾーンマップの行は executemany で1つのトランザクションにまとめて追加する。
+# 戻り値は (ファイルごとの結果のリスト, 件数の集計)。ファイル数・合計サイズが上限を超える場合は ValueError
+def run_bulk_import(db, sources, defaults, manifest=None):
+    sources, found = bulk_import.split_manifest(sources)
+    manifest = dict(found, **(manifest or {}))
+    if not sources:
+        raise ValueError("登録するファイルがありません。")
+    if len(sources) > app.config['BULK_MAX_FILES']:
+        raise ValueError(f"一度に登録できるファイルは {app.config['BULK_MAX_FILES']} 件までです。(指定: {len(sources)} 件)")
+    total_size = sum(source.size for source in sources)
+    if total_size > app.config['BULK_MAX_BYTES']:
+        raise ValueError(f"ファイルの合計サイズ ({total_size} バイト) が上限 ({app.config['BULK_MAX_BYTES']} バイト) を超えています。")
+
+    # ワーカースレッドから呼ぶため、呼び出しごとに別の接続を使う
+    def find_known(content_hash):
+        connection = connect_db()
+        try:
+            return find_parsed_content(connection, content_hash)
+        finally:
+            connection.close()
+
+    with phase('bulk_upload', 'prepare'):
+        prepared = bulk_import.prepare_files(sources, app.config['OBJECTS_FOLDER'], app.config['PARSED_FOLDER'],
+                                             find_known, app.config['BULK_MAX_WORKERS'], find_blob_path)
+    outcomes = []
+    rows = []
+    for result in prepared:
+        outcome = {'file_name': result['file_name']}
+        outcomes.append(outcome)
+        if 'skipped' in result or 'error' in result:
+            outcome.update(status='skipped' if 'skipped' in result else 'error',
+                           message=result.get('skipped') or result.get('error'))
+            continue
+        request_metrics.inc('bytes_read_total', result['size'], source='upload')
+        values, sources_used, error = bulk_import.resolve_metadata(result['file_name'], result['header'],
+                                                                   manifest, defaults)
+        outcome['content_hash'] = result['content_hash']
+        if error is not None:
+            # 登録しないファイルも、同じ内容の別のファイルが同じバッチで登録されることがあるため、
+            # 保存したファイルの削除はデータベースへの登録が終わってから判断する
+            outcome.update(status='error', message=error)
+            continue
+        outcome.update(values, status='imported', metadata_source=sources_used)
+        if 'parse_error' in result:
+            outcome['message'] = f"登録しました。解析できなかったため、分析時に再度読み込みを試みます - {result['parse_error']}"
+        elif result.get('reused'):
+            outcome['message'] = "登録しました。(同じ内容のファイルの解析結果を再利用)"
+        else:
+            outcome['message'] = "登録しました。"
+        parsed = result['parsed']
+        rows.append((outcome, result, (
+            values['device_name'], values['sample_name'], values['experiment_date'],
+            os.path.basename(result['file_name'].replace('\\', '/')), result['file_path'],
+            parsed['parsed_path'], parsed['parsed_mtime'], parsed['parsed_size'],
+            result['summary_json'], result['content_hash'])))
+
+    # 新しく保存したファイルのうち、登録した行 (このバッチ・他のリクエスト) のどれからも参照されないものを削除する
+    def discard_unused():
+        for content_hash, file_path in {(result['content_hash'], result['file_path'])
+                                        for result in prepared if result.get('is_new')}:
+            discard_unreferenced_blob(db, content_hash, file_path)
+
+    if rows:
+        with phase('bulk_upload', 'db'):
+            db.commit()
+            try:
+                # 書き込みロックを先に取り、追加した行の id が連続するようにする
+                db.execute('BEGIN IMMEDIATE')
+                last_id = db.execute('SELECT COALESCE(MAX(id), 0) FROM experiments').fetchone()[0]
+                db.executemany(ACQUIRE_BLOB_SQL, [(result['content_hash'], result['file_path'], result['size'])
+                                                  for _, result, _ in rows])
+                db.executemany(INSERT_EXPERIMENT_SQL, [row for _, _, row in rows])
+                ids = [row[0] for row in db.execute('SELECT id FROM experiments WHERE id > ? ORDER BY id', (last_id,))]
+                zones = []
+                for (outcome, result, _), experiment_id in zip(rows, ids):
+                    outcome['id'] = experiment_id
+                    if result['summary_json'] is not None:
+                        zones += [(experiment_id,) + zone
+                                  for zone in measurement_query.zone_rows(json.loads(result['summary_json']))]
+                db.executemany(INSERT_ZONE_SQL, zones)
+                db.commit()
+            except sqlite3.Error:
+                db.rollback()
+                for outcome, _, _ in rows:
+                    outcome.pop('id', None)
+                discard_unused()
+                raise
+    discard_unused()
+
+    counts = {status: sum(1 for outcome in outcomes if outcome['status'] == status)
+              for status in ('imported', 'skipped', 'error')}
+    print(f"一括登録: {counts['imported']} 件を登録しました。(スキップ: {counts['skipped']} 件, エラー: {counts['error']} 件)")
+    return outcomes, counts
+
+# 実験データ1件を読み込む (サイドカー経由)
+# ワーカースレッドから呼ぶため、DBには触れない。戻り値は (df, summary, update) で、
+# df は want_frame=False で要約統計だけで足りる場合は None、
+# update は再解析した場合や要約統計が未作成の場合に DB へ書き戻す内容 (不要なら None)
+def read_experiment(exp, want_frame, parsed_folder):
+    # 元ファイルが解析時から変わっていなければ、ファイルを読まずに保存済みの要約を使う
+    if not want_frame and exp['summary_json'] and exp['parsed_mtime'] is not None:
+        signature = measurement_cache.file_signature(exp['file_path'])
+        if signature == (exp['parsed_mtime'], exp['parsed_size']):
+            request_metrics.inc('files_read_total', source='summary')
+            return None, json.loads(exp['summary_json']), None
+
+    df, parsed = measurement_cache.load_measurement(
+        exp['file_path'], exp['parsed_path'], exp['parsed_mtime'], exp['parsed_size'], parsed_folder)
+    # サイドカーを読んだか、元ファイルを解析し直したか
+    if parsed is None:
+        source, n_bytes = 'sidecar', os.path.getsize(exp['parsed_path'])
+    else:
+        source, n_bytes = 'original', parsed['parsed_size']
+    request_metrics.inc('files_read_total', source=source)
+    request_metrics.inc('bytes_read_total', n_bytes, source=source)
+    if parsed is None and exp['summary_json']:
+        return df, json.loads(exp['summary_json']), None
+
+    summary = summary_stats.summarize_frame(df)
+    if parsed is None:
+        parsed = {key: exp[key] for key in ('parsed_path', 'parsed_mtime', 'parsed_size')}
+    return df, summary, (parsed, summary)
+
+# read_experiment の update を DB に書き戻す (要約統計と一緒にゾーンマップも更新する)
+def save_experiment_update(db, experiment_id, update):
+    parsed, summary = update
+    db.execute(
+        'UPDATE experiments SET parsed_path = ?, parsed_mtime = ?, parsed_size = ?, summary_json = ? WHERE id = ?',
+        (parsed['parsed_path'], parsed['parsed_mtime'], parsed['parsed_size'], json.dumps(summary), experiment_id)
+    )
+    save_zone_map(db, experiment_id, summary)
+
+# 複数の実験データをスレッドプールで並列に読み込む
+# 結果は experiments と同じ順番で (exp, 結果 or None, 例外 or None) のリストとして返す
+# 1ファイルの読み込みが ANALYZE_FILE_TIMEOUT 秒を超えた場合は TimeoutError を返し、待たずに先へ進む
+# read を指定すると read_experiment の代わりに read(exp, want_frame, parsed_folder) を呼ぶ
+def load_experiments_parallel(experiments, want_frame, read=read_experiment):
+    parsed_folder = app.config['PARSED_FOLDER']
+    file_timeout = app.config['ANALYZE_FILE_TIMEOUT']
+    max_workers = max(1, min(app.config['ANALYZE_MAX_WORKERS'], len(experiments)))
+    started = {} # 各ファイルの読み込み開始時刻 (タイムアウト判定用)
+
+    def run(i, exp):
+        started[i] = time.monotonic()
+        return read(exp, want_frame, parsed_folder)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(run, i, exp) for i, exp in enumerate(experiments)]
+        outcomes = []
+        for i, (exp, future) in enumerate(zip(experiments, futures)):
+            while True:
+                start = started.get(i)
+                # まだ順番待ちのファイルは、読み込みが始まるまで短い間隔で確認する
+                remaining = 0.05 if start is None else file_timeout - (time.monotonic() - start)
+                done, _ = wait([future], timeout=max(remaining, 0))
+                if done or (start is not None and remaining <= 0):
+                    break
+            if not future.done():
+                outcomes.append((exp, None, TimeoutError(f"{file_timeout}秒以内に読み込みが完了しませんでした")))
+            elif future.exception() is not None:
+                outcomes.append((exp, None, future.exception()))
+            else:
+                outcomes.append((exp, future.result(), None))
+        return outcomes
+    finally:
+        # タイムアウトしたファイルの読み込み完了は待たない
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# 分析対象の実験データを検索する
+def query_analysis_experiments(db, device_name='', sample_name=''):
+    where, params = experiment_search_clause(device_name, sample_name)
+    query = f"SELECT * FROM experiments WHERE {where} ORDER BY id"
+    return db.execute(query, params).fetchall()
+
+# 分析結果のキャッシュキー (検索条件・分析方法と、対象ファイルの内容ハッシュから作る)
+# ファイルが追加・変更されると対象の内容ハッシュが変わるため、古い結果は使われない
+def analysis_cache_key(experiments, device_name, sample_name, full_concat):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([device_name, sample_name, full_concat], ensure_ascii=False).encode('utf-8'))
+    for exp in experiments:
+        digest.update(f"{exp['id']}:{experiment_content_key(exp)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+# 実験データのファイル内容を表すキー (内容ハッシュ)
+# 内容ハッシュのない行は、ファイルの (パス, 更新日時, サイズ) で代用する
+def experiment_content_key(exp):
+    content = exp['content_hash']
+    if content is None:
+        try:
+            content = repr((exp['file_path'],) + measurement_cache.file_signature(exp['file_path']))
+        except OSError:
+            content = repr((exp['file_path'], None))
+    return content
+
+# 検索条件に一致する実験データを読み込み、結合または要約統計の集計を行う
+# 戻り値は (analysis_result, messages) で、messages は画面に表示する (メッセージ, カテゴリ) のリスト
+# check_cancelled はバックグラウンドジョブから呼ぶ場合に渡し、区切りごとに呼んでキャンセルを確認する
+def run_analysis(db, device_name='', sample_name='', full_concat=False, experiments=None, check_cancelled=None):
+    check_cancelled = check_cancelled or (lambda: None)
+    messages = []
+    if experiments is None:
+        with phase('analyze', 'query'):
+            experiments = query_analysis_experiments(db, device_name, sample_name)
+
+    all_data_frames = [] # 複数のデータフレームを一時的に格納するリスト
+    all_summaries = [] # 要約統計を格納するリスト
+
+    if not experiments:
+        messages.append(("条件に一致する実験データが見つかりませんでした。", "error"))
+        return {'message': 'データなし'}, messages
+
+    check_cancelled()
+    # ファイルの読み込み・解析はスレッドプールで並列に行い、結果は検索結果の順番で受け取る
+    # (サイドカーがあれば読み込み、元ファイルが変わっていれば再解析する)
+    with phase('analyze', 'load_files'):
+        outcomes = load_experiments_parallel(experiments, full_concat)
+    for exp, result, error in outcomes:
+        file_path = exp['file_path'] # データベースからファイルパスを取得
+        if error is None:
+            df, summary, update = result
+            if update is not None:
+                save_experiment_update(db, exp['id'], update)
+            if full_concat:
+                all_data_frames.append(df) # 読み込んだデータフレームをリストに追加
+            else:
+                all_summaries.append(summary)
+        elif isinstance(error, measurement_cache.UnsupportedFileFormat):
+            messages.append((str(error), "warning"))
+        elif isinstance(error, FileNotFoundError):
+            messages.append((f"エラー: ファイルが見つかりません - {file_path}", "error"))
+        elif isinstance(error, TimeoutError):
+            messages.append((f"エラー: ファイル '{file_path}' の読み込みがタイムアウトしました - {error}", "error"))
+        else:
+            messages.append((f"エラー: ファイル '{file_path}' の読み込み中に問題が発生しました - {error}", "error"))
+    db.commit()
+    check_cancelled()
+
+    # すべてのデータフレームを結合
+    if all_data_frames:
+        with phase('analyze', 'concat'):
+            combined_df = pd.concat(all_data_frames, ignore_index=True)
+        messages.append((f"すべてのファイルを結合しました。総データ件数: {len(combined_df)}", "success"))
+
+        # ここで結合されたcombined_dfを使った分析ロジックが続く
+        # とりあえず、結合データの最初の5行と統計情報を表示してみる
+        with phase('analyze', 'describe'):
+            description = combined_df.describe()
+        with phase('analyze', 'to_html'):
+            return {
+                'message': 'データ結合が成功しました。',
+                'head': combined_df.head().to_html(classes='table table-striped'), # 最初の5行をHTMLテーブル形式で
+                'description': description.to_html(classes='table table-striped') # 統計情報をHTMLテーブル形式で
+            }, messages
+    # ファイルごとの要約統計をマージして統計情報を作る
+    if all_summaries:
+        with phase('analyze', 'merge_summaries'):
+            merged_summary = summary_stats.merge_summaries(all_summaries)
+        messages.append((f"{len(all_summaries)} 件のファイルの要約統計を集計しました。総データ件数: {merged_summary['n_rows']}", "success"))
+        with phase('analyze', 'describe'):
+            description = summary_stats.describe(merged_summary)
+        with phase('analyze', 'to_html'):
+            return {
+                'message': '要約統計の集計が成功しました。(分位点は近似値です)',
+                'description': description.to_html(classes='table table-striped')
+            }, messages
+
+    messages.append(("条件に一致するファイルを読み込めませんでした。", "error"))
+    return {'message': 'ファイル読み込み失敗'}, messages
+
+# 検索条件に一致する実験データの G', G'' から Z, τe, Ge を推定する (逆フィット)
+# 全ファイルの測定曲線をまとめて索引で探索する。戻り値は (ファイルごとの結果のリスト, messages)
+def run_inverse_fit(db, device_name='', sample_name=''):
+    messages = []
+    index = get_inverse_index()
+    if index is None:
+        messages.append(("ルックアップテーブルが見つからないため逆フィットできません。'python lookup_table.py' を実行して作成してください。", "error"))
+        return [], messages
+    with phase('inverse_fit', 'query'):
+        experiments = query_analysis_experiments(db, device_name, sample_name)
+    if not experiments:
+        messages.append(("条件に一致する実験データが見つかりませんでした。", "error"))
+        return [], messages
+
+    with phase('inverse_fit', 'load_files'):
+        outcomes = load_experiments_parallel(experiments, True)
+    results = []
+    curves = []
+    fitted = []
+    for exp, result, error in outcomes:
+        row = {'id': exp['id'], 'file_name': exp['file_name'], 'sample_name': exp['sample_name']}
+        results.append(row)
+        if error is not None:
+            row['error'] = f"読み込めませんでした - {error}"
+            continue
+        df, _, update = result
+        if update is not None:
+            save_experiment_update(db, exp['id'], update)
+        try:
+            curves.append(inverse_fit.measurement_curve(df))
+            fitted.append(row)
+        except ValueError as e:
+            row['error'] = str(e)
+    db.commit()
+
+    with phase('inverse_fit', 'fit'):
+        fits = index.fit(curves)
+    for row, fit in zip(fitted, fits):
+        row.update(fit)
+    n_fitted = sum(1 for row in results if 'error' not in row)
+    if n_fitted:
+        messages.append((f"{n_fitted} 件のファイルで Z と τe を推定しました。", "success"))
+    if n_fitted < len(results):
+        messages.append((f"{len(results) - n_fitted} 件のファイルは推定できませんでした。(理由は表を参照)", "warning"))
+    return results, messages
+
+# 測定データの中身による横断検索
+# predicates は measurement_query.parse_predicates の結果。装置名・サンプル名の条件と、ゾーンマップで範囲が
+# 重ならないファイルの除外を1つのSQLで行い、残ったファイルだけを並列に読み込んで行ごとに判定する。
+# 戻り値は (一致したファイルの結果のリスト, 件数の集計, messages)
+def run_measurement_query(db, predicates, columns=(), device_name='', sample_name='', max_rows=20):
+    messages = []
+    with phase('query', 'pushdown'):
+        where, params = experiment_search_clause(device_name, sample_name)
+        total = db.execute(f'SELECT COUNT(*) FROM experiments WHERE {where}', params).fetchone()[0]
+        zone_where, zone_params = measurement_query.pushdown_clause(predicates)
+        candidates = db.execute(f'SELECT * FROM experiments WHERE {where} AND {zone_where} ORDER BY id',
+                                params + zone_params).fetchall()
+    request_metrics.inc('query_files_total', total - len(candidates), result='skipped')
+    request_metrics.inc('query_files_total', len(candidates), result='scanned')
+
+    # 条件と出力に使う列だけをサイドカーから読む (サイドカーが古い場合は read_experiment で再解析する)
+    wanted = measurement_query.raw_names([name for name, _, _ in predicates] + list(columns))
+    wanted.add(measurement_query.INTERVAL_COLUMN)
+
+    def scan(exp, want_frame, parsed_folder):
+        update = None
+        if exp['parsed_path'] and exp['summary_json'] and os.path.exists(exp['parsed_path']) and \
+           measurement_cache.file_signature(exp['file_path']) == (exp['parsed_mtime'], exp['parsed_size']):
+            df = measurement_cache.read_sidecar(exp['parsed_path'], wanted)
+            request_metrics.inc('files_read_total', source='sidecar')
+        else:
+            df, _, update = read_experiment(exp, True, parsed_folder)
+        return measurement_query.scan_frame(df, predicates, columns, max_rows), update
+
+    with phase('query', 'scan'):
+        outcomes = load_experiments_parallel(candidates, True, read=scan)
+    results = []
+    n_failed = 0
+    for exp, result, error in outcomes:
+        if error is not None:
+            n_failed += 1
+            messages.append(f"ファイル '{exp['file_name']}' (id: {exp['id']}) を読み込めませんでした - {error}")
+            continue
+        scanned, update = result
+        if update is not None:
+            save_experiment_update(db, exp['id'], update)
+        if scanned['matched_rows']:
+            item = {field: exp[field] for field in EXPERIMENT_JSON_FIELDS}
+            item.update(scanned)
+            results.append(item)
+    db.commit()
+
+    counts = {
+        'experiments': total,
+        'skipped': total - len(candidates),
+        'scanned': len(candidates) - n_failed,
+        'failed': n_failed,
+        'matched': len(results),
+    }
+    return results, counts, messages
+
+# バックグラウンドジョブとして分析を実行する (ワーカースレッドで呼ばれる)
+def run_analysis_job(params, check_cancelled):
+    with app.app_context():
+        analysis_result, messages = run_analysis(
+            get_db(), params['device_name'], params['sample_name'], params['full_concat'],
+            check_cancelled=check_cancelled)
+    return {'analysis_result': analysis_result, 'messages': messages}
+
+# 分析ジョブのキュー (ジョブの状態は database.db の jobs テーブルに保存する)
+job_queue = jobs.JobQueue(
+    connect_db,
+    max_workers=app.config['JOB_MAX_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING'],
+    max_stored=app.config['JOB_MAX_STORED'],
+    heartbeat_seconds=app.config['JOB_HEARTBEAT_SECONDS'],
+    stale_seconds=app.config['JOB_STALE_SECONDS'],
+)
+job_queue.register('analyze', run_analysis_job)
+
+# 分析ジョブを登録する。同じ条件・同じ内容のファイルに対する結果があれば、それを使う
+# 戻り値は (job_id, 既存ジョブを再利用したか)。実行待ちが多すぎる場合は jobs.QueueFull
+def submit_analysis_job(db, device_name, sample_name, full_concat):
+    experiments = query_analysis_experiments(db, device_name, sample_name)
+    params = {'device_name': device_name, 'sample_name': sample_name, 'full_concat': full_concat}
+    return job_queue.submit('analyze', params, analysis_cache_key(experiments, device_name, sample_name, full_concat))
+
 # データ分析ページの設定
 @app.route('/analyze', methods=['GET', 'POST'])
 def analyze_data():
@@ -263,12 +1371,23 @@ def analyze_data():
         return redirect(url_for('login'))
 
     # 機械学習モデルがロードされていない場合はエラーメッセージを表示
-    if loaded_gp_model is None or loaded_gpp_model is None or loaded_scaler is None:
+    # (このリクエストの間は、途中でモデルが切り替わっても同じバージョンを使う)
+    model = registry.active()
+    if model is None:
         flash("エラー: 機械学習モデルが読み込まれていません。管理者にお問い合わせください。", "error")
         return render_template('analyze.html', ml_error=True)
 
     prediction_results = {}
     analysis_result = {} # 既存のデータ結合表示用
+
+    # 逆フィット (測定した G', G'' からの Z・τe の推定) のフォーム
+    if request.method == 'POST' and request.form.get('analysis_mode') == 'inverse_fit':
+        inverse_results, messages = run_inverse_fit(get_db(), request.form.get('device_name', ''),
+                                                    request.form.get('sample_name', ''))
+        for message, category in messages:
+            flash(message, category)
+        with phase('analyze', 'render'):
+            return render_template('analyze.html', inverse_results=inverse_results)
     
     if request.method == 'POST':
         # --- ここから既存のデータ分析・結合ロジック ---
@@ -276,94 +1395,615 @@ def analyze_data():
         device_name = request.form.get('device_name', '')
         sample_name = request.form.get('sample_name', '')
 
+        # 全ファイルの結合はチェックボックスで指定した場合のみ行う
+        # (既定では保存済みの要約統計をマージし、元ファイルは読まない)
+        full_concat = request.form.get('full_concat') == '1'
+
         db = get_db()
-        query = "SELECT * FROM experiments WHERE device_name LIKE ? AND sample_name LIKE ?"
-        params = [f"%{device_name}%", f"%{sample_name}%"]
-        
-        experiments = db.execute(query, params).fetchall()
-        db.close()
-        
-        all_data_frames = [] # 複数のデータフレームを一時的に格納するリスト
-        
-        if experiments:
-            for exp in experiments:
-                file_path = exp['file_path'] # データベースからファイルパスを取得
-                try:
-                    # ファイルの拡張子に基づいて読み込み方法を判断
-                    if file_path.endswith('.xlsx'):
-                        df = pd.read_excel(file_path)
-                    elif file_path.endswith('.csv'):
-                        try:
-                            df = pd.read_csv(file_path, encoding='shift_jis')
-                        except UnicodeDecodeError:
-                            try:
-                                df = pd.read_csv(file_path, encoding='cp932')
-                            except UnicodeDecodeError:
-                                df = pd.read_csv(file_path, encoding='utf-8')
-                    else:
-                        flash(f"未対応のファイル形式: {file_path}", "warning")
-                        continue # 次のファイルへ
-
-                    all_data_frames.append(df) # 読み込んだデータフレームをリストに追加
-
-                except FileNotFoundError:
-                    flash(f"エラー: ファイルが見つかりません - {file_path}", "error")
-                except Exception as e:
-                    flash(f"エラー: ファイル '{file_path}' の読み込み中に問題が発生しました - {e}", "error")
-            
-            # すべてのデータフレームを結合
-            if all_data_frames:
-                combined_df = pd.concat(all_data_frames, ignore_index=True)
-                flash(f"すべてのファイルを結合しました。総データ件数: {len(combined_df)}", "success")
-
-                # ここで結合されたcombined_dfを使った分析ロジックが続く
-                # とりあえず、結合データの最初の5行と統計情報を表示してみる
-                analysis_result = {
-                    'message': 'データ結合が成功しました。',
-                    'head': combined_df.head().to_html(classes='table table-striped'), # 最初の5行をHTMLテーブル形式で
-                    'description': combined_df.describe().to_html(classes='table table-striped') # 統計情報をHTMLテーブル形式で
-                }
+
+        # バックグラウンド実行を指定した場合は、ジョブを登録して状態表示ページへ移る
+        if request.form.get('background') == '1':
+            try:
+                job_id, reused = submit_analysis_job(db, device_name, sample_name, full_concat)
+            except jobs.QueueFull as e:
+                flash(f"エラー: {e} しばらくしてから再度実行してください。", "error")
+                return render_template('analyze.html')
+            if reused:
+                flash("同じ条件の分析ジョブが登録済みのため、その結果を表示します。", "info")
             else:
-                flash("条件に一致するファイルを読み込めませんでした。", "error")
-                analysis_result = {'message': 'ファイル読み込み失敗'}
-        else:
-            flash("条件に一致する実験データが見つかりませんでした。", "error")
-            analysis_result = {'message': 'データなし'}
+                flash("分析ジョブを登録しました。", "success")
+            return redirect(url_for('analysis_job', job_id=job_id))
+
+        analysis_result, messages = run_analysis(db, device_name, sample_name, full_concat)
+        for message, category in messages:
+            flash(message, category)
         # --- ここまで既存のデータ分析・結合ロジック ---
 
 
         # --- ここから機械学習予測ロジックを追加 ---
+        predict_engine = request.form.get('predict_engine', 'lgbm')
+        input_omega = None
         try:
             # フォームからZとomega_tau_eを取得
             input_z = float(request.form['predict_z_value'])
             input_omega = float(request.form['predict_omega_value'])
 
-            # 入力値をnumpy配列に変換し、スケーリング
-            # scalerは2つの特徴量 (Z, omega_tau_e) を期待するので、それに合わせた形状にする
-            input_data = np.array([[input_z, input_omega]])
-            scaled_input_data = loaded_scaler.transform(input_data)
-
-            # モデルで予測
-            predicted_gp_over_ge = loaded_gp_model.predict(scaled_input_data)[0]
-            predicted_gpp_over_ge = loaded_gpp_model.predict(scaled_input_data)[0]
+            # 選択されたエンジンで予測 (一括予測APIと同じ処理を1点で使う)
+            with phase('analyze', 'predict'):
+                predicted_gp, predicted_gpp = predict_with_engine([input_z], [input_omega], predict_engine, model)
+            predicted_gp_over_ge = predicted_gp[0]
+            predicted_gpp_over_ge = predicted_gpp[0]
 
             prediction_results = {
                 'input_z': input_z,
                 'input_omega': input_omega,
+                'engine': predict_engine,
                 'predicted_gp_over_ge': f"{predicted_gp_over_ge:.4e}", # 指数表記で表示
-                'predicted_gpp_over_ge': f"{predicted_gpp_over_ge:.4e}" # 指数表記で表示
+                'predicted_gpp_over_ge': f"{predicted_gpp_over_ge:.4e}", # 指数表記で表示
+                'model_version': model.name,
             }
 
-        except ValueError:
-            flash("予測のためのZまたはOmegaの値が不正です。数値を入力してください。", "error")
+            # 厳密計算の場合は、同じ点のサロゲートモデル (LightGBM) の予測とのずれも表示する
+            if predict_engine == 'exact':
+                with phase('analyze', 'predict'):
+                    deviation = surrogate_deviation(np.array([input_z]), np.array([input_omega]),
+                                                    predicted_gp, predicted_gpp, model)
+                prediction_results.update({
+                    'surrogate_gp_over_ge': f"{deviation['Gp_over_Ge'][0]:.4e}",
+                    'surrogate_gpp_over_ge': f"{deviation['Gpp_over_Ge'][0]:.4e}",
+                    'deviation_gp': f"{deviation['relative_Gp'][0]:+.2%}",
+                    'deviation_gpp': f"{deviation['relative_Gpp'][0]:+.2%}",
+                    'in_training_range': deviation['n_in_training_range'] == 1,
+                })
+
+        except exact_physics.TimeBudgetExceeded as e:
+            flash(f"厳密計算が制限時間を超えました: {e}", "error")
+        except ValueError as e:
+            # 数値に変換できた後のエラーは厳密計算の入力範囲の確認によるもの
+            if predict_engine == 'exact' and input_omega is not None:
+                flash(f"予測の入力が不正です: {e}", "error")
+            else:
+                flash("予測のためのZまたはOmegaの値が不正です。数値を入力してください。", "error")
         except Exception as e:
             flash(f"予測中にエラーが発生しました: {e}", "error")
         # --- ここまで機械学習予測ロジック ---
 
     # GETリクエストの場合、またはPOSTリクエスト後のレンダリング
-    return render_template('analyze.html',
-                           analysis_result=analysis_result,
-                           prediction_results=prediction_results)
+    with phase('analyze', 'render'):
+        return render_template('analyze.html',
+                               analysis_result=analysis_result,
+                               prediction_results=prediction_results)
+
+# 分析ジョブの状態・結果の表示ページ (実行中は自動で再読み込みする)
+@app.route('/analyze/jobs/<job_id>')
+def analysis_job(job_id):
+    if not session.get('logged_in'):
+        flash('ログインが必要です。')
+        return redirect(url_for('login'))
+
+    job = job_queue.get(job_id)
+    if job is None:
+        flash("指定された分析ジョブが見つかりません。", "error")
+        return redirect(url_for('analyze_data'))
+    return render_template('analysis_job.html', job=job, finished=job['status'] in jobs.FINISHED_STATUSES)
+
+# 分析ジョブのキャンセル (画面から)
+@app.route('/analyze/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_analysis_job(job_id):
+    if not session.get('logged_in'):
+        flash('ログインが必要です。')
+        return redirect(url_for('login'))
+
+    status = job_queue.cancel(job_id)
+    if status is None:
+        flash("指定された分析ジョブが見つかりません。", "error")
+        return redirect(url_for('analyze_data'))
+    if status == jobs.RUNNING:
+        flash("キャンセルを要求しました。現在の処理の区切りで停止します。", "info")
+    elif status == jobs.CANCELLED:
+        flash("分析ジョブをキャンセルしました。", "success")
+    else:
+        flash("分析ジョブはすでに終了しています。", "warning")
+    return redirect(url_for('analysis_job', job_id=job_id))
+
+# 分析ジョブAPI: 登録 (すぐにジョブIDを返す)
+# リクエスト例: {"device_name": "MCR", "sample_name": "", "full_concat": false}
+@app.route('/api/analyze/jobs', methods=['POST'])
+def api_submit_analysis_job():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON形式のリクエストボディが必要です。'}), 400
+
+    try:
+        job_id, reused = submit_analysis_job(
+            get_db(), str(payload.get('device_name', '')), str(payload.get('sample_name', '')),
+            bool(payload.get('full_concat', False)))
+    except jobs.QueueFull as e:
+        return jsonify({'error': str(e)}), 429
+
+    job = job_queue.get(job_id)
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'reused': reused,
+        'status_url': url_for('api_analysis_job', job_id=job_id),
+    }), 202
+
+# 分析ジョブAPI: 状態と結果の取得
+@app.route('/api/analyze/jobs/<job_id>')
+def api_analysis_job(job_id):
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': '指定された分析ジョブが見つかりません。'}), 404
+    job['job_id'] = job.pop('id')
+    job.pop('cache_key')
+    return jsonify(job)
+
+# 分析ジョブAPI: キャンセル
+@app.route('/api/analyze/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_analysis_job(job_id):
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+
+    status = job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({'error': '指定された分析ジョブが見つかりません。'}), 404
+    return jsonify({'job_id': job_id, 'status': status, 'cancel_requested': status == jobs.RUNNING})
+
+# 分析ジョブの件数 (状態ごと) と同時実行数の設定を返す
+@app.route('/api/analyze/jobs/stats')
+def analysis_job_stats():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+    return jsonify(job_queue.stats())
+
+# リクエストで指定された整数の設定値を範囲内か確認して返す (未指定なら default)
+def bounded_int_param(payload, name, default, value_range):
+    value = payload.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or int(value) != value:
+        raise ValueError(f"'{name}' には整数を指定してください。")
+    if not value_range[0] <= value <= value_range[1]:
+        raise ValueError(f"'{name}' は {value_range[0]} 以上 {value_range[1]} 以下で指定してください。")
+    return int(value)
+
+# 一括予測API の厳密計算 (engine='exact')
+# 追加で指定できる項目: "time_budget" (秒), "n_t" (t/τe の点数), "n_terms" (Prony 項数)
+# 結果に加えて、Z ごとのフィット残差と、サロゲートモデル (LightGBM) の予測とのずれを返す
+def api_predict_exact(payload, z_values, omega_values):
+    try:
+        validate_exact_inputs(z_values)
+        n_t = bounded_int_param(payload, 'n_t', app.config['EXACT_N_T'], app.config['EXACT_N_T_RANGE'])
+        n_terms = bounded_int_param(payload, 'n_terms', app.config['EXACT_N_TERMS'],
+                                    app.config['EXACT_N_TERMS_RANGE'])
+        time_budget = payload.get('time_budget', app.config['EXACT_TIME_BUDGET'])
+        if isinstance(time_budget, bool) or not isinstance(time_budget, (int, float)) or \
+           not 0 < time_budget <= app.config['EXACT_MAX_TIME_BUDGET']:
+            raise ValueError(
+                f"'time_budget' は 0 より大きく {app.config['EXACT_MAX_TIME_BUDGET']:g} 以下の秒数で指定してください。")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 点数が多い場合もストリーミングはしない (制限時間の超過をステータスコードで返すため)
+    n_points = z_values.size * omega_values.size
+    if n_points > app.config['PREDICT_STREAM_THRESHOLD']:
+        return jsonify({
+            'error': f"厳密計算の予測点数 ({n_points}) が上限 ({app.config['PREDICT_STREAM_THRESHOLD']}) を超えています。",
+        }), 413
+
+    z_grid = np.repeat(z_values, omega_values.size)
+    omega_grid = np.tile(omega_values, z_values.size)
+    start = time.perf_counter()
+    try:
+        predicted_gp, predicted_gpp, fits = exact_engine.predict(
+            z_grid, omega_grid, time_budget=float(time_budget), n_t=n_t, n_terms=n_terms)
+    except exact_physics.TimeBudgetExceeded as e:
+        # フィット済みの Z はキャッシュに残るので、再実行すると続きから計算される
+        return jsonify({'error': f"{e} 再実行すると計算済みのZは再利用されます。"}), 503
+    elapsed = time.perf_counter() - start
+
+    response = {
+        'n_points': int(n_points),
+        'engine': 'exact',
+        'n_t': n_t,
+        'n_terms': n_terms,
+        'elapsed_seconds': elapsed,
+        'fits': fits,
+        'Z': z_grid.tolist(),
+        'omega_tau_e': omega_grid.tolist(),
+        'Gp_over_Ge': predicted_gp.tolist(),
+        'Gpp_over_Ge': predicted_gpp.tolist(),
+    }
+    deviation = surrogate_deviation(z_grid, omega_grid, predicted_gp, predicted_gpp)
+    if deviation is not None:
+        # NaN (厳密値が0の点) は JSON では null にする
+        response['surrogate'] = {
+            'Gp_over_Ge': deviation['Gp_over_Ge'].tolist(),
+            'Gpp_over_Ge': deviation['Gpp_over_Ge'].tolist(),
+            'relative_deviation_Gp': [None if np.isnan(v) else v for v in deviation['relative_Gp'].tolist()],
+            'relative_deviation_Gpp': [None if np.isnan(v) else v for v in deviation['relative_Gpp'].tolist()],
+            'summary': deviation['summary'],
+            'n_in_training_range': deviation['n_in_training_range'],
+            'model_version': deviation['model_version'],
+        }
+    return jsonify(response)
+
+# 一括予測API (G'/G'' の周波数スイープ)
+# リクエスト例: {"z": [10, 20], "omega_tau_e": {"start": 1e-6, "stop": 10, "num": 1000, "scale": "log"}, "engine": "table"}
+# Z × ωτe の全組み合わせを一度にスケーリング・予測し、列ごとの配列で返す
+# engine="exact" の場合は LM(2002) を直接計算し、サロゲートモデルとのずれも返す (api_predict_exact)
+@app.route('/api/predict', methods=['POST'])
+def api_predict():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON形式のリクエストボディが必要です。'}), 400
+
+    try:
+        z_values = parse_sweep_values(payload.get('z'), 'z', app.config['PREDICT_MAX_POINTS'])
+        omega_values = parse_sweep_values(payload.get('omega_tau_e'), 'omega_tau_e', app.config['PREDICT_MAX_POINTS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    engine = payload.get('engine', 'lgbm')
+    if engine not in PREDICT_ENGINES:
+        return jsonify({'error': f"engine は {', '.join(PREDICT_ENGINES)} のいずれかを指定してください。"}), 400
+    if engine == 'exact':
+        return api_predict_exact(payload, z_values, omega_values)
+    # このリクエストの間は、途中でモデルが切り替わっても同じバージョンを使う
+    model = registry.active()
+    if model is None:
+        return jsonify({'error': '機械学習モデルが読み込まれていません。'}), 503
+    if engine == 'table' and get_lookup_table() is None:
+        return jsonify({'error': 'ルックアップテーブルが見つかりません。'}), 503
+
+    n_points = z_values.size * omega_values.size
+    if n_points > app.config['PREDICT_MAX_POINTS']:
+        return jsonify({
+            'error': f"予測点数 ({n_points}) が上限 ({app.config['PREDICT_MAX_POINTS']}) を超えています。",
+        }), 413
+
+    stream = payload.get('stream')
+    if stream is None:
+        stream = n_points > app.config['PREDICT_STREAM_THRESHOLD']
+
+    if stream:
+        # 大きなスイープはZごとに1行ずつ (NDJSON) 返し、全結果をメモリに溜めない
+        def generate():
+            yield json.dumps({
+                'n_z': int(z_values.size),
+                'n_omega': int(omega_values.size),
+                'n_points': int(n_points),
+                'engine': engine,
+                'model_version': model.name,
+            }) + '\n'
+            for z in z_values:
+                predicted_gp, predicted_gpp = predict_with_engine(np.full(omega_values.size, z), omega_values,
+                                                                  engine, model)
+                yield json.dumps({
+                    'Z': float(z),
+                    'omega_tau_e': omega_values.tolist(),
+                    'Gp_over_Ge': predicted_gp.tolist(),
+                    'Gpp_over_Ge': predicted_gpp.tolist(),
+                }) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    # Z を外側、ωτe を内側としたグリッドを作り、1回の呼び出しで予測
+    z_grid = np.repeat(z_values, omega_values.size)
+    omega_grid = np.tile(omega_values, z_values.size)
+    predicted_gp, predicted_gpp = predict_with_engine(z_grid, omega_grid, engine, model)
+
+    return jsonify({
+        'n_points': int(n_points),
+        'engine': engine,
+        'model_version': model.name,
+        'Z': z_grid.tolist(),
+        'omega_tau_e': omega_grid.tolist(),
+        'Gp_over_Ge': predicted_gp.tolist(),
+        'Gpp_over_Ge': predicted_gpp.tolist(),
+    })
+
+# 逆フィットのJSON版: {"device_name": "...", "sample_name": "..."} に一致する全ファイルの Z, τe, Ge と残差
+@app.route('/api/inverse-fit', methods=['POST'])
+def api_inverse_fit():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON形式のリクエストボディが必要です。'}), 400
+    if get_inverse_index() is None:
+        return jsonify({'error': 'ルックアップテーブルが見つかりません。'}), 503
+    results, messages = run_inverse_fit(get_db(), str(payload.get('device_name', '')),
+                                        str(payload.get('sample_name', '')))
+    return jsonify({'results': results, 'messages': [message for message, _ in messages]})
+
+# 測定データの中身による横断検索
+# リクエスト例: {"where": {"shear_rate": {"min": 90, "max": 110}, "temperature": [19, 21], "viscosity": {"min": 80}},
+#               "columns": ["shear_stress"], "device_name": "", "sample_name": "", "max_rows": 20}
+# 同じ測定点ですべての条件を満たすファイルと、一致した行 (最初の max_rows 行) を返す。値は各ファイルの単位で比較する
+# (レオメーターのエクスポートでは shear_rate: 1/s, temperature: °C, viscosity: mPa·s, shear_stress: Pa, torque: mN·m)
+@app.route('/api/query', methods=['POST'])
+def api_measurement_query():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON形式のリクエストボディが必要です。'}), 400
+    try:
+        predicates = measurement_query.parse_predicates(payload.get('where'))
+        columns = payload.get('columns', [])
+        if not isinstance(columns, list) or not all(isinstance(column, str) for column in columns):
+            raise ValueError("'columns' には列名のリストを指定してください。")
+        max_rows = bounded_int_param(payload, 'max_rows', app.config['QUERY_DEFAULT_ROWS'],
+                                     (0, app.config['QUERY_MAX_ROWS']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    start = time.perf_counter()
+    results, counts, messages = run_measurement_query(
+        get_db(), predicates, columns, str(payload.get('device_name', '')), str(payload.get('sample_name', '')),
+        max_rows)
+    return jsonify({
+        'where': [{'column': name, 'min': None if low == -np.inf else low, 'max': None if high == np.inf else high}
+                  for name, low, high in predicates],
+        'files': counts,
+        'elapsed_seconds': time.perf_counter() - start,
+        'results': results,
+        'messages': messages,
+    })
+
+# グラフ用の間引きデータのリクエスト値 (width, method) を確認して返す
+def requested_curve_params(values):
+    method = values.get('method', 'lttb')
+    if method not in downsample.METHODS:
+        raise ValueError(f"method は {', '.join(downsample.METHODS)} のいずれかを指定してください。")
+    width_min, width_max = app.config['CURVE_WIDTH_RANGE']
+    try:
+        width = int(values.get('width', app.config['CURVE_DEFAULT_WIDTH']))
+    except (TypeError, ValueError):
+        raise ValueError("'width' には整数を指定してください。")
+    if not width_min <= width <= width_max:
+        raise ValueError(f"'width' は {width_min} 以上 {width_max} 以下で指定してください。")
+    return width, method
+
+# 間引きデータをキャッシュする形 (JSONのバイト列) にする。キャッシュから返すときは変換し直さない
+def encode_curves(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+# 間引きデータのレスポンス。ETag はキャッシュのキーから作り、内容が同じなら 304 を返す
+def curve_response(key, body):
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha256(repr(key).encode('utf-8')).hexdigest())
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+# 実験データ1件の曲線を、グラフの幅に合わせて間引いて返す
+# 例: GET /api/experiments/12/curves?width=800&method=lttb (method は lttb または minmax)
+# 周波数・せん断速度を横軸にする測定は log10 の横軸で区間に分ける。インターバルと列ごとに1系列を返す
+@app.route('/api/experiments/<int:experiment_id>/curves')
+def api_experiment_curves(experiment_id):
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+    try:
+        width, method = requested_curve_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    db = get_db()
+    with phase('curves', 'query'):
+        exp = db.execute('SELECT * FROM experiments WHERE id = ?', (experiment_id,)).fetchone()
+    if exp is None:
+        return jsonify({'error': 'ファイルが見つかりません。'}), 404
+    key = ('experiment', experiment_content_key(exp), width, method)
+
+    def compute():
+        with phase('curves', 'load_files'):
+            df, _, update = read_experiment(exp, True, app.config['PARSED_FOLDER'])
+        if update is not None:
+            save_experiment_update(db, exp['id'], update)
+            db.commit()
+        with phase('curves', 'downsample'):
+            payload = downsample.measurement_series(df, width, method)
+        return encode_curves(dict(payload, content_hash=key[1], width=width, method=method))
+
+    try:
+        body = curve_cache.get_or_compute(key, compute)
+    except FileNotFoundError:
+        return jsonify({'error': f"ファイルが見つかりません - {exp['file_name']}"}), 404
+    except measurement_cache.UnsupportedFileFormat as e:
+        return jsonify({'error': str(e)}), 400
+    return curve_response(key, body)
+
+# 予測スイープ (Z ごとの G'/Ge, G''/Ge) を、グラフの幅に合わせて間引いて返す
+# リクエストは /api/predict と同じ形式に width, method を加えたもの。ωτe は対数軸で区間に分ける
+@app.route('/api/predict/curves', methods=['POST'])
+def api_predict_curves():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'JSON形式のリクエストボディが必要です。'}), 400
+    try:
+        z_values = parse_sweep_values(payload.get('z'), 'z', app.config['PREDICT_MAX_POINTS'])
+        omega_values = parse_sweep_values(payload.get('omega_tau_e'), 'omega_tau_e', app.config['PREDICT_MAX_POINTS'])
+        width, method = requested_curve_params(payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    engine = payload.get('engine', 'lgbm')
+    if engine not in PREDICT_ENGINES:
+        return jsonify({'error': f"engine は {', '.join(PREDICT_ENGINES)} のいずれかを指定してください。"}), 400
+    model = registry.active()
+    if model is None and engine != 'exact':
+        return jsonify({'error': '機械学習モデルが読み込まれていません。'}), 503
+    n_points = z_values.size * omega_values.size
+    max_points = app.config['PREDICT_STREAM_THRESHOLD' if engine == 'exact' else 'PREDICT_MAX_POINTS']
+    if n_points > max_points:
+        return jsonify({'error': f"予測点数 ({n_points}) が上限 ({max_points}) を超えています。"}), 413
+
+    # 予測結果はエンジン・モデルのバージョン・入力値だけで決まるため、それらのハッシュを内容ハッシュにする
+    digest = hashlib.sha256()
+    if engine == 'exact':
+        digest.update(f"exact:{app.config['EXACT_N_T']}:{app.config['EXACT_N_TERMS']}".encode('utf-8'))
+    else:
+        digest.update(f"{engine}:{model.content_hash}".encode('utf-8'))
+    digest.update(z_values.tobytes())
+    digest.update(omega_values.tobytes())
+    key = ('prediction', digest.hexdigest(), width, method)
+
+    def compute():
+        z_grid = np.repeat(z_values, omega_values.size)
+        omega_grid = np.tile(omega_values, z_values.size)
+        with phase('curves', 'predict'):
+            predicted_gp, predicted_gpp = predict_with_engine(z_grid, omega_grid, engine, model)
+        series = []
+        with phase('curves', 'downsample'):
+            for i, z in enumerate(z_values):
+                rows = slice(i * omega_values.size, (i + 1) * omega_values.size)
+                for name, values in (('Gp_over_Ge', predicted_gp), ('Gpp_over_Ge', predicted_gpp)):
+                    entry = {'Z': float(z), 'y_column': name, 'y_scale': 'log'}
+                    entry.update(downsample.downsample_series(omega_values, values[rows], width, method,
+                                                              log_x=True, log_y=True))
+                    series.append(entry)
+        return encode_curves({
+            'engine': engine,
+            'model_version': model.name if model is not None and engine != 'exact' else None,
+            'width': width,
+            'method': method,
+            'x_column': 'omega_tau_e',
+            'x_scale': 'log',
+            'series': series,
+        })
+
+    try:
+        body = curve_cache.get_or_compute(key, compute)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except exact_physics.TimeBudgetExceeded as e:
+        return jsonify({'error': f"{e} 再実行すると計算済みのZは再利用されます。"}), 503
+    return curve_response(key, body)
+
+# 予測キャッシュの統計 (ヒット/ミス/追い出し回数) を返す
+@app.route('/api/cache/stats')
+def cache_stats():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+    stats = prediction_cache.stats()
+    model = registry.active()
+    stats['model_version'] = model.name if model is not None else None
+    stats['exact'] = exact_engine.stats()
+    stats['curves'] = curve_cache.stats()
+    return jsonify(stats)
+
+# モデルのバージョン: 有効なバージョン・読み込み中のバージョン・保存済みのバージョンの一覧 (manifest の評価指標)
+@app.route('/api/models')
+def api_models():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+    status = registry.status()
+    status['versions'] = [
+        {key: manifest.get(key) for key in ('version', 'content_hash', 'created_at', 'metrics')}
+        for manifest in model_registry.list_versions(MODEL_DIR)
+    ]
+    return jsonify(status)
+
+# モデルの切り替え: {"version": "..."} を指定するとそのバージョンを有効にし (versions/CURRENT を更新)、
+# 省略すると CURRENT を読み直す。読み込みとウォームアップは別スレッドで行い、完了すると差し替わる
+@app.route('/api/models/reload', methods=['POST'])
+def api_reload_models():
+    if not session.get('logged_in'):
+        return jsonify({'error': 'ログインが必要です。'}), 401
+    payload = request.get_json(silent=True) or {}
+    version = payload.get('version')
+    if version is not None:
+        if not isinstance(version, str) or not version or os.sep in version or version.startswith('.'):
+            return jsonify({'error': 'version にはバージョン名を指定してください。'}), 400
+        try:
+            model_registry.activate(MODEL_DIR, version)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 404
+    started = registry.reload(version)
+    status = registry.status()
+    status['reload_started'] = started
+    return jsonify(status), 202
+
+# /metrics に含める、他のオブジェクトが持つ値 (予測キャッシュ・厳密計算・間引きデータのキャッシュ・分析ジョブ・モデルの状態)
+def collect_app_state():
+    cache = prediction_cache.stats()
+    exact = exact_engine.stats()
+    curves = curve_cache.stats()
+    job_counts = job_queue.stats()['counts']
+    status = registry.status()
+    active = status['active']
+    families = [
+        ('prediction_cache_entries', metrics.GAUGE, '予測キャッシュ (メモリ) の件数', [({}, cache['entries'])]),
+        ('prediction_cache_hits_total', metrics.COUNTER, '予測キャッシュのヒット数',
+         [({'tier': 'memory'}, cache['hits']), ({'tier': 'disk'}, cache['disk_hits'])]),
+        ('prediction_cache_misses_total', metrics.COUNTER, '予測キャッシュのミス数', [({}, cache['misses'])]),
+        ('prediction_cache_evictions_total', metrics.COUNTER, '予測キャッシュから追い出した件数', [({}, cache['evictions'])]),
+        ('exact_cache_entries', metrics.GAUGE, '厳密計算の Prony 係数のキャッシュ件数', [({}, exact['entries'])]),
+        ('exact_fits_total', metrics.COUNTER, '厳密計算で Prony フィットを行った Z の数', [({}, exact['misses'])]),
+        ('exact_cache_hits_total', metrics.COUNTER, '厳密計算で Prony 係数をキャッシュから使った回数', [({}, exact['hits'])]),
+        ('exact_fit_seconds_total', metrics.COUNTER, '厳密計算の Prony フィットにかかった時間の合計', [({}, exact['fit_seconds'])]),
+        ('curve_cache_entries', metrics.GAUGE, 'グラフ用の間引きデータのキャッシュ件数', [({}, curves['entries'])]),
+        ('curve_cache_hits_total', metrics.COUNTER, 'グラフ用の間引きデータをキャッシュから返した回数', [({}, curves['hits'])]),
+        ('curve_cache_misses_total', metrics.COUNTER, 'グラフ用の間引きデータを計算した回数', [({}, curves['misses'])]),
+        ('analysis_jobs', metrics.GAUGE, '状態ごとの分析ジョブ数',
+         [({'status': job_status}, count) for job_status, count in job_counts.items()]),
+        ('model_swaps_total', metrics.COUNTER, 'モデルのバージョンを切り替えた回数', [({}, status['swaps'])]),
+    ]
+    if active is not None:
+        families.append(('model_info', metrics.GAUGE, '有効なモデルのバージョン',
+                         [({'version': active['version'], 'content_hash': active['content_hash']}, 1)]))
+    return families
+
+request_metrics.add_collector(collect_app_state)
+
+# 計測値を Prometheus のテキスト形式で返す
+# ログインしたブラウザーか、METRICS_TOKEN を設定した場合はそのトークンを送る収集ツールだけが読める
+@app.route('/metrics')
+def metrics_endpoint():
+    if not app.config['METRICS_ENABLED']:
+        return "計測は無効になっています。", 404
+    token = app.config['METRICS_TOKEN']
+    authorized = session.get('logged_in') or (
+        token and hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'),
+                                      f'Bearer {token}'.encode('utf-8')))
+    if not authorized:
+        return "認証が必要です。", 401
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# 保存済みのプロファイルの一覧 (新しい順)
+@app.route('/profiles')
+def profile_list():
+    if not session.get('logged_in'):
+        flash('ログインが必要です。')
+        return redirect(url_for('login'))
+    return render_template('profiles.html',
+                           captures=profiler.list_captures(app.config['PROFILER_MAX_CAPTURES']),
+                           enabled=app.config['PROFILER_ENABLED'],
+                           header=app.config['PROFILER_HEADER'],
+                           slow_seconds=app.config['PROFILER_SLOW_SECONDS'])
+
+# プロファイルのファイル (.json / .collapsed / .prof) のダウンロード
+@app.route('/profiles/<filename>')
+def download_profile(filename):
+    if not session.get('logged_in'):
+        flash('ログインが必要です。')
+        return redirect(url_for('login'))
+    filename = profiler.file_name(*os.path.splitext(filename))
+    if filename is None:
+        return "ファイル名が不正です。", 400
+    return send_from_directory(os.path.abspath(profiler.folder), filename, as_attachment=True)
 
 # ====================================================
 # 4. アプリケーションの実行設定
@@ -371,8 +2011,10 @@ def analyze_data():
 
 if __name__ == '__main__':
     if not os.path.exists(DATABASE):
-        init_ex_db
+        init_ex_db()
+    upgrade_ex_db()
     init_user_db()
+    job_queue.recover()
 
     # add_admin_user('tto', '55341') 
   
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# analyze_data のファイル読み込みのベンチマーク
+# 合成したエクスポートファイル 1 / 10 / 100 件を、逐次読み込みと load_experiments_parallel で比較する。
+# リポジトリのルートで実行する: python benchmarks/bench_analyze_load.py [1インターバルの点数] [スレッド数]
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app as flask_app
+from bench_rheo_parser import write_export
+
+FILE_COUNTS = (1, 10, 100)
+
+def make_experiments(directory, n_files, n_points):
+    # 未解析 (サイドカーなし) の experiments 行に相当する dict を作る
+    experiments = []
+    for i in range(n_files):
+        path = os.path.join(directory, f'export_{i:03d}.csv')
+        if not os.path.exists(path):
+            write_export(path, 3, n_points)
+        experiments.append({'id': i, 'file_path': path, 'parsed_path': None, 'parsed_mtime': None,
+                            'parsed_size': None, 'summary_json': None})
+    return experiments
+
+def sequential(experiments, parsed_folder):
+    return [flask_app.read_experiment(exp, True, parsed_folder) for exp in experiments]
+
+if __name__ == '__main__':
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    if len(sys.argv) > 2:
+        flask_app.app.config['ANALYZE_MAX_WORKERS'] = int(sys.argv[2])
+    workers = flask_app.app.config['ANALYZE_MAX_WORKERS']
+    print(f"1ファイル: 3 インターバル × {n_points} 点 / 並列スレッド数: {workers}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        parsed_folder = os.path.join(tmp, 'parsed')
+        flask_app.app.config['PARSED_FOLDER'] = parsed_folder
+        for n_files in FILE_COUNTS:
+            experiments = make_experiments(tmp, n_files, n_points)
+
+            start = time.perf_counter()
+            sequential(experiments, parsed_folder)
+            t_seq = time.perf_counter() - start
+
+            start = time.perf_counter()
+            outcomes = flask_app.load_experiments_parallel(experiments, True)
+            t_par = time.perf_counter() - start
+            errors = sum(1 for _, _, error in outcomes if error is not None)
+
+            print(f"{n_files:4d} ファイル: 逐次 {t_seq * 1000:8.1f} ms / 並列 {t_par * 1000:8.1f} ms"
+                  f" (x{t_seq / t_par:.2f}, エラー {errors} 件)")
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# 厳密計算モード (exact_physics.ExactPhysics) の既定グリッドの速度と精度
+# Z ごとに、既定の粗いグリッド (t/τe 600点, 120項) と細かいグリッド (3000点, 300項) で G', G'' を計算し、
+# 1つのZあたりの計算時間・キャッシュ済みの場合の時間・細かいグリッドとの相対差を表示する。
+# リポジトリのルートで実行する: python benchmarks/bench_exact_physics.py
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import exact_physics
+
+Z_VALUES = (1, 3, 10.5, 50, 100, 137.5, 300, 1000)
+FINE_N_T = 3000
+FINE_N_TERMS = 300
+
+if __name__ == '__main__':
+    omega = np.geomspace(1e-12, 1e1, 200)
+    coarse = exact_physics.ExactPhysics()
+    fine = exact_physics.ExactPhysics(n_t=FINE_N_T, n_terms=FINE_N_TERMS)
+    print(f"既定グリッド: t/τe {coarse.n_t} 点, {coarse.n_terms} 項 / 比較用: {FINE_N_T} 点, {FINE_N_TERMS} 項")
+    print(f"{'Z':>7} | {'既定 ms':>8} {'キャッシュ ms':>12} {'細かい ms':>10} | " + "G' 相対差  G'' 相対差")
+
+    for Z in Z_VALUES:
+        z_values = np.full(omega.size, float(Z))
+        start = time.perf_counter()
+        gp, gpp, _ = coarse.predict(z_values, omega)
+        t_coarse = time.perf_counter() - start
+        start = time.perf_counter()
+        coarse.predict(z_values, omega)
+        t_cached = time.perf_counter() - start
+        start = time.perf_counter()
+        gp_ref, gpp_ref, _ = fine.predict(z_values, omega)
+        t_fine = time.perf_counter() - start
+        # G' は低周波側で ω² に比例して非常に小さくなるため、最大値の 1e-8 倍以上の点で比べる
+        mask = gp_ref > 1e-8 * gp_ref.max()
+        error_gp = np.max(np.abs(gp[mask] / gp_ref[mask] - 1))
+        error_gpp = np.max(np.abs(gpp / gpp_ref - 1))
+        print(f"{Z:7g} | {t_coarse * 1000:8.1f} {t_cached * 1000:12.2f} {t_fine * 1000:10.1f} | "
+              f"{error_gp:9.2e} {error_gpp:9.2e}")
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# G_time_LM (全行列) と G_time_LM_fast (チャンク + 打ち切り + Euler–Maclaurin) の比較
+# Z と Pmax2 の組み合わせごとに、相対誤差・実行時間・ピークメモリ (tracemalloc) を表示する。
+# 相対誤差が TOLERANCE を超えた場合は終了コード1で終わる (精度の確認を兼ねる)。
+# リポジトリのルートで実行する: python benchmarks/bench_g_time.py [t/τe の点数]
+
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import generate_data
+
+Z_VALUES = (1, 5, 10, 50, 100, 300, 1000)
+PMAX2_VALUES = (5000, 20000)
+TOLERANCE = 1e-12
+
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def relative_error(value, reference):
+    # 0 付近で符号が変わる点があるため、全体の大きさを基準にした誤差も下限にする
+    scale = np.maximum(np.abs(reference), 1e-12 * np.abs(reference).max())
+    return float(np.max(np.abs(value - reference) / scale))
+
+if __name__ == '__main__':
+    n_t = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    t_hat = np.geomspace(1e-10, 1e5, n_t)
+    print(f"t/τe: {n_t} 点 / チャンク上限: {generate_data.MODE_SUM_CHUNK} 要素")
+    print(f"{'Z':>6} {'Pmax2':>6} | {'従来 ms':>9} {'従来 MB':>8} | {'新 ms':>8} {'新 MB':>7} | {'速度比':>6} {'相対誤差':>10}")
+
+    worst = 0.0
+    for Pmax2 in PMAX2_VALUES:
+        for Z in Z_VALUES:
+            reference, t_ref, peak_ref = measure(generate_data.G_time_LM, t_hat, Z, Pmax2=Pmax2)
+            fast, t_fast, peak_fast = measure(generate_data.G_time_LM_fast, t_hat, Z, Pmax2=Pmax2)
+            error = relative_error(fast, reference)
+            worst = max(worst, error)
+            print(f"{Z:6d} {Pmax2:6d} | {t_ref * 1000:9.1f} {peak_ref / 1e6:8.1f} | "
+                  f"{t_fast * 1000:8.1f} {peak_fast / 1e6:7.1f} | x{t_ref / t_fast:5.1f} {error:10.2e}")
+
+    print(f"最大相対誤差: {worst:.2e} (許容値 {TOLERANCE:.0e})")
+    if worst > TOLERANCE:
+        sys.exit(1)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# 逆フィット (inverse_fit.InverseIndex) と全探索の比較
+# ルックアップテーブルの曲線から、既知の Z, τe, Ge とノイズで合成した測定曲線を作り、
+#   索引 (cKDTree) での推定と、全ての (Z, ずらし量) の窓との距離を計算する全探索の時間
+#   推定した Z, τe, Ge の誤差
+# を測定曲線の数ごとに表示する。索引の最近傍が全探索の最小距離と一致しない場合は終了コード1で終わる。
+# リポジトリのルートで実行する: python benchmarks/bench_inverse_fit.py [ノイズ (log10 の標準偏差)]
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import lookup_table
+import inverse_fit
+
+CURVE_COUNTS = (1, 100, 1000)
+DISTANCE_TOLERANCE = 1e-9
+
+def synthetic_curves(table, n, noise, rng):
+    curves, truth = [], []
+    for _ in range(n):
+        Z = float(rng.integers(2, 100))
+        tau_e = 10**rng.uniform(-5, -1)
+        Ge = 10**rng.uniform(3, 6)
+        omega = np.geomspace(0.1, 100, int(rng.integers(15, 40))) * 10**rng.uniform(-1, 1)
+        gp, gpp = table.predict(np.full(omega.size, Z), omega * tau_e)
+        df = pd.DataFrame({
+            'Angular Frequency': omega,
+            'Storage Modulus': gp * Ge * 10**rng.normal(0, noise, omega.size),
+            'Loss Modulus': gpp * Ge * 10**rng.normal(0, noise, omega.size),
+        })
+        curves.append(inverse_fit.measurement_curve(df))
+        truth.append((Z, tau_e, Ge))
+    return curves, np.array(truth)
+
+def brute_force_distance(index, curve):
+    # 索引と同じ窓を作り、全ての窓との距離の最小値を求める
+    log_omega, log_gp, log_gpp = curve
+    span = log_omega[-1] - log_omega[0]
+    n_points, stride = inverse_fit.window_shape(span)
+    width = (n_points - 1) * stride * inverse_fit.STEP
+    grid = log_omega[0] + (span - width) / 2 + np.arange(n_points) * stride * inverse_fit.STEP
+    values = np.concatenate([np.interp(grid, log_omega, log_gp), np.interp(grid, log_omega, log_gpp)])
+    offsets = np.arange(n_points) * stride * index.step_ratio
+    starts = np.arange(index.log_omega.size - offsets[-1])
+    columns = starts[:, None] + offsets[None, :]
+    windows = np.concatenate([index.log_gp[:, columns], index.log_gpp[:, columns]], axis=2).reshape(-1, 2 * n_points)
+    windows = windows - windows.mean(axis=1, keepdims=True)
+    distance = np.sqrt(((windows - (values - values.mean())) ** 2).sum(axis=1))
+    return float(distance.min()) / np.sqrt(2 * n_points)
+
+if __name__ == '__main__':
+    noise = float(sys.argv[1]) if len(sys.argv) > 1 else 0.01
+    table_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'trained_models', 'gp_gpp_table.npz')
+    table = lookup_table.load_table(table_path)
+    start = time.perf_counter()
+    index = inverse_fit.InverseIndex(table)
+    print(f"ノイズ: {noise} (log10) / 索引の準備: {(time.perf_counter() - start) * 1000:.1f} ms")
+    rng = np.random.default_rng(0)
+
+    worst = 0.0
+    for n in CURVE_COUNTS:
+        curves, truth = synthetic_curves(table, n, noise, rng)
+        start = time.perf_counter()
+        results = index.fit(curves)
+        t_index = time.perf_counter() - start
+        start = time.perf_counter()
+        brute = [brute_force_distance(index, curve) for curve in curves]
+        t_brute = time.perf_counter() - start
+        worst = max(worst, max(abs(r['residual'] - b) for r, b in zip(results, brute)))
+
+        fitted = np.array([(r['Z'], r['tau_e'], r['Ge']) for r in results])
+        z_error = np.abs(fitted[:, 0] - truth[:, 0]) / truth[:, 0]
+        tau_error = np.abs(np.log10(fitted[:, 1] / truth[:, 1]))
+        ge_error = np.abs(np.log10(fitted[:, 2] / truth[:, 2]))
+        print(f"{n:5d} 曲線: 索引 {t_index * 1000:8.1f} ms / 全探索 {t_brute * 1000:9.1f} ms (x{t_brute / t_index:.0f})"
+              f" | Z 相対誤差 中央値 {np.median(z_error):.3f}, τe {np.median(tau_error):.3f} decade,"
+              f" Ge {np.median(ge_error):.3f} decade")
+
+    print(f"索引と全探索の残差の最大差: {worst:.2e}")
+    if worst > DISTANCE_TOLERANCE:
+        sys.exit(1)
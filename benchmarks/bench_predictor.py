@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# 予測器の比較: 従来の pkl (joblib + scikit-learn + LightGBM) と コンパイル済みモデル (NumPy のみ)
+#   起動時間: 新しいPythonプロセスで import と読み込みを行い、最初の1点を予測するまでの時間 (中央値)
+#   1点の予測: 1行ずつ繰り返し予測したときの1回あたりの時間
+#   バッチ予測: 行数ごとの予測時間
+# 2つの予測器の出力の最大差 (乱数の入力と、分岐の閾値ちょうどの入力) も表示し、
+# EXACT_TOLERANCE を超えた場合は終了コード1で終わる。
+# 事前に python compiled_model.py でコンパイル済みモデルを作っておく。
+# リポジトリのルートで実行する: python benchmarks/bench_predictor.py [モデルのフォルダ]
+
+import os
+import sys
+import time
+import subprocess
+import warnings
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import compiled_model
+
+STARTUP_RUNS = 3
+SINGLE_ROW_CALLS = 200
+BATCH_SIZES = (1_000, 100_000)
+EXACT_TOLERANCE = 1e-12
+
+# 新しいプロセスで実行するコード (読み込み + 最初の1点の予測)
+STARTUP_CODE = {
+    'pkl': (
+        "import numpy as np, compiled_model\n"
+        "m = compiled_model.PickledModel(*[f'{d}/{n}' for n in ('lgbm_gp_model.pkl', 'lgbm_gpp_model.pkl', 'scaler.pkl')])\n"
+        "m.predict(np.array([[10.0, 0.1]]))\n"
+    ),
+    'compiled': (
+        "import numpy as np, compiled_model\n"
+        "m = compiled_model.CompiledModel(f'{d}/compiled_model.npz')\n"
+        "m.predict(np.array([[10.0, 0.1]]))\n"
+    ),
+}
+
+def startup_seconds(code, model_dir):
+    times = []
+    for _ in range(STARTUP_RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-W', 'ignore', '-c', f"d = {model_dir!r}\n" + code],
+                       cwd=ROOT, check=True)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def threshold_rows(compiled, n_omega=200):
+    """
+    Rows at the split thresholds: Z = k + 0.5 and every Z threshold mapped back to raw units, each
+    against n_omega ωτe values, plus every ωτe threshold (in raw units) against the same Z values.
+    """
+    raw = []
+    for f in range(compiled.mean.size):
+        thresholds = []
+        for trees in compiled.trees.values():
+            split = (trees.left != np.arange(trees.left.size)) & (trees.feature == f)
+            thresholds.append(trees.threshold[split])
+        raw.append(np.unique(np.concatenate(thresholds)) * compiled.scale[f] + compiled.mean[f])
+    z = np.union1d(np.arange(1.5, 100.0), raw[0])
+    omega = np.concatenate([np.geomspace(1e-12, 1e1, n_omega), raw[1]])
+    return np.column_stack([np.repeat(z, omega.size), np.tile(omega, z.size)])
+
+def max_difference(pickled, compiled, X):
+    return max(float(np.max(np.abs(a - b))) for a, b in zip(pickled.predict(X), compiled.predict(X)))
+
+def per_call_seconds(func, X, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(X)
+    return (time.perf_counter() - start) / calls
+
+if __name__ == '__main__':
+    warnings.filterwarnings('ignore')
+    model_dir = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'trained_models'))
+    if not os.path.exists(os.path.join(model_dir, compiled_model.COMPILED_MODEL_NAME)):
+        print("エラー: コンパイル済みモデルがありません。先に 'python compiled_model.py' を実行してください。")
+        sys.exit(1)
+
+    pickled = compiled_model.PickledModel(*[os.path.join(model_dir, name) for name in
+                                           ('lgbm_gp_model.pkl', 'lgbm_gpp_model.pkl', 'scaler.pkl')])
+    compiled = compiled_model.CompiledModel(os.path.join(model_dir, compiled_model.COMPILED_MODEL_NAME))
+    predictors = {'pkl': pickled, 'compiled': compiled}
+
+    print(f"{'':>24} | {'pkl':>12} | {'compiled':>12} | 速度比")
+    startup = {name: startup_seconds(code, model_dir) for name, code in STARTUP_CODE.items()}
+    print(f"{'起動 + 最初の1点 (s)':>20} | {startup['pkl']:12.3f} | {startup['compiled']:12.3f} |"
+          f" x{startup['pkl'] / startup['compiled']:.1f}")
+
+    rng = np.random.default_rng(0)
+    def sample(n):
+        return np.column_stack([rng.uniform(1, 100, n), 10**rng.uniform(-12, 1, n)])
+
+    X = sample(1)
+    single = {name: per_call_seconds(p.predict, X, SINGLE_ROW_CALLS) for name, p in predictors.items()}
+    print(f"{'1点の予測 (ms)':>20} | {single['pkl'] * 1000:12.3f} | {single['compiled'] * 1000:12.3f} |"
+          f" x{single['pkl'] / single['compiled']:.1f}")
+
+    worst = 0.0
+    for n in BATCH_SIZES:
+        X = sample(n)
+        batch = {name: per_call_seconds(p.predict, X, 1) for name, p in predictors.items()}
+        print(f"{f'{n}行の予測 (ms)':>20} | {batch['pkl'] * 1000:12.1f} | {batch['compiled'] * 1000:12.1f} |"
+              f" x{batch['pkl'] / batch['compiled']:.1f}")
+        worst = max(worst, max_difference(pickled, compiled, X))
+
+    print(f"pkl とコンパイル済みモデルの出力の最大差: {worst:.2e}")
+    X = threshold_rows(compiled)
+    edge = max_difference(pickled, compiled, X)
+    print(f"分岐の閾値ちょうどの入力 ({len(X)}行) での最大差: {edge:.2e}")
+    worst = max(worst, edge)
+    if worst > EXACT_TOLERANCE:
+        sys.exit(1)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Prony (一般化Maxwell) フィットのベンチマーク
+# Z=1..100 の G(t) について、Zごとの fit_maxwell と、設計行列を1回だけ分解する fit_maxwell_batch を比較する。
+# 残差 ||E Gp - G(t)|| が fit_maxwell と同等 (比が RESIDUAL_RATIO_LIMIT 以下) でなければ終了コード1で終わる。
+# フィットは一意でないため係数は一致せず、学習データの ωτe グリッドでの G'/Ge, G''/Ge の差も表示する
+# (generate_data.py の既定は fit_maxwell で、fit_maxwell_batch は --qr-fit を指定した場合だけ使う)。
+# リポジトリのルートで実行する: python benchmarks/bench_prony_fit.py [Zの最大値]
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import generate_data
+
+N_TERMS = 200
+RESIDUAL_RATIO_LIMIT = 1.001
+
+if __name__ == '__main__':
+    z_max = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    t_hat = np.geomspace(1e-10, 1e5, 1500)
+    Z_values = list(range(1, z_max + 1))
+    Gt = np.column_stack([generate_data.G_time_LM_fast(t_hat, Z) for Z in Z_values])
+    print(f"Z: 1..{z_max} / t/τe: {t_hat.size} 点 / Prony 項数: {N_TERMS}")
+
+    start = time.perf_counter()
+    single = [generate_data.fit_maxwell(Gt[:, i], t_hat, n_terms=N_TERMS)[1] for i in range(len(Z_values))]
+    t_single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    taus, batch, residual = generate_data.fit_maxwell_batch(Gt, t_hat, n_terms=N_TERMS)
+    t_batch = time.perf_counter() - start
+
+    _, E = generate_data.prony_design(t_hat, N_TERMS)
+    single_residual = np.array([np.linalg.norm(E @ Gp - Gt[:, i]) for i, Gp in enumerate(single)])
+    batch_residual = np.array([np.linalg.norm(E @ Gp - Gt[:, i]) for i, Gp in enumerate(batch)])
+    ratio = batch_residual / single_residual
+    reported = np.max(np.abs(residual - batch_residual) / batch_residual)
+
+    print(f"fit_maxwell (Zごと) : {t_single:7.2f} s")
+    print(f"fit_maxwell_batch   : {t_batch:7.2f} s (x{t_single / t_batch:.1f})")
+    print(f"残差の比 (batch / Zごと): 最小 {ratio.min():.6f} / 最大 {ratio.max():.6f}")
+    print(f"返された残差と再計算した残差の相対差: {reported:.1e}")
+    omega = np.geomspace(1e-12, 1e1, 1300)
+    for i in range(max(0, len(Z_values) - 3), len(Z_values)):  # 差が大きい大きなZの3つ
+        gp_single, gpp_single = generate_data.storage_loss_from_prony(omega, taus, single[i])
+        gp_batch, gpp_batch = generate_data.storage_loss_from_prony(omega, taus, batch[i])
+        print(f"Z = {Z_values[i]}: G'/Ge の最大差 {np.max(np.abs(gp_batch - gp_single)):.1e},"
+              f" G''/Ge の最大差 {np.max(np.abs(gpp_batch - gpp_single)):.1e}")
+    if ratio.max() > RESIDUAL_RATIO_LIMIT:
+        sys.exit(1)
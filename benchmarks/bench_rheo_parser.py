@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# rheo_parser の速度・メモリのベンチマーク
+# 大きなマルチインターバルのUTF-16エクスポートを合成し、
+# 従来の pd.read_csv (shift_jis → cp932 → utf-8) の再試行と専用パーサーを比較する。
+# 使い方: python benchmarks/bench_rheo_parser.py [インターバル数] [1インターバルの点数]
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import rheo_parser
+
+COLUMNS = ['ポイント No.', 'せん断速度', 'せん断応力', '粘度', '温度', 'トルク', 'ステータス']
+UNITS = ['', '[1/s]', '[Pa]', '[mPa·s]', '[°C]', '[mN·m]', '']
+
+def write_export(path, n_intervals, n_points, test='benchmark'):
+    with open(path, 'w', encoding='utf-16', newline='') as f:
+        f.write('プロジェクト:\tShear_Viscosity\r\n\r\n')
+        f.write(f'テスト:\t{test}\r\n\r\n')
+        f.write('結果:\t粘度カーブ 1\r\n\r\n')
+        for k in range(1, n_intervals + 1):
+            f.write(f'インターバルとデータポイント:\t{k}\t{n_points}\r\n')
+            f.write('インターバルデータ:\t' + '\t'.join(COLUMNS) + '\r\n')
+            f.write('\t' * len(COLUMNS) + '\r\n')
+            f.write('\t' + '\t'.join(UNITS) + '\r\n')
+            for i in range(1, n_points + 1):
+                rate = 10 ** (i / n_points * 3)
+                f.write(f'\t{i}\t{rate:.4g}\t{rate * 0.08:.5g}\t{80 - i / n_points * 20:.5g}\t19.95\t{rate * 0.003:.5g}\tDy_auto\r\n')
+            f.write('\r\n')
+
+def legacy_read(path):
+    # app.py で使っていた読み込み処理 (UTF-16 ファイルでは最終的に失敗する)
+    try:
+        return pd.read_csv(path, encoding='shift_jis')
+    except UnicodeDecodeError:
+        try:
+            return pd.read_csv(path, encoding='cp932')
+        except UnicodeDecodeError:
+            return pd.read_csv(path, encoding='utf-8')
+
+def generic_read(path):
+    # エンコーディングを総当たりした後、汎用の pd.read_csv で全行を読む場合
+    try:
+        return legacy_read(path)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding='utf-16', sep='\t', header=None,
+                           on_bad_lines='skip', engine='python')
+
+def measure(func, *args):
+    # 時間は tracemalloc なしで、ピークメモリは別に計測する
+    start = time.perf_counter()
+    try:
+        func(*args)
+        status = 'ok'
+    except Exception as e:
+        status = f'失敗 ({type(e).__name__})'
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        func(*args)
+    except Exception:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, status
+
+def stream_only(path):
+    # インターバルを1つずつ処理して捨てる (ピークメモリは1インターバル分)
+    rows = 0
+    for interval in rheo_parser.iter_intervals(path):
+        rows += interval.n_points
+    return rows
+
+if __name__ == '__main__':
+    n_intervals = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_points = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'export.csv')
+        write_export(path, n_intervals, n_points)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"合成ファイル: {n_intervals} インターバル × {n_points} 点 ({size_mb:.1f} MB)")
+
+        for label, func in [
+            ('従来 (pd.read_csv 再試行)', legacy_read),
+            ('再試行 + 汎用 pd.read_csv', generic_read),
+            ('rheo_parser.read_rheo_file', rheo_parser.read_rheo_file),
+            ('rheo_parser.iter_intervals', stream_only),
+        ]:
+            elapsed, peak, status = measure(func, path)
+            print(f"{label:32s} {elapsed * 1000:9.1f} ms  ピークメモリ {peak / 1e6:8.1f} MB  {status}")
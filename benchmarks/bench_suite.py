@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+# 合成データだけで再現できるベンチマーク一式
+# 一時フォルダに新しいデータベース・アップロード先を作り、Flask のテストクライアントで各機能を計測する
+# (リポジトリの database.db や uploads/ には触れない)。
+#   predict: サロゲートモデルの1点 / バッチ予測 (予測器の直接呼び出しと /api/predict)
+#   upload:  小さい / 大きいエクスポートファイルの /upload と、複数ファイルの1件ずつの /upload と /upload/bulk の比較
+#   analyze: 条件に一致するファイルが 1 / 10 / 100 件の /analyze (要約統計のマージと全ファイル結合)
+#   curves:  大きな測定ファイル・予測スイープのグラフ用の間引き (/api/experiments/<id>/curves, /api/predict/curves)
+#   query:   測定データの横断検索 (/api/query) の、ゾーンマップでほとんどのファイルを除外できる条件と全ファイルを読む条件
+#   data:    experiments が 1千 / 10万 / 100万行のときの /data の一覧・検索
+#   physics: Z ごとの G_time_LM, fit_maxwell, storage_loss_from_prony (学習データと同じグリッド)
+# 各ケースの時間 (中央値・最小・最大) を --output の JSON に保存し、--compare で保存済みの基準と比べる。
+# 基準より THRESHOLD 倍以上かつ MIN_DELTA 秒以上遅くなったケースがあれば終了コード1で終わる。
+# リポジトリのルートで実行する:
+#   python benchmarks/bench_suite.py --output baseline.json
+#   python benchmarks/bench_suite.py --compare baseline.json [--output current.json]
+#   python benchmarks/bench_suite.py --results current.json --compare baseline.json  (計測せずに比較だけ行う)
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import itertools
+import contextlib
+import subprocess
+from datetime import datetime, timedelta
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import generate_data
+from bench_rheo_parser import write_export
+
+GROUPS = ('predict', 'upload', 'analyze', 'curves', 'query', 'data', 'physics')
+SEED = 0
+REPEAT = 5
+THRESHOLD = 1.25
+MIN_DELTA = 0.001
+
+# 計測する大きさ (--quick では 100万行と大きなファイル・大きな Z を小さくする)
+SETTINGS = {
+    'batch_rows': 100_000,
+    'api_grid': (100, 1000),  # /api/predict の Z の数 × ωτe の数
+    'upload_sizes': {'small': (1, 100), 'large': (10, 10_000)},  # (インターバル数, 1インターバルの点数)
+    'bulk_files': 20,  # 一括登録と1件ずつの登録を比べるファイル数 (各 1x100)
+    'analyze_files': (1, 10, 100),
+    'analyze_points': 200,
+    'curve_file': (3, 20_000),  # 間引きする測定ファイル (インターバル数, 1インターバルの点数)
+    'curve_sweep': (10, 20_000),  # 間引きする予測スイープ (Z の数, ωτe の数)
+    'curve_width': 800,
+    'query_files': 100,  # /api/query の対象ファイル数 (温度を 20〜69 ℃ に振り分ける)
+    'data_rows': (1_000, 100_000, 1_000_000),
+    'physics_z': (10, 100, 1000),
+}
+QUICK_SETTINGS = dict(SETTINGS,
+                      upload_sizes={'small': (1, 100), 'large': (2, 10_000)},
+                      data_rows=(1_000, 100_000),
+                      physics_z=(10, 100))
+
+# 学習データ (generate_data.py の既定値) と同じグリッド
+T_HAT = np.geomspace(1e-10, 1e5, 1500)
+OMEGA = np.geomspace(1e-12, 1e1, 1300)
+N_TERMS = 200
+
+# /data 用の合成行 (サンプル名は 'SMP-<4桁>-<材料>'、検索語ごとに一致件数が変わる)
+DEVICES = ('MCR302', 'MCR502', 'HAAKE-MARS', 'DHR-3', 'ARES-G2')
+MATERIALS = ('CMC', 'PEO', 'PAA', 'HEC', 'XG', 'PVA', 'GG')
+DATA_SEARCHES = {
+    'list': {},
+    'search_rare': {'search_sample': 'SMP-0042'},  # 全件の 1/5000 (全文検索)
+    'search_common': {'search_sample': 'CMC'},     # 全件の 1/7 (全文検索)
+    'search_short': {'search_device': 'DH'},       # 2文字は LIKE 検索
+}
+
+# ---------- measurement ----------
+class Suite:
+    """Runs the cases and collects {name: timing stats} in insertion order."""
+
+    def __init__(self, repeat=REPEAT):
+        self.repeat = repeat
+        self.results = {}
+
+    def case(self, name, func, setup=None, inner=1, **params):
+        """
+        Time func(*setup()) repeat times after one untimed warm-up call. setup runs outside the
+        timing. With inner > 1 each sample is the mean of inner calls (for sub-millisecond cases).
+        The app's print output is discarded while timing.
+        """
+        times = []
+        for i in range(self.repeat + 1):
+            args = setup() if setup is not None else ()
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                for _ in range(inner):
+                    func(*args)
+                elapsed = (time.perf_counter() - start) / inner
+            if i > 0:
+                times.append(elapsed)
+        self.results[name] = {
+            'median_s': float(np.median(times)),
+            'min_s': float(min(times)),
+            'max_s': float(max(times)),
+            'repeat': self.repeat,
+            'inner': inner,
+            'params': params,
+        }
+        print(f"{name:48s} {np.median(times) * 1000:11.3f} ms  (最小 {min(times) * 1000:.3f} ms)")
+
+def expect(response, status):
+    if response.status_code != status:
+        raise RuntimeError(f"{response.request.path}: ステータス {response.status_code} (期待値 {status})")
+    return response
+
+# ---------- fixtures ----------
+def prepare_app(workdir):
+    # app.py は作業フォルダからの相対パス (database.db, uploads/, trained_models/, schema*.sql) を使うため、
+    # 必要なファイルを一時フォルダに複製し、そこに移動してから import する
+    for name in os.listdir(ROOT):
+        if name.startswith('schema') and name.endswith('.sql'):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+    shutil.copytree(os.path.join(ROOT, 'trained_models'), os.path.join(workdir, 'trained_models'))
+    os.makedirs(os.path.join(workdir, 'fixtures'))
+    os.chdir(workdir)
+    import app as flask_app
+    flask_app.init_ex_db()
+    flask_app.upgrade_ex_db()
+    flask_app.init_user_db()
+    # 計測中に CURRENT の確認でモデルが切り替わらないようにする
+    flask_app.registry.poll_interval = None
+    client = flask_app.app.test_client()
+    with client.session_transaction() as s:
+        s['logged_in'] = True
+    return flask_app, client
+
+def upload(client, path, sample_name):
+    with open(path, 'rb') as f:
+        expect(client.post('/upload', data={
+            'experiment_device': 'bench-rheometer',
+            'sample_name': sample_name,
+            'experiment_date': '2025-04-21',
+            'file': (f, os.path.basename(path)),
+        }, content_type='multipart/form-data'), 302)
+
+def filler_rows(start, stop):
+    base = datetime(2020, 1, 1)
+    for i in range(start, stop):
+        yield (DEVICES[i % len(DEVICES)],
+               f'SMP-{i % 5000:04d}-{MATERIALS[i % len(MATERIALS)]}',
+               (base + timedelta(days=i % 1500)).strftime('%Y-%m-%d'),
+               f'export_{i:07d}.csv',
+               os.path.join('uploads', 'objects', f'missing_{i:07d}.csv'),
+               (base + timedelta(seconds=37 * i)).strftime('%Y-%m-%d %H:%M:%S'))
+
+def fill_experiments(flask_app, start, stop, chunk=100_000):
+    # 1つのトランザクションで executemany する (全文検索の索引はトリガーで同時に作られる)
+    db = flask_app.connect_db()
+    try:
+        with db:
+            rows = filler_rows(start, stop)
+            while True:
+                block = list(itertools.islice(rows, chunk))
+                if not block:
+                    break
+                db.executemany('INSERT INTO experiments (device_name, sample_name, experiment_date, file_name, '
+                               'file_path, uploaded_at) VALUES (?, ?, ?, ?, ?, ?)', block)
+        return db.execute('SELECT COUNT(*) FROM experiments').fetchone()[0]
+    finally:
+        db.close()
+
+# ---------- cases ----------
+def bench_predict(suite, flask_app, client, settings):
+    predictor = flask_app.registry.active().load()
+    rng = np.random.default_rng(SEED)
+    single = np.array([[10.0, 0.1]])
+    suite.case('predict.single', predictor.predict, setup=lambda: (single,), inner=200)
+    n = settings['batch_rows']
+    batch = np.column_stack([rng.uniform(1, 100, n), 10**rng.uniform(-12, 1, n)])
+    suite.case(f'predict.batch[rows={n}]', predictor.predict, setup=lambda: (batch,), rows=n)
+
+    def api(payload, clear_cache):
+        if clear_cache:
+            flask_app.prediction_cache.clear()
+        expect(client.post('/api/predict', json=payload), 200)
+
+    suite.case('predict.api_single', api, setup=lambda: ({'z': 10.0, 'omega_tau_e': 0.1}, True), inner=20)
+    n_z, n_omega = settings['api_grid']
+    grid = {
+        'z': {'start': 1, 'stop': 100, 'num': n_z},
+        'omega_tau_e': {'start': 1e-12, 'stop': 10, 'num': n_omega, 'scale': 'log'},
+        'stream': False,
+    }
+    points = n_z * n_omega
+    suite.case(f'predict.api_grid[points={points}]', api, setup=lambda: (grid, True), points=points)
+    suite.case(f'predict.api_grid_cached[points={points}]', api, setup=lambda: (grid, False), points=points)
+
+def bench_upload(suite, client, workdir, settings):
+    counter = itertools.count()
+    for label, (n_intervals, n_points) in settings['upload_sizes'].items():
+        # 同じ内容のファイルは解析結果が再利用されるため、毎回テスト名を変えた新しいファイルを作る
+        def setup():
+            k = next(counter)
+            path = os.path.join(workdir, 'fixtures', f'upload_{label}_{k}.csv')
+            write_export(path, n_intervals, n_points, test=f'upload-{k}')
+            return client, path, f'upload-{label}'
+        suite.case(f'upload.{label}[{n_intervals}x{n_points}]', upload, setup=setup,
+                   intervals=n_intervals, points=n_points)
+
+    n_files = settings['bulk_files']
+
+    def bulk_setup():
+        k = next(counter)
+        paths = []
+        for i in range(n_files):
+            path = os.path.join(workdir, 'fixtures', f'bulk_{k}_{i:03d}.csv')
+            write_export(path, 1, 100, test=f'bulk-{k}-{i}')
+            paths.append(path)
+        return (paths,)
+
+    def one_by_one(paths):
+        for path in paths:
+            upload(client, path, 'bulk')
+
+    def bulk(paths):
+        files = [open(path, 'rb') for path in paths]
+        try:
+            data = {'experiment_device': 'bench', 'experiment_date': '2025-01-01',
+                    'files': [(f, os.path.basename(f.name)) for f in files]}
+            expect(client.post('/upload/bulk', data=data, content_type='multipart/form-data'), 200)
+        finally:
+            for f in files:
+                f.close()
+
+    suite.case(f'upload.one_by_one[files={n_files}]', one_by_one, setup=bulk_setup, files=n_files)
+    suite.case(f'upload.bulk[files={n_files}]', bulk, setup=bulk_setup, files=n_files)
+
+def bench_analyze(suite, flask_app, client, workdir, settings):
+    n_points = settings['analyze_points']
+    for n_files in settings['analyze_files']:
+        sample_name = f'analyze-n{n_files:03d}'
+        for i in range(n_files):
+            path = os.path.join(workdir, 'fixtures', f'{sample_name}_{i:03d}.csv')
+            write_export(path, 3, n_points, test=f'{sample_name}-{i}')
+            with contextlib.redirect_stdout(io.StringIO()):
+                upload(client, path, sample_name)
+        with flask_app.app.app_context():
+            matched = len(flask_app.query_analysis_experiments(flask_app.get_db(), '', sample_name))
+        if matched != n_files:
+            raise RuntimeError(f"{sample_name}: 一致した件数が {matched} 件です (期待値 {n_files})")
+
+        form = {'device_name': '', 'sample_name': sample_name, 'predict_engine': 'lgbm',
+                'predict_z_value': '10', 'predict_omega_value': '0.1'}
+        for mode, full_concat in (('summary', ''), ('full', '1')):
+            data = dict(form, full_concat=full_concat)
+            suite.case(f'analyze.{mode}[files={n_files}]',
+                       lambda: expect(client.post('/analyze', data=data), 200), files=n_files)
+
+def bench_curves(suite, flask_app, client, workdir, settings):
+    n_intervals, n_points = settings['curve_file']
+    path = os.path.join(workdir, 'fixtures', 'curves.csv')
+    write_export(path, n_intervals, n_points, test='curves')
+    with contextlib.redirect_stdout(io.StringIO()):
+        upload(client, path, 'curves')
+    with flask_app.app.app_context():
+        experiment_id = flask_app.query_analysis_experiments(flask_app.get_db(), '', 'curves')[0]['id']
+    width = settings['curve_width']
+
+    def get(method, clear_cache):
+        if clear_cache:
+            flask_app.curve_cache.clear()
+        expect(client.get(f'/api/experiments/{experiment_id}/curves',
+                          query_string={'width': width, 'method': method}), 200)
+
+    for method in ('lttb', 'minmax'):
+        suite.case(f'curves.experiment_{method}[{n_intervals}x{n_points}]', get, setup=lambda: (method, True),
+                   intervals=n_intervals, points=n_points, width=width)
+    suite.case(f'curves.experiment_cached[{n_intervals}x{n_points}]', get, setup=lambda: ('lttb', False),
+               intervals=n_intervals, points=n_points, width=width)
+
+    n_z, n_omega = settings['curve_sweep']
+    sweep = {
+        'z': {'start': 1, 'stop': 100, 'num': n_z},
+        'omega_tau_e': {'start': 1e-12, 'stop': 10, 'num': n_omega, 'scale': 'log'},
+        'engine': 'table',
+        'width': width,
+    }
+
+    def predict(clear_cache):
+        if clear_cache:
+            flask_app.curve_cache.clear()
+            flask_app.prediction_cache.clear()
+        expect(client.post('/api/predict/curves', json=sweep), 200)
+
+    suite.case(f'curves.predict[points={n_z * n_omega}]', predict, setup=lambda: (True,),
+               points=n_z * n_omega, width=width)
+    suite.case(f'curves.predict_cached[points={n_z * n_omega}]', predict, setup=lambda: (False,),
+               points=n_z * n_omega, width=width)
+
+def bench_query(suite, client, workdir, settings):
+    n_files = settings['query_files']
+    for i in range(n_files):
+        path = os.path.join(workdir, 'fixtures', f'query_{i:03d}.csv')
+        write_export(path, 3, 1000, test=f'query-{i}')
+        # write_export の温度 (19.95 ℃) をファイルごとに変える
+        with open(path, encoding='utf-16') as f:
+            text = f.read().replace('\t19.95\t', f'\t{20 + i % 50}\t')
+        with open(path, 'w', encoding='utf-16', newline='') as f:
+            f.write(text)
+        with contextlib.redirect_stdout(io.StringIO()):
+            upload(client, path, 'query')
+
+    queries = {
+        # 温度 20 ℃ のファイル (全体の 1/50) だけを読む
+        'selective': {'shear_rate': [90, 110], 'temperature': [19.5, 20.5], 'viscosity': {'min': 60}},
+        # すべてのファイルのゾーンマップと重なる
+        'broad': {'shear_rate': [90, 110], 'viscosity': {'min': 60}},
+    }
+    for label, where in queries.items():
+        payload = {'where': where, 'sample_name': 'query'}
+        suite.case(f'query.{label}[files={n_files}]',
+                   lambda: expect(client.post('/api/query', json=payload), 200), files=n_files, where=where)
+
+def bench_data(suite, flask_app, client, settings):
+    total = 0
+    for n_rows in settings['data_rows']:
+        start = time.perf_counter()
+        count = fill_experiments(flask_app, total, n_rows)
+        print(f"experiments を {n_rows} 行まで追加しました ({time.perf_counter() - start:.1f} s, 合計 {count} 行)")
+        total = n_rows
+        for label, query in DATA_SEARCHES.items():
+            suite.case(f'data.{label}[rows={n_rows}]',
+                       lambda: expect(client.get('/data', query_string=query), 200), rows=count, query=query)
+
+def bench_physics(suite, settings):
+    for Z in settings['physics_z']:
+        suite.case(f'physics.G_time_LM[Z={Z}]', generate_data.G_time_LM, setup=lambda: (T_HAT, Z),
+                   Z=Z, n_t=T_HAT.size)
+        Gt = generate_data.G_time_LM(T_HAT, Z)
+        suite.case(f'physics.fit_maxwell[Z={Z}]', generate_data.fit_maxwell, setup=lambda: (Gt, T_HAT, N_TERMS),
+                   Z=Z, n_t=T_HAT.size, n_terms=N_TERMS)
+        taus, Gp = generate_data.fit_maxwell(Gt, T_HAT, N_TERMS)
+        suite.case(f'physics.storage_loss_from_prony[Z={Z}]', generate_data.storage_loss_from_prony,
+                   setup=lambda: (OMEGA, taus, Gp), Z=Z, n_omega=OMEGA.size, n_terms=N_TERMS)
+
+def run_suite(groups, settings, repeat, keep_workdir=False):
+    suite = Suite(repeat)
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    cwd = os.getcwd()
+    try:
+        if set(groups) & {'predict', 'upload', 'analyze', 'curves', 'query', 'data'}:
+            flask_app, client = prepare_app(workdir)
+            # data は experiments を大きくするため、アップロード・分析の後に行う
+            if 'predict' in groups:
+                bench_predict(suite, flask_app, client, settings)
+            if 'upload' in groups:
+                bench_upload(suite, client, workdir, settings)
+            if 'analyze' in groups:
+                bench_analyze(suite, flask_app, client, workdir, settings)
+            if 'curves' in groups:
+                bench_curves(suite, flask_app, client, workdir, settings)
+            if 'query' in groups:
+                bench_query(suite, client, workdir, settings)
+            if 'data' in groups:
+                bench_data(suite, flask_app, client, settings)
+        if 'physics' in groups:
+            bench_physics(suite, settings)
+    finally:
+        os.chdir(cwd)
+        if keep_workdir:
+            print(f"作業フォルダ: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return suite.results
+
+# ---------- results ----------
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def compare(results, baseline, threshold=THRESHOLD, min_delta=MIN_DELTA):
+    """
+    Compare median times with a baseline report. A case regresses when it is more than threshold
+    times slower and at least min_delta seconds slower. Returns the names of regressed cases.
+    """
+    base_results = baseline['results']
+    meta = baseline.get('meta', {})
+    print(f"\n基準: {meta.get('created_at')} (commit {meta.get('commit')}, {meta.get('platform')})")
+    print(f"{'ケース':46s} {'基準 ms':>11} {'今回 ms':>11} {'比':>7}")
+    regressions = []
+    for name, current in results.items():
+        base = base_results.get(name)
+        if base is None:
+            print(f"{name:48s} {'-':>11} {current['median_s'] * 1000:11.3f} {'':>7}  (新しいケース)")
+            continue
+        ratio = current['median_s'] / base['median_s'] if base['median_s'] > 0 else float('inf')
+        slower = ratio > threshold and current['median_s'] - base['median_s'] >= min_delta
+        if slower:
+            regressions.append(name)
+        print(f"{name:48s} {base['median_s'] * 1000:11.3f} {current['median_s'] * 1000:11.3f} {ratio:6.2f}x"
+              f"{'  << 遅くなりました' if slower else ''}")
+    for name in base_results:
+        if name not in results:
+            print(f"{name:48s} (今回は計測していません)")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="合成データによるベンチマーク一式と、基準との比較")
+    parser.add_argument('--output', help="結果を保存するJSONファイル")
+    parser.add_argument('--compare', help="比較する基準の結果 (JSON)")
+    parser.add_argument('--results', help="計測せず、このJSONファイルの結果を --compare の基準と比べる")
+    parser.add_argument('--only', default=','.join(GROUPS), help=f"計測するグループ (カンマ区切り: {','.join(GROUPS)})")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="ケースごとの計測回数 (中央値を使う)")
+    parser.add_argument('--quick', action='store_true', help="100万行・大きなファイル・Z=1000 を省いた短い計測")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="遅くなったと判定する基準との時間の比")
+    parser.add_argument('--min-delta', type=float, default=MIN_DELTA, help="遅くなったと判定する最小の差 (秒)")
+    parser.add_argument('--keep-workdir', action='store_true', help="一時フォルダを削除せずに残す")
+    return parser.parse_args(argv)
+
+# ===================== Main =====================
+if __name__ == '__main__':
+    args = parse_args()
+    if args.results:
+        with open(args.results, encoding='utf-8') as f:
+            report = json.load(f)
+    else:
+        groups = [group.strip() for group in args.only.split(',') if group.strip()]
+        unknown = sorted(set(groups) - set(GROUPS))
+        if unknown:
+            print(f"エラー: 不明なグループです: {', '.join(unknown)}")
+            sys.exit(1)
+        settings = QUICK_SETTINGS if args.quick else SETTINGS
+        meta = dict(environment(), groups=groups, quick=args.quick, repeat=args.repeat, seed=SEED)
+        report = {'meta': meta, 'settings': settings, 'results': run_suite(groups, settings, args.repeat,
+                                                                           args.keep_workdir)}
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"結果を '{args.output}' に保存しました。")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report['results'], baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n基準より遅くなったケースが {len(regressions)} 件あります: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n基準より遅くなったケースはありません。")
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# アップロードファイルのコンテンツアドレス型ストレージ
+# ファイルは受信しながらチャンクごとに SHA-256 を計算し、uploads/objects/<先頭2文字>/<ハッシュ><拡張子> に保存する。
+# 同じ内容のファイルは1つだけ保存し、参照数は blobs テーブルで管理する。
+# 以前のアップロード (ファイル名で保存したもの) は objects/ の外にあるため、save_stream の find_existing で
+# blobs テーブルに登録済みのパスも探す。
+
+# ---------- import library ----------
+import os
+import uuid
+import hashlib
+
+# 受信・ハッシュ計算のチャンクサイズ
+CHUNK_SIZE = 1024 * 1024
+
+def object_path(objects_folder, content_hash, extension):
+    return os.path.join(objects_folder, content_hash[:2], content_hash + extension)
+
+def find_object(objects_folder, content_hash):
+    # 拡張子に関係なく、同じハッシュの保存済みファイルを探す
+    directory = os.path.join(objects_folder, content_hash[:2])
+    if not os.path.isdir(directory):
+        return None
+    for name in os.listdir(directory):
+        if name.split('.', 1)[0] == content_hash:
+            return os.path.join(directory, name)
+    return None
+
+def save_stream(stream, objects_folder, extension='', find_existing=None):
+    """
+    Copy stream to the store in CHUNK_SIZE pieces while hashing it.
+    Returns (content_hash, path, size, is_new). If the same content is already stored (in
+    objects_folder, or at the path find_existing(content_hash) returns), the new copy is discarded
+    and the existing path is returned (its mtime is left untouched so parsed sidecars stay valid).
+    """
+    if not os.path.exists(objects_folder):
+        os.makedirs(objects_folder)
+    tmp_path = os.path.join(objects_folder, f'.incoming-{uuid.uuid4().hex}')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        content_hash = digest.hexdigest()
+
+        existing = find_object(objects_folder, content_hash)
+        if existing is None and find_existing is not None:
+            existing = find_existing(content_hash)
+        if existing is not None:
+            os.remove(tmp_path)
+            return content_hash, existing, size, False
+
+        path = object_path(objects_folder, content_hash, extension.lower())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return content_hash, path, size, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
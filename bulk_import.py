@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+# 測定ファイルの一括登録 (複数ファイル・ZIP)
+# 1日分のエクスポートなどをまとめて登録する。Web (/upload/bulk) とコマンドラインの両方から使う:
+#   python bulk_import.py <ファイル・フォルダ・ZIP ...> [--device 装置名] [--sample サンプル名] [--date YYYY-MM-DD] [--manifest manifest.csv]
+# 各ファイルの保存 (コンテンツアドレス型ストレージ)・解析 (サイドカーと要約統計) はスレッドプールで並列に行い、
+# 実験データの行は app.run_bulk_import で1つのトランザクションにまとめて登録する。
+# 装置名・サンプル名・日付は、マニフェスト > ファイルのヘッダー (テスト: など) > 既定値 (フォーム・引数) の順に決める。
+# レオメーターのエクスポートのヘッダーはプロジェクト・テスト・結果の行だけのため、日付は「テスト:」の値か
+# ファイル名の先頭の YYYYMMDD (20250421_CMC_1wt%_... など) からも読み取る (既定値より優先)。装置名は
+# ヘッダーにないため、マニフェストか既定値で指定する。
+# マニフェストは file_name, device_name, sample_name, experiment_date 列の CSV (日本語の列名も可) で、
+# ZIP やフォルダに manifest.csv として含めるか、別に指定する。file_name はパスかファイル名で照合する。
+
+# ---------- import library ----------
+import os
+import io
+import csv
+import sys
+import json
+import zipfile
+import argparse
+import re
+import posixpath
+from dataclasses import dataclass
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import blob_store
+import measurement_cache
+import summary_stats
+
+# 登録できるファイルの拡張子 (measurement_cache.parse_measurement_file が読めるもの)
+SUPPORTED_EXTENSIONS = ('.csv', '.txt', '.xlsx')
+MANIFEST_NAME = 'manifest.csv'
+
+FIELDS = ('device_name', 'sample_name', 'experiment_date')
+# マニフェストの列名
+MANIFEST_COLUMNS = {
+    'file_name': 'file_name', 'ファイル名': 'file_name',
+    'device_name': 'device_name', '実験装置名': 'device_name', '装置名': 'device_name',
+    'sample_name': 'sample_name', 'サンプル名': 'sample_name',
+    'experiment_date': 'experiment_date', '日付': 'experiment_date',
+}
+# ファイルのヘッダーで各項目として使う行 (前にあるものを優先)。'test' は「テスト:」の値
+HEADER_KEYS = {
+    'device_name': ('装置', '装置名', '測定装置', '実験装置名', 'Device', 'Instrument'),
+    'sample_name': ('サンプル', 'サンプル名', 'Sample', 'test'),
+    'experiment_date': ('日付', '測定日', '実験日', 'Date'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%d.%m.%Y', '%Y%m%d')
+# テスト名・ファイル名の先頭の日付 (20250421_... の 20250421)
+DATE_PREFIX = re.compile(r'^(\d{8})(?!\d)')
+
+@dataclass
+class Source:
+    """One file to import: display name (with the ZIP path if any) and a function opening it as binary."""
+    name: str
+    open: Callable
+    size: int
+
+    @property
+    def extension(self):
+        return os.path.splitext(self.name)[1].lower()
+
+# ---------- sources ----------
+def zip_sources(archive, archive_name):
+    """Sources for the files in an open ZipFile (folders and hidden / __MACOSX entries are left out)."""
+    sources = []
+    for info in archive.infolist():
+        base = posixpath.basename(info.filename)
+        if info.is_dir() or not base or base.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        sources.append(Source(f'{archive_name}/{info.filename}', lambda info=info: archive.open(info), info.file_size))
+    return sources
+
+def path_sources(paths):
+    """Sources for files, folders (searched recursively) and ZIP archives given on the command line."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                sources += path_sources(os.path.join(root, name) for name in sorted(files) if not name.startswith('.'))
+        elif path.lower().endswith('.zip'):
+            sources += zip_sources(zipfile.ZipFile(path), path)
+        else:
+            sources.append(Source(path, lambda path=path: open(path, 'rb'), os.path.getsize(path)))
+    return sources
+
+def split_manifest(sources):
+    """(sources without manifest files, the manifest entries read from them)."""
+    manifest = {}
+    files = []
+    for source in sources:
+        if posixpath.basename(source.name.replace('\\', '/')).lower() == MANIFEST_NAME:
+            with source.open() as f:
+                manifest.update(read_manifest(f))
+        else:
+            files.append(source)
+    return files, manifest
+
+def read_manifest(stream):
+    """Manifest entries {file_name: {field: value}} from a binary CSV stream (UTF-8, with or without BOM)."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    entries = {}
+    for row in reader:
+        entry = {}
+        for column, value in row.items():
+            field = MANIFEST_COLUMNS.get((column or '').strip())
+            if field and value and value.strip():
+                entry[field] = value.strip()
+        if 'file_name' in entry:
+            entries[entry.pop('file_name').replace('\\', '/')] = entry
+    return entries
+
+def manifest_entry(manifest, name):
+    # ZIP 内のパスの末尾、またはファイル名で照合する
+    name = name.replace('\\', '/')
+    for key, entry in manifest.items():
+        if name == key or name.endswith('/' + key):
+            return entry
+    return manifest.get(posixpath.basename(name))
+
+# ---------- metadata ----------
+def parse_date(value):
+    value = str(value).strip()
+    # 時刻が付いている場合は日付の部分だけを使う
+    head = value.split()[0] if value else value
+    for text in (value, head):
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).date()
+            except ValueError:
+                continue
+    return None
+
+def date_prefix(value):
+    """Date from a leading YYYYMMDD in a test or file name (e.g. '20250421_CMC_1wt%_01'), or None."""
+    match = DATE_PREFIX.match(str(value or '').strip())
+    if match is None:
+        return None
+    try:
+        return datetime.strptime(match.group(1), '%Y%m%d').date()
+    except ValueError:
+        return None
+
+def header_values(metadata):
+    """Header lines of a parsed export as a flat {key: value} (the 'テスト:' value under 'test')."""
+    values = dict(metadata.get('extra', {}))
+    for key in ('project', 'test', 'result'):
+        if metadata.get(key):
+            values[key] = metadata[key]
+    return values
+
+def resolve_metadata(name, header, manifest, defaults):
+    """
+    Device, sample and date of one file, taken from the manifest, the file header or defaults (in that
+    order). Returns (values, sources, error) where sources tells which of the three each value came from.
+    """
+    entry = manifest_entry(manifest, name) or {}
+    header = header_values(header)
+    values, sources = {}, {}
+    for field in FIELDS:
+        candidates = [('manifest', entry.get(field))]
+        candidates += [('header', header.get(key)) for key in HEADER_KEYS[field]]
+        if field == 'experiment_date':
+            candidates += [('header', date_prefix(header.get('test'))),
+                           ('file_name', date_prefix(posixpath.basename(name.replace('\\', '/'))))]
+        candidates.append(('default', defaults.get(field)))
+        for source, value in candidates:
+            if value is None or not str(value).strip():
+                continue
+            if field == 'experiment_date':
+                date = parse_date(value)
+                if date is None:
+                    if source == 'header':
+                        continue
+                    return values, sources, f"日付の形式が正しくありません ({source}: {value})"
+                value = date
+            else:
+                value = str(value).strip()
+            values[field], sources[field] = value, source
+            break
+        else:
+            labels = {'device_name': '実験装置名', 'sample_name': 'サンプル名', 'experiment_date': '日付'}
+            return values, sources, f"{labels[field]}がマニフェスト・ファイルのヘッダー・既定値のいずれにもありません"
+    return values, sources, None
+
+# ---------- store and parse ----------
+def prepare_file(source, objects_folder, parsed_folder, find_known, find_existing=None):
+    """
+    Store one source in the blob store and parse it (or reuse the parse of the same content via
+    find_known(content_hash), which returns the experiments row or None). find_existing is passed to
+    blob_store.save_stream. Does not touch the database otherwise, so it can run in a worker thread.
+    """
+    result = {'file_name': source.name}
+    if source.extension not in SUPPORTED_EXTENSIONS:
+        result['skipped'] = f"未対応のファイル形式です ({source.extension or '拡張子なし'})"
+        return result
+    with source.open() as stream:
+        content_hash, file_path, size, is_new = blob_store.save_stream(stream, objects_folder, source.extension,
+                                                                       find_existing)
+    result.update(content_hash=content_hash, file_path=file_path, size=size, is_new=is_new)
+
+    known = None if is_new else find_known(content_hash)
+    if known is not None:
+        result['parsed'] = {key: known[key] for key in ('parsed_path', 'parsed_mtime', 'parsed_size')}
+        result['summary_json'] = known['summary_json']
+        result['reused'] = True
+        try:
+            # ヘッダーはサイドカーの df.attrs に保存されている (列は読まない)
+            result['header'] = measurement_cache.read_sidecar(known['parsed_path'], set()).attrs.get('metadata', {})
+        except (OSError, ValueError):
+            result['header'] = {}
+        return result
+    try:
+        df, parsed = measurement_cache.parse_to_sidecar(file_path, parsed_folder)
+        result['parsed'] = parsed
+        result['summary_json'] = json.dumps(summary_stats.summarize_frame(df))
+        result['header'] = df.attrs.get('metadata', {})
+    except Exception as e:
+        # 単体のアップロードと同じく、解析できないファイルも登録し、分析時に再度読み込みを試みる
+        result['parsed'] = {'parsed_path': None, 'parsed_mtime': None, 'parsed_size': None}
+        result['summary_json'] = None
+        result['header'] = {}
+        result['parse_error'] = str(e)
+    return result
+
+def prepare_files(sources, objects_folder, parsed_folder, find_known, max_workers=4, find_existing=None):
+    """prepare_file for every source in a thread pool; results (or {'error'}) are in the order of sources."""
+    def run(source):
+        try:
+            return prepare_file(source, objects_folder, parsed_folder, find_known, find_existing)
+        except Exception as e:
+            return {'file_name': source.name, 'error': f"保存できませんでした - {e}"}
+
+    if not sources:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as executor:
+        return list(executor.map(run, sources))
+
+# ===================== Main =====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="測定ファイル (複数ファイル・フォルダ・ZIP) をまとめて登録する")
+    parser.add_argument('paths', nargs='+', help="登録するファイル・フォルダ・ZIP")
+    parser.add_argument('--device', help="ヘッダー・マニフェストにない場合の実験装置名")
+    parser.add_argument('--sample', help="ヘッダー・マニフェストにない場合のサンプル名")
+    parser.add_argument('--date', help="ヘッダー・マニフェストにない場合の日付 (YYYY-MM-DD)")
+    parser.add_argument('--manifest', help="マニフェスト (CSV)")
+    parser.add_argument('--json', action='store_true', help="ファイルごとの結果を JSON で出力する")
+    args = parser.parse_args()
+
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        print(f"エラー: 見つかりません: {', '.join(missing)}")
+        sys.exit(1)
+    if args.date and parse_date(args.date) is None:
+        print("エラー: --date は YYYY-MM-DD 形式で指定してください。")
+        sys.exit(1)
+
+    import app as web_app
+    if not os.path.exists(web_app.DATABASE):
+        web_app.init_ex_db()
+    web_app.upgrade_ex_db()
+    sources = path_sources(args.paths)
+    manifest = None
+    if args.manifest:
+        with open(args.manifest, 'rb') as f:
+            manifest = read_manifest(f)
+        # 指定したフォルダの中にあるマニフェストは、データファイルとして登録しない
+        sources = [source for source in sources if os.path.abspath(source.name) != os.path.abspath(args.manifest)]
+    defaults = {'device_name': args.device, 'sample_name': args.sample, 'experiment_date': args.date}
+    with web_app.app.app_context():
+        try:
+            outcomes, counts = web_app.run_bulk_import(web_app.get_db(), sources, defaults, manifest)
+        except ValueError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+
+    if args.json:
+        print(json.dumps({'counts': counts, 'files': outcomes}, ensure_ascii=False, indent=2, default=str))
+    else:
+        for outcome in outcomes:
+            print(f"[{outcome['status']}] {outcome['file_name']}: {outcome['message']}")
+        print(f"登録: {counts['imported']} 件 / スキップ: {counts['skipped']} 件 / エラー: {counts['error']} 件")
+    sys.exit(1 if counts['error'] else 0)
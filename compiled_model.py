@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# LightGBM モデルの配列表現 (コンパイル済みモデル) と NumPy だけで動く評価器
+# run.py (または python compiled_model.py) が G'/Ge, G''/Ge の2つのモデルとスケーラーから
+# trained_models/compiled_model.npz を作る。StandardScaler の mean / scale も一緒に保存し、予測時に
+# scikit-learn と同じ浮動小数点演算 ((x - mean) / scale) で変換してから LightGBM の閾値と比較するので、
+# 予測時は生の [Z, ωτe] をそのまま渡せばよく、lightgbm / scikit-learn を import しない。
+# 閾値を生の単位に畳み込む (x <= t * scale + mean) と丸めが変わり、分岐の境界上の入力 (Z = 1.5 など) で
+# 逆の枝に進むことがあるため、畳み込みは行わない。
+
+# ---------- import library ----------
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+
+COMPILED_MODEL_NAME = 'compiled_model.npz'
+# compiled_model.npz の形式。1 は閾値にスケーラーを畳み込んでいた古い形式 (読み込まずに pkl を使う)
+FORMAT_VERSION = 2
+TARGETS = ('gp', 'gpp')
+
+# 1回に作る (行 × 木) 配列の要素数の上限 (int32 で約16MB)
+PREDICT_CHUNK = 1 << 22
+# 全ての木の閾値で特徴量空間を区切ったセルの表 (cell_table) の大きさの上限。超える場合は木をたどって評価する
+TABLE_MAX_CELLS = 1 << 22
+
+# モデルファイルの内容からバージョン文字列を作る (予測キャッシュのキーや、コンパイル元の確認に使う)
+def files_version(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+# ---------- export ----------
+def _as_booster(model):
+    # LGBMRegressor (従来の run.py) と Booster (lgb.train) のどちらも受け付ける
+    booster = getattr(model, 'booster_', model)
+    best_iteration = getattr(model, 'best_iteration_', None) or getattr(booster, 'best_iteration', 0)
+    return booster, (best_iteration or None)
+
+def flatten_trees(model):
+    """
+    Flatten the trees of a LightGBM model into node arrays. Internal and leaf nodes share one
+    index space over all trees; leaves point to themselves so that extra traversal steps are no-ops.
+    Thresholds stay in the model's own (scaled) feature units.
+    nan_left is the direction LightGBM takes for a NaN input: default_left for missing_type 'NaN',
+    and the side of 0.0 (in the model's own feature units) for missing_type 'None'.
+    Returns a dict of arrays: feature, threshold, left, right, value, nan_left, roots and depth.
+    """
+    booster, num_iteration = _as_booster(model)
+    dump = booster.dump_model(num_iteration=num_iteration)
+    if dump['num_tree_per_iteration'] != 1:
+        raise ValueError("回帰モデル (1反復あたり1本の木) のみ対応しています。")
+
+    feature, threshold, left, right, value, nan_left, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    for info in dump['tree_info']:
+        roots.append(len(feature))
+        # (ノード, 深さ, 親のどちら側に付けるか) を深さ優先でたどり、番号を振る
+        stack = [(info['tree_structure'], 0, None)]
+        while stack:
+            node, depth, parent = stack.pop()
+            index = len(feature)
+            if parent is not None:
+                (left if parent[1] == 'left' else right)[parent[0]] = index
+            max_depth = max(max_depth, depth)
+            if 'leaf_value' in node:
+                feature.append(0)
+                threshold.append(0.0)
+                left.append(index)
+                right.append(index)
+                value.append(node['leaf_value'])
+                nan_left.append(True)
+                continue
+            if node['decision_type'] != '<=':
+                raise ValueError("カテゴリ変数の分岐には対応していません。")
+            if node['missing_type'] == 'Zero':
+                raise ValueError("zero_as_missing で訓練したモデルには対応していません。")
+            f = node['split_feature']
+            t = float(node['threshold'])
+            nan_left.append(bool(node['default_left']) if node['missing_type'] == 'NaN' else 0.0 <= t)
+            feature.append(f)
+            threshold.append(t)
+            left.append(-1)
+            right.append(-1)
+            value.append(0.0)
+            stack.append((node['right_child'], depth + 1, (index, 'right')))
+            stack.append((node['left_child'], depth + 1, (index, 'left')))
+
+    return {
+        'feature': np.array(feature, dtype=np.int32),
+        'threshold': np.array(threshold, dtype=float),
+        'left': np.array(left, dtype=np.int32),
+        'right': np.array(right, dtype=np.int32),
+        'value': np.array(value, dtype=float),
+        'nan_left': np.array(nan_left, dtype=bool),
+        'roots': np.array(roots, dtype=np.int32),
+        'depth': np.array(max_depth, dtype=np.int32),
+    }
+
+def cell_table(flat, n_features):
+    """
+    Tabulate the ensemble on the cells cut by all split thresholds. With edges[f] the sorted unique
+    thresholds of feature f, a row falls in cell c_f = #{edges[f] < x_f} along each feature, and
+    every tree is constant on each cell, so the table holds the exact ensemble output per cell.
+    Returns (edges, values) or None when the table would exceed TABLE_MAX_CELLS.
+    """
+    is_leaf = flat['left'] == np.arange(flat['left'].size)
+    edges = [np.unique(flat['threshold'][~is_leaf & (flat['feature'] == f)]) for f in range(n_features)]
+    shape = tuple(e.size + 1 for e in edges)
+    if np.prod(shape, dtype=float) > TABLE_MAX_CELLS:
+        return None
+    values = np.zeros(shape)
+    for root in flat['roots']:
+        # (ノード, 各特徴量のセル番号の範囲 [lo, hi)) をたどり、葉の値をその範囲のセルに足す
+        stack = [(root, (0,) * n_features, shape)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if is_leaf[node]:
+                values[tuple(slice(a, b) for a, b in zip(lo, hi))] += flat['value'][node]
+                continue
+            f = flat['feature'][node]
+            # x <= edges[f][k] となるのはセル番号が k 以下の場合
+            k = int(np.searchsorted(edges[f], flat['threshold'][node])) + 1
+            stack.append((flat['left'][node], lo, hi[:f] + (min(hi[f], k),) + hi[f + 1:]))
+            stack.append((flat['right'][node], lo[:f] + (max(lo[f], k),) + lo[f + 1:], hi))
+    return edges, values
+
+def export_models(models, scaler, path, source_version=None):
+    """
+    Write the compiled form of models ({'gp': model, 'gpp': model}) together with the scaler's
+    mean and scale. source_version records which pickled model files it was built from.
+    """
+    n_features = int(scaler.n_features_in_)
+    # with_mean / with_std が False の場合は変換しない (0 を引いて 1 で割っても値は変わらない)
+    mean = np.asarray(scaler.mean_ if scaler.with_mean else np.zeros(n_features), dtype=float)
+    scale = np.asarray(scaler.scale_ if scaler.with_std else np.ones(n_features), dtype=float)
+    arrays = {'scaler_mean': mean, 'scaler_scale': scale}
+    for target in TARGETS:
+        flat = flatten_trees(models[target])
+        table = cell_table(flat, mean.size)
+        if table is not None:
+            edges, values = table
+            flat['cell_values'] = values
+            for f, e in enumerate(edges):
+                flat[f'cell_edges_{f}'] = e
+        for name, array in flat.items():
+            arrays[f'{target}_{name}'] = array
+    meta = {
+        'features': [str(name) for name in getattr(scaler, 'feature_names_in_', ['Z', 'omega_tau_e'])],
+        'source_version': source_version,
+        'format': FORMAT_VERSION,
+    }
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(tmp_path, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+
+# ---------- evaluator ----------
+class CompiledTrees:
+    """
+    Sum of the outputs of all trees of one model on scaled rows, evaluated with NumPy: a lookup in the cell table
+    when the export wrote one, otherwise (and for rows with NaN) by walking the node arrays.
+    """
+
+    def __init__(self, arrays, prefix):
+        self.feature = arrays[f'{prefix}_feature']
+        self.threshold = arrays[f'{prefix}_threshold']
+        self.left = arrays[f'{prefix}_left']
+        self.right = arrays[f'{prefix}_right']
+        self.value = arrays[f'{prefix}_value']
+        self.nan_left = arrays[f'{prefix}_nan_left']
+        self.roots = arrays[f'{prefix}_roots']
+        self.depth = int(arrays[f'{prefix}_depth'])
+        self.cell_values = arrays.get(f'{prefix}_cell_values')
+        self.cell_edges = None
+        if self.cell_values is not None:
+            self.cell_edges = [arrays[f'{prefix}_cell_edges_{f}'] for f in range(self.cell_values.ndim)]
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=float)
+        if self.cell_values is None:
+            return self.predict_trees(X)
+        cells = tuple(np.searchsorted(edges, X[:, f]) for f, edges in enumerate(self.cell_edges))
+        result = self.cell_values[cells]
+        missing = np.isnan(X).any(axis=1)
+        if missing.any():
+            result[missing] = self.predict_trees(X[missing])
+        return result
+
+    def predict_trees(self, X):
+        result = np.empty(X.shape[0])
+        rows = max(1, PREDICT_CHUNK // self.roots.size)
+        for start in range(0, X.shape[0], rows):
+            block = X[start:start + rows]
+            # 全ての木を同時に1段ずつ進める (葉は自分自身を指すので、深さの上限まで進めてよい)
+            nodes = np.broadcast_to(self.roots, (block.shape[0], self.roots.size))
+            row_index = np.arange(block.shape[0])[:, None]
+            for _ in range(self.depth):
+                x = block[row_index, self.feature[nodes]]
+                go_left = x <= self.threshold[nodes]
+                missing = np.isnan(x)
+                if missing.any():
+                    go_left = np.where(missing, self.nan_left[nodes], go_left)
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            result[start:start + rows] = self.value[nodes].sum(axis=1)
+        return result
+
+class CompiledModel:
+    """
+    G'/Ge and G''/Ge models loaded from compiled_model.npz. predict takes raw [Z, ωτe] rows.
+    format is FORMAT_VERSION for a current file; older files cannot be evaluated and should be rebuilt.
+    """
+
+    def __init__(self, path):
+        with np.load(path) as arrays:
+            arrays = {name: arrays[name] for name in arrays.files}
+        meta = json.loads(str(arrays.pop('meta')))
+        self.features = meta['features']
+        self.source_version = meta['source_version']
+        self.format = meta.get('format', 1)
+        if self.format != FORMAT_VERSION:
+            return
+        self.mean = arrays.pop('scaler_mean')
+        self.scale = arrays.pop('scaler_scale')
+        self.trees = {target: CompiledTrees(arrays, target) for target in TARGETS}
+
+    def predict(self, X):
+        # StandardScaler.transform と同じ演算 (平均を引いてから標準偏差で割る)
+        scaled = (np.asarray(X, dtype=float) - self.mean) / self.scale
+        return self.trees['gp'].predict(scaled), self.trees['gpp'].predict(scaled)
+
+class PickledModel:
+    """Fallback with the same predict as CompiledModel, using the joblib-pickled models and scaler."""
+
+    def __init__(self, gp_path, gpp_path, scaler_path):
+        import joblib  # lightgbm / scikit-learn もここで読み込まれる
+        self.gp_model = joblib.load(gp_path)
+        self.gpp_model = joblib.load(gpp_path)
+        self.scaler = joblib.load(scaler_path)
+
+    def predict(self, X):
+        scaled = self.scaler.transform(np.asarray(X, dtype=float))
+        return self.gp_model.predict(scaled), self.gpp_model.predict(scaled)
+
+# ===================== Main =====================
+# 既存の pkl ファイル (run.py の出力) からコンパイル済みモデルを作る
+# python compiled_model.py [モデルのフォルダ]
+if __name__ == "__main__":
+    import joblib
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else 'trained_models'
+    paths = [os.path.join(model_dir, name) for name in ('lgbm_gp_model.pkl', 'lgbm_gpp_model.pkl', 'scaler.pkl')]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        print(f"エラー: モデルファイルが見つかりません: {missing} 'run.py' を実行してモデルを生成してください。")
+        sys.exit(1)
+    models = {'gp': joblib.load(paths[0]), 'gpp': joblib.load(paths[1])}
+    output_path = os.path.join(model_dir, COMPILED_MODEL_NAME)
+    export_models(models, joblib.load(paths[2]), output_path, files_version(paths))
+    print(f"コンパイル済みモデルを '{output_path}' に保存しました。")
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# グラフ表示用の曲線の間引き (ダウンサンプリング)
+# 測定データや予測スイープの全点をブラウザに送らず、表示する幅 (ピクセル数) に合わせた点だけを返す。
+#   lttb:   Largest-Triangle-Three-Buckets。幅と同じ点数で曲線の形 (ピーク・肩) を残す
+#   minmax: 1ピクセル列ごとに y の最小・最大の点を残す (ノイズの幅やスパイクを残す。最大で幅の2倍の点数)
+# 周波数・せん断速度のように対数軸で描く x は log10 を取ってから区間に分ける (広い範囲でも低周波側が潰れない)。
+# 結果は (データの内容ハッシュ, 幅, 方法) ごとに CurveCache に保存し、同じ曲線の再描画では計算しない。
+
+# ---------- import library ----------
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+import rheo_parser
+
+METHODS = ('lttb', 'minmax')
+
+# 測定ファイルの横軸にする列 (rheo_parser.CANONICAL_COLUMNS で正規化した列名, 優先順)
+# 対数軸の列がなければ線形軸の列、それもなければ行番号を使う
+LOG_X_COLUMNS = ('angular_frequency', 'frequency', 'shear_rate')
+LINEAR_X_COLUMNS = ('time',)
+# 曲線にしない列 (番号・状態・インターバルの区切り)
+SKIP_COLUMNS = ('point', 'status')
+INTERVAL_COLUMN = 'インターバル'
+
+# 返す値の有効数字 (描画には十分で、JSONの大きさを抑える)
+SIGNIFICANT_DIGITS = 6
+
+# ---------- downsampling ----------
+def lttb_indexes(x, y, n_out):
+    """Indexes of the n_out points kept by Largest-Triangle-Three-Buckets (x sorted ascending)."""
+    n = x.size
+    if n <= n_out or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 1)]
+    # 最初と最後の点は必ず残し、間の点を n_out - 2 個の区間に分ける
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    cx = np.concatenate([[0.0], np.cumsum(x)])
+    cy = np.concatenate([[0.0], np.cumsum(y)])
+    counts = np.diff(edges)
+    mean_x = (cx[edges[1:]] - cx[edges[:-1]]) / counts
+    mean_y = (cy[edges[1:]] - cy[edges[:-1]]) / counts
+    # 最後の区間の「次の区間の平均」は最後の点
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 前に選んだ点・区間内の点・次の区間の平均が作る三角形の面積 (の2倍) が最大の点を選ぶ
+        area = np.abs((x[a] - mean_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+def minmax_indexes(x, y, width):
+    """Indexes of the minimum and maximum y in each of width equal x columns, plus both end points."""
+    n = x.size
+    if n <= 2 * width:
+        return np.arange(n)
+    span = x[-1] - x[0]
+    if span > 0:
+        columns = np.minimum(((x - x[0]) / span * width).astype(int), width - 1)
+    else:
+        columns = np.zeros(n, dtype=int)
+    # 列ごとに y の順に並べ、各列の先頭 (最小) と末尾 (最大) を取る
+    order = np.lexsort((y, columns))
+    boundaries = np.flatnonzero(np.diff(columns[order])) + 1
+    first = order[np.concatenate([[0], boundaries])]
+    last = order[np.concatenate([boundaries - 1, [n - 1]])]
+    return np.unique(np.concatenate([first, last, [0, n - 1]]))
+
+def round_significant(values, digits=SIGNIFICANT_DIGITS):
+    values = np.asarray(values, dtype=float)
+    magnitude = np.floor(np.log10(np.abs(np.where(values == 0, 1.0, values))))
+    scale = 10.0**(digits - 1 - magnitude)
+    return np.round(values * scale) / scale
+
+def downsample_series(x, y, width, method='lttb', log_x=False, log_y=False):
+    """
+    Downsample one curve for a plot width pixels wide. Points that are not finite (or not positive on
+    a log axis) are dropped and the rest are sorted by x. Buckets are formed in log10 x when log_x and the
+    LTTB areas use log10 y when log_y. Returns {'n_points', 'x', 'y'} with the kept points in original units.
+    """
+    if method not in METHODS:
+        raise ValueError(f"未対応の間引き方法です: {method}")
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = np.isfinite(x) & np.isfinite(y)
+    if log_x:
+        valid &= x > 0
+    if log_y:
+        valid &= y > 0
+    x, y = x[valid], y[valid]
+    order = np.argsort(x, kind='stable')
+    x, y = x[order], y[order]
+
+    plot_x = np.log10(x) if log_x else x
+    if method == 'lttb':
+        keep = lttb_indexes(plot_x, np.log10(y) if log_y else y, width)
+    else:
+        keep = minmax_indexes(plot_x, y, width)
+    return {
+        'n_points': int(x.size),
+        'x': round_significant(x[keep]).tolist(),
+        'y': round_significant(y[keep]).tolist(),
+    }
+
+def measurement_series(df, width, method='lttb'):
+    """
+    Downsampled curves of a parsed measurement: one series per numeric column and interval, against
+    the frequency / shear-rate column (log x) or the time column (linear x). The y axis is log when x is
+    log and all values of the column are positive. Returns {'x_column', 'x_scale', 'series'}.
+    """
+    columns = {}
+    for column in df.columns:
+        name = str(column).strip()
+        columns.setdefault(rheo_parser.CANONICAL_COLUMNS.get(name, name), column)
+    x_name = next((name for name in LOG_X_COLUMNS + LINEAR_X_COLUMNS if name in columns), None)
+    x_column = columns.get(x_name)
+    log_x = x_name in LOG_X_COLUMNS
+    skip = {columns[name] for name in SKIP_COLUMNS if name in columns} | {x_column, INTERVAL_COLUMN}
+
+    if INTERVAL_COLUMN in df.columns:
+        parts = df.groupby(INTERVAL_COLUMN, sort=True)
+    else:
+        parts = [(None, df)]
+    series = []
+    for interval, part in parts:
+        if x_column is None:
+            x = np.arange(1, len(part) + 1, dtype=float)
+        else:
+            x = pd.to_numeric(part[x_column], errors='coerce').to_numpy(dtype=float)
+        for column in df.columns:
+            if column in skip:
+                continue
+            y = pd.to_numeric(part[column], errors='coerce').to_numpy(dtype=float)
+            finite = y[np.isfinite(y)]
+            # 文字列の列や値のない列は飛ばす
+            if finite.size == 0:
+                continue
+            log_y = log_x and bool((finite > 0).all())
+            entry = {
+                'interval': None if interval is None else int(interval),
+                'y_column': str(column),
+                'y_scale': 'log' if log_y else 'linear',
+            }
+            entry.update(downsample_series(x, y, width, method, log_x, log_y))
+            series.append(entry)
+    return {
+        'x_column': 'row' if x_column is None else str(x_column),
+        'x_scale': 'log' if log_x else 'linear',
+        'series': series,
+    }
+
+# ---------- cache ----------
+class CurveCache:
+    """LRU cache of downsampled curve responses keyed by (content hash, width, method, ...)."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = int(max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+        # 計算中はロックを持たない (同じキーを同時に計算した場合は後の結果で上書きするだけ)
+        payload = compute()
+        with self._lock:
+            self._entries[key] = payload
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# LM(2002) の計算 (generate_data.py) を直接使った G'/Ge, G''/Ge の「厳密」予測
+# 任意の Z (整数でなくてもよい) について G(t) -> Prony フィット -> G', G'' を計算する。
+# 学習データ (t/τe 1500点, 200項) より粗い既定グリッドで 1つのZあたり約10msで計算でき、
+# フィットした Prony 係数 (taus, Gp) は Z ごとにLRUでキャッシュするため、同じZの別の ωτe は再フィットしない。
+
+# ---------- import library ----------
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+import generate_data
+from prediction_cache import quantize
+
+# 既定のグリッド (学習データの生成より粗い。Prony 係数は t/τe と項数だけで決まる)
+DEFAULT_N_T = 600
+DEFAULT_N_TERMS = 120
+DEFAULT_PMAX2 = 5000
+# t/τe グリッドの範囲。上限は最長緩和時間 τd/τe の T_MAX_FACTOR 倍まで広げる
+# (学習データの上限 1e5 は Z が数十を超えると τd に届かず、低周波側の G'' が大きくずれるため)
+T_MIN = 1e-10
+T_MAX = 1e5
+T_MAX_FACTOR = 100.0
+
+class TimeBudgetExceeded(Exception):
+    """Raised when fitting the requested Z values would exceed the time budget."""
+
+def time_grid(Z, n_t=DEFAULT_N_T):
+    """t/τe grid used for the Prony fit of one Z."""
+    t_max = max(T_MAX, T_MAX_FACTOR * generate_data.tau_d_over_taue(Z))
+    return np.geomspace(T_MIN, t_max, n_t)
+
+class ExactPhysics:
+    """On-demand LM(2002) G'/Ge, G''/Ge with an LRU cache of per-Z Prony coefficients."""
+
+    def __init__(self, n_t=DEFAULT_N_T, n_terms=DEFAULT_N_TERMS, Pmax2=DEFAULT_PMAX2, max_entries=512):
+        self.n_t = int(n_t)
+        self.n_terms = int(n_terms)
+        self.Pmax2 = int(Pmax2)
+        self.max_entries = int(max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fit_seconds = 0.0
+
+    def _key(self, Z, n_t, n_terms):
+        return (float(quantize(Z)), n_t, n_terms, self.Pmax2)
+
+    def coefficients(self, Z, n_t=None, n_terms=None):
+        """Return (taus, Gp, residual, cached) for one Z, fitting and caching it if needed."""
+        n_t = int(n_t or self.n_t)
+        n_terms = int(n_terms or self.n_terms)
+        key = self._key(Z, n_t, n_terms)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value + (True,)
+
+        start = time.perf_counter()
+        t_hat = time_grid(Z, n_t)
+        Gt = generate_data.G_time_LM_fast(t_hat, Z, Pmax2=self.Pmax2)
+        # 学習データと同じ fit_maxwell で解く (fit_maxwell_batch は大きなZで別の解になる)
+        taus, Gp = generate_data.fit_maxwell(Gt, t_hat, n_terms=n_terms)
+        _, E = generate_data.prony_design(t_hat, n_terms)
+        value = (taus, Gp, float(np.linalg.norm(E @ Gp - Gt)))
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.misses += 1
+            self.fit_seconds += time.perf_counter() - start
+        return value + (False,)
+
+    def is_cached(self, Z, n_t=None, n_terms=None):
+        key = self._key(Z, int(n_t or self.n_t), int(n_terms or self.n_terms))
+        with self._lock:
+            return key in self._entries
+
+    def predict(self, z_values, omega_values, time_budget=None, n_t=None, n_terms=None):
+        """
+        G'/Ge, G''/Ge for the (Z, ωτe) pairs (1-D arrays of the same length).
+        Each distinct Z is fitted once. Raises TimeBudgetExceeded before starting a new fit once
+        time_budget seconds have passed; the Z values fitted so far stay cached for a retry.
+        Returns (gp, gpp, fits) where fits lists {'Z', 'fit_residual', 'cached'} per distinct Z.
+        """
+        z_values = np.asarray(z_values, dtype=float)
+        omega_values = np.asarray(omega_values, dtype=float)
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        predicted_gp = np.empty(z_values.size)
+        predicted_gpp = np.empty(z_values.size)
+        fits = []
+        for Z in np.unique(z_values):
+            if deadline is not None and time.perf_counter() > deadline and not self.is_cached(Z, n_t, n_terms):
+                raise TimeBudgetExceeded(
+                    f"制限時間 ({time_budget:g} 秒) 内に計算できたのは {len(fits)} 個のZまでです。")
+            taus, Gp, residual, cached = self.coefficients(Z, n_t, n_terms)
+            rows = z_values == Z
+            predicted_gp[rows], predicted_gpp[rows] = generate_data.storage_loss_from_prony(
+                omega_values[rows], taus, Gp)
+            fits.append({'Z': float(Z), 'fit_residual': residual, 'cached': cached})
+        return predicted_gp, predicted_gpp, fits
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'fit_seconds': self.fit_seconds,
+                'n_t': self.n_t,
+                'n_terms': self.n_terms,
+            }
@@ -2,13 +2,21 @@
 # LM(2002) -> generalized Maxwell (Prony) -> G', G'' and CSV export
 # 入力: 同じフォルダに "Z_input.txt" を置き、1行目・2行目に Z を書く（例: 10\n1000）
 # 出力: 各 Z について "Z{Z}.csv" を保存（列: omega, Gp, Gpp）
+# 学習データ: python generate_data.py [--z-min 1 --z-max 100 --n-omega 1300 --workers 4 ...]
+#   Zごとにプロセスプールで計算して generated_data/shards/Z000001.npz ... に保存し、最後に結合CSVを作る。
+#   生成済みのシャードは再実行時にスキップする。
 
 # ---------- import library ----------
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.optimize import nnls
-from scipy.special import gamma, gammaincc
+from scipy.special import gamma, gammaincc, erf, erfc, eval_hermite
 import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd #csv結合のため追加
 
 # ---------- LM(2002) constants ----------
@@ -74,6 +82,100 @@ def G_time_LM(t_hat, Z, Pmax2=5000):
     G2 = (1.0/Z) * np.exp(-(2.0*(p2**2))[None,:] * x[:,None]).sum(axis=1)
     return G_tube + G1 + G2   # already normalized by Ge
 
+# ---------- memory-bounded evaluation of the mode sums ----------
+# G_time_LM は (時間点 × モード) の行列を丸ごと作るため、Pmax2=5000 では1つのZあたり約60MBを使う。
+# 以下は同じ式を、行列の大きさを MODE_SUM_CHUNK 要素以下に抑えて計算する。
+#   - exp(-a p²) が先頭項の e^-40 倍 (倍精度の丸め誤差以下) より小さくなるモードは打ち切る
+#   - 項がなめらかに変化する行 (a(2p+1) < EM_MAX_SLOPE) は Euler–Maclaurin の式で和を閉じた形で求める
+# G_time_LM との相対誤差は 1e-13 程度 (benchmarks/bench_g_time.py で確認)。
+
+# 1回に作る (時間点 × モード) 配列の要素数の上限 (float64 で約8MB)
+MODE_SUM_CHUNK = 1 << 20
+# 打ち切りの基準 (先頭項に対する比 e^-_TRUNCATE_EXPONENT)
+_TRUNCATE_EXPONENT = 40.0
+# Euler–Maclaurin の式を使う条件 (隣のモードとの比 exp(-a(2p+1)) が1に近い)
+EM_MAX_SLOPE = 0.1
+# Euler–Maclaurin の補正項 (f の奇数階微分の次数, B_2k/(2k)!)
+_EM_TERMS = ((1, 1.0/12.0), (3, -1.0/720.0), (5, 1.0/30240.0), (7, -1.0/1209600.0))
+
+def _gaussian_derivative(m, a, p):
+    # d^m/dp^m exp(-a p²) = (-√a)^m H_m(√a p) exp(-a p²)
+    s = np.sqrt(a)
+    return (-s)**m * eval_hermite(m, s*p) * np.exp(-a*p*p)
+
+def _euler_maclaurin(a, p_first, p_last):
+    # Σ_{p=p_first}^{p_last} exp(-a p²) (p は1刻み) の Euler–Maclaurin 近似
+    s = np.sqrt(a)
+    z, b = s*p_first, s*p_last
+    # 引数が大きいときは erfc の差で桁落ちを避ける
+    diff = np.where(z > 0.5, erfc(z) - erfc(b), erf(b) - erf(z))
+    total = 0.5*np.sqrt(np.pi/a)*diff + 0.5*(np.exp(-a*p_first**2) + np.exp(-a*p_last**2))
+    for m, coef in _EM_TERMS:
+        total += coef * (_gaussian_derivative(m, a, p_last) - _gaussian_derivative(m, a, p_first))
+    return total
+
+def gaussian_mode_sum(a, p_start, n_modes, chunk_elems=MODE_SUM_CHUNK):
+    """
+    Σ_{k=0}^{n_modes-1} exp(-a (p_start+k)²) for every a (1-D array, a >= 0),
+    without building the full [len(a) x n_modes] matrix.
+    """
+    a = np.asarray(a, float)
+    total = np.zeros_like(a)
+    if n_modes <= 0:
+        return total
+    p_last = p_start + n_modes - 1
+    # 各行で意味のある最後のモード (それより先は先頭項の e^-40 倍未満)
+    with np.errstate(divide='ignore'):
+        p_sig = np.minimum(p_last, np.sqrt(p_start**2 + _TRUNCATE_EXPONENT/a))
+
+    zero = a == 0
+    total[zero] = n_modes
+    smooth = ~zero & (a*(2*p_sig + 1) < EM_MAX_SLOPE)
+    if smooth.any():
+        total[smooth] = _euler_maclaurin(a[smooth], p_start, p_last)
+
+    # 残りの行は打ち切ったモードまで直接足す (モードをブロックに分けて行列の大きさを抑える)
+    rows = np.flatnonzero(~zero & ~smooth)
+    if rows.size:
+        counts = np.minimum(np.floor(p_sig[rows] - p_start).astype(np.int64) + 1, n_modes)
+        block = max(1, chunk_elems // rows.size)
+        for k0 in range(0, int(counts.max()), block):
+            active = rows[counts > k0]
+            p = p_start + np.arange(k0, min(k0 + block, int(counts.max())), dtype=float)
+            total[active] += np.exp(-a[active, None] * (p*p)[None, :]).sum(axis=1)
+    return total
+
+def mu_hat_fast(t_hat, Z, chunk_elems=MODE_SUM_CHUNK):
+    # mu_hat_only と同じ式 (レプテーションのモード和を行ブロックに分けて計算)
+    t_hat = np.atleast_1d(t_hat).astype(float)
+    td    = tau_d_over_taue(Z)
+    coef1 = (8.0/np.pi**2) * G_f(Z)
+    p     = np.arange(1, pstar(Z)+1, 2.0)
+    invp2 = 1.0/(p**2)
+    rept  = np.empty_like(t_hat)
+    rows  = max(1, chunk_elems // p.size)
+    for i in range(0, t_hat.size, rows):
+        block = t_hat[i:i+rows]
+        rept[i:i+rows] = coef1 * np.sum(invp2[None,:] * np.exp(-block[:,None]*(p**2)/td), axis=1)
+    es = eps_star(Z, coef1, np.sum(invp2))
+    tail = (t_hat**0.25) * Gamma_upper_m14(es * t_hat)
+    return rept + (0.306/Z) * tail
+
+def G_time_LM_fast(t_hat, Z, Pmax2=5000, chunk_elems=MODE_SUM_CHUNK):
+    """
+    Same quantity as G_time_LM (LM eq.(19), normalized by Ge) with peak memory bounded by
+    chunk_elems and the Rouse sums truncated / summed in closed form where possible.
+    """
+    t_hat = np.atleast_1d(t_hat).astype(float)
+    G_tube = (4.0/5.0) * (mu_hat_fast(t_hat, Z, chunk_elems) * R_of_t(t_hat, Z))
+    x = t_hat/(Z**2)
+    # p1 = 1, 2, ..., (< Z) と p2 = Z, Z+1, ..., (< Pmax2) は G_time_LM の np.arange と同じモード
+    n1 = int(np.ceil(Z - 1)) if Z > 1 else 0
+    n2 = max(int(np.ceil(Pmax2 - Z)), 0)
+    G1 = (1.0/(5.0*Z)) * gaussian_mode_sum(x, 1.0, n1, chunk_elems)
+    G2 = (1.0/Z) * gaussian_mode_sum(2.0*x, float(Z), n2, chunk_elems)
+    return G_tube + G1 + G2   # already normalized by Ge
+
 # ---------- Fit G(t) with generalized Maxwell (NNLS) ----------
 def fit_maxwell(Gt_t, t, n_terms=100):
     """
@@ -87,6 +189,38 @@ def fit_maxwell(Gt_t, t, n_terms=100):
     Gp = nnls(E, np.asarray(Gt_t, float), maxiter=10000)[0]        # 非負制約, maxiterの追加
     return taus, Gp
 
+# ---------- Batched fit for many G(t) on the same t grid ----------
+def prony_design(t, n_terms=100):
+    # fit_maxwell と同じ τ_j と設計行列 E (t と n_terms が同じなら Z によらず共通)
+    t = np.asarray(t, float)
+    taus = np.geomspace(t.min()/20, t.max()*20, n_terms)
+    E = np.exp(-t[:, None] / taus[None, :])
+    return taus, E
+
+def fit_maxwell_batch(Gt_columns, t, n_terms=100):
+    """
+    Fit several G(t) curves sampled on the same t (columns of Gt_columns, [len(t) x n_curves]).
+    The design matrix is built and QR-factorized once; each curve is then solved as a
+    n_terms x n_terms NNLS problem with the same minimum residual as fit_maxwell.
+    The coefficients are not the same: the fit is ill-posed and the reduced problem can land on a
+    different minimizer (G'/Ge moves by up to 0.05 at Z = 100), so generate_data.py only uses this
+    with --qr-fit.
+    Returns taus [n_terms], Gp [n_curves x n_terms], residual [n_curves] (= ||E Gp - G(t)||_2).
+    """
+    B = np.asarray(Gt_columns, float).reshape(len(t), -1)
+    taus, E = prony_design(t, n_terms)
+    # E = QR とすると ||E x - b||² = ||R x - Qᵀb||² + ||b - QQᵀb||² なので、
+    # 1500 x 200 の問題を 200 x 200 の三角行列の問題に置き換えても残差の最小値は変わらない
+    # (解が一意でないため、係数は fit_maxwell と一致しない)
+    Q, R = np.linalg.qr(E)
+    C = Q.T @ B
+    Gp = np.empty((B.shape[1], n_terms))
+    for i in range(B.shape[1]):
+        Gp[i] = nnls(R, C[:, i], maxiter=10000)[0]   # 非負制約
+    # 残差は元の設計行列で全Zまとめて計算する
+    residual = np.linalg.norm(E @ Gp.T - B, axis=0)
+    return taus, Gp, residual
+
 # ---------- Compute G', G'' from (Gp, taus) ----------
 def storage_loss_from_prony(omega, taus, Gp):
     x = np.outer(omega, taus)  # [M x P]
@@ -114,8 +248,221 @@ def load_Z_list(path="Z_input.txt", maxn=2):
                 break
     return vals
 
+# ---------- per-Z generation ----------
+def generate_Z_batch(Z_values, t_hat, omega, n_terms=200, Pmax2=5000, reference_sums=False, qr_fit=False):
+    """
+    Run G_time_LM -> fit_maxwell -> storage_loss_from_prony for several Z. Returns one dict of arrays
+    per Z: omega_tau_e, Gp_over_Ge, Gpp_over_Ge, the Prony terms (taus, Gp_coeff) and the fit
+    residual ||E Gp - G(t)||_2.
+    reference_sums=True evaluates G(t) with the full-matrix G_time_LM instead of G_time_LM_fast.
+    qr_fit=True shares one QR-factorized Prony fit between the Z values (fit_maxwell_batch); it is
+    faster but does not reproduce the fit_maxwell coefficients for large Z.
+    """
+    G_time = G_time_LM if reference_sums else G_time_LM_fast
+    Gt = np.column_stack([G_time(t_hat, Z, Pmax2=Pmax2) for Z in Z_values])
+    if qr_fit:
+        taus, Gp_coeff, residual = fit_maxwell_batch(Gt, t_hat, n_terms=n_terms)
+    else:
+        fits = [fit_maxwell(Gt[:, i], t_hat, n_terms=n_terms) for i in range(Gt.shape[1])]
+        taus = fits[0][0]
+        Gp_coeff = np.array([Gp for _, Gp in fits])
+        _, E = prony_design(t_hat, n_terms)
+        residual = np.linalg.norm(E @ Gp_coeff.T - Gt, axis=0)
+    results = []
+    for i in range(len(Z_values)):
+        Gp_w, Gpp_w = storage_loss_from_prony(omega, taus, Gp_coeff[i])
+        results.append({
+            'omega_tau_e': np.asarray(omega, float),
+            'Gp_over_Ge': Gp_w,
+            'Gpp_over_Ge': Gpp_w,
+            'taus': taus,
+            'Gp_coeff': Gp_coeff[i],
+            'fit_residual': np.array(residual[i]),
+        })
+    return results
+
+def generate_Z(Z, t_hat, omega, n_terms=200, Pmax2=5000, reference_sums=False, qr_fit=False):
+    """Single-Z version of generate_Z_batch."""
+    return generate_Z_batch([Z], t_hat, omega, n_terms=n_terms, Pmax2=Pmax2, reference_sums=reference_sums,
+                            qr_fit=qr_fit)[0]
+
+# ---------- shards (Z ごとの .npz) ----------
+SHARD_DIR = os.path.join("generated_data", "shards")
+# 1つのプロセスでまとめて計算するZの最大個数
+DEFAULT_BATCH_SIZE = 25
+MANIFEST_NAME = "manifest.json"
+
+def shard_path(shard_dir, Z):
+    return os.path.join(shard_dir, f"Z{int(Z):06d}.npz")
+
+def write_shard(path, arrays):
+    # 書き込み途中で止まっても壊れたシャードが残らないよう、一時ファイルに保存してから置き換える
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def read_shard(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+def grid_manifest(t_hat, omega, n_terms, Pmax2, qr_fit=False):
+    # シャードの生成条件 (既存シャードと条件が違う場合に混ざらないよう確認する)
+    manifest = {
+        't_hat': [float(t_hat[0]), float(t_hat[-1]), int(t_hat.size)],
+        'omega': [float(omega[0]), float(omega[-1]), int(omega.size)],
+        'n_terms': int(n_terms),
+        'Pmax2': int(Pmax2),
+    }
+    # QR でまとめてフィットしたシャードは係数が異なるため、既定のシャードと混ぜない
+    if qr_fit:
+        manifest['fit'] = 'qr'
+    return manifest
+
+def check_manifest(shard_dir, manifest):
+    path = os.path.join(shard_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        if existing != manifest:
+            raise ValueError(
+                f"'{shard_dir}' のシャードは別の条件で生成されています: {existing}\n"
+                "別の --shard-dir を指定するか、--overwrite で作り直してください。")
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+def _generate_shards(Z_values, t_hat, omega, n_terms, Pmax2, paths, reference_sums=False, qr_fit=False):
+    # ワーカープロセスで複数のZをまとめて計算し (qr_fit では設計行列の分解は1回)、Zごとのシャードに保存する
+    # 戻り値は Z ごとの (Z, 経過時間, エラー or None)
+    start = time.perf_counter()
+    try:
+        results = generate_Z_batch(Z_values, t_hat, omega, n_terms=n_terms, Pmax2=Pmax2,
+                                   reference_sums=reference_sums, qr_fit=qr_fit)
+    except RuntimeError:
+        # nnls が収束しないZがあった場合は、Zごとに計算し直して失敗したZだけを報告する
+        if len(Z_values) == 1:
+            raise
+        outcomes = []
+        for Z, path in zip(Z_values, paths):
+            try:
+                outcomes.extend(_generate_shards([Z], t_hat, omega, n_terms, Pmax2, [path], reference_sums, qr_fit))
+            except RuntimeError as e:
+                outcomes.append((Z, 0.0, e))
+        return outcomes
+    elapsed = (time.perf_counter() - start) / len(Z_values)
+    for Z, path, arrays in zip(Z_values, paths, results):
+        arrays['Z'] = np.array(Z)
+        write_shard(path, arrays)
+    return [(Z, elapsed, None) for Z in Z_values]
+
+def run_pipeline(Z_values, t_hat, omega, n_terms=200, Pmax2=5000, shard_dir=SHARD_DIR,
+                 workers=None, overwrite=False, reference_sums=False, batch_size=None, qr_fit=False):
+    """
+    Generate one shard per Z on a process pool. Each task computes batch_size consecutive Z values
+    (with qr_fit, in one fit_maxwell_batch) and writes their shards. Existing shards are skipped so that an
+    interrupted run resumes where it stopped. Returns the list of Z values that failed.
+    """
+    if overwrite and os.path.isdir(shard_dir):
+        for name in os.listdir(shard_dir):
+            if name.endswith(".npz") or name == MANIFEST_NAME:
+                os.remove(os.path.join(shard_dir, name))
+    os.makedirs(shard_dir, exist_ok=True)
+    check_manifest(shard_dir, grid_manifest(t_hat, omega, n_terms, Pmax2, qr_fit))
+
+    todo = [Z for Z in Z_values if not os.path.exists(shard_path(shard_dir, Z))]
+    print(f"{len(Z_values)} 個のZのうち {len(Z_values) - len(todo)} 個は生成済みのためスキップします。")
+    failed = []
+    if not todo:
+        return failed
+
+    workers = workers or os.cpu_count() or 1
+    # 既定では各プロセスに均等に割り振る (中断時に失う計算が大きくならないよう1タスク最大 DEFAULT_BATCH_SIZE 個)
+    batch_size = batch_size or max(1, min(DEFAULT_BATCH_SIZE, -(-len(todo) // workers)))
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+        futures = {
+            executor.submit(_generate_shards, batch, t_hat, omega, n_terms, Pmax2,
+                            [shard_path(shard_dir, Z) for Z in batch], reference_sums, qr_fit): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                outcomes = future.result()
+            except Exception as e: # 予期せぬエラーはバッチ内のすべてのZを失敗として扱う
+                outcomes = [(Z, 0.0, e) for Z in batch]
+            for Z, elapsed, error in outcomes:
+                done += 1
+                if error is None:
+                    print(f"[{done}/{len(todo)}] Z = {Z} done ({elapsed:.2f} s)")
+                elif isinstance(error, RuntimeError): # nnlsのRuntimeError
+                    print(f"Error processing Z = {Z}: {error}. Skipping this Z value.")
+                    failed.append(Z)
+                else:
+                    print(f"An unexpected error occurred for Z = {Z}: {error}. Skipping this Z value.")
+                    failed.append(Z)
+    return sorted(failed)
+
+def iter_shards(shard_dir=SHARD_DIR, Z_values=None):
+    # シャードをZの小さい順に1つずつ DataFrame (学習データと同じ列) として返す
+    if Z_values is None:
+        paths = sorted(os.path.join(shard_dir, name) for name in os.listdir(shard_dir)
+                       if name.startswith("Z") and name.endswith(".npz") and ".tmp" not in name)
+    else:
+        paths = [shard_path(shard_dir, Z) for Z in sorted(Z_values) if os.path.exists(shard_path(shard_dir, Z))]
+    for path in paths:
+        shard = read_shard(path)
+        yield pd.DataFrame({
+            'omega_tau_e': shard['omega_tau_e'],
+            'Gp_over_Ge': shard['Gp_over_Ge'],
+            'Gpp_over_Ge': shard['Gpp_over_Ge'],
+            'Z': int(shard['Z']),
+        })
+
+def load_shards(shard_dir=SHARD_DIR, Z_values=None):
+    frames = list(iter_shards(shard_dir, Z_values))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def shards_to_csv(csv_path, shard_dir=SHARD_DIR, Z_values=None):
+    # シャードを1つずつ追記するので、全データをメモリに載せずにCSVを作れる
+    n_rows = 0
+    with open(csv_path, "w", newline="") as f:
+        for i, df in enumerate(iter_shards(shard_dir, Z_values)):
+            df.to_csv(f, index=False, header=(i == 0))
+            n_rows += len(df)
+    return n_rows
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="LM(2002) の G'/Ge, G''/Ge 学習データを Z ごとに並列生成する")
+    parser.add_argument("--z-min", type=int, default=1)
+    parser.add_argument("--z-max", type=int, default=100)
+    parser.add_argument("--z-step", type=int, default=1)
+    parser.add_argument("--t-min", type=float, default=1e-10, help="t/τe グリッドの最小値")
+    parser.add_argument("--t-max", type=float, default=1e5, help="t/τe グリッドの最大値")
+    parser.add_argument("--n-t", type=int, default=1500, help="t/τe グリッドの点数")
+    parser.add_argument("--omega-min", type=float, default=1e-12, help="ωτe グリッドの最小値")
+    parser.add_argument("--omega-max", type=float, default=1e1, help="ωτe グリッドの最大値")
+    parser.add_argument("--n-omega", type=int, default=1300, help="ωτe グリッドの点数")
+    parser.add_argument("--n-terms", type=int, default=200, help="Prony 項数")
+    parser.add_argument("--pmax2", type=int, default=5000)
+    parser.add_argument("--reference-sums", action="store_true",
+                        help="G(t) のモード和を従来の全行列計算 (G_time_LM) で求める")
+    parser.add_argument("--qr-fit", action="store_true",
+                        help="Prony 項のフィットを QR 分解した設計行列でまとめて解く (速いが、大きなZでは係数と G', G'' が既定と異なる)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help=f"1タスクでまとめてフィットするZの個数 (既定: プロセスごとに均等, 最大{DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数 (既定: CPU数)")
+    parser.add_argument("--shard-dir", default=SHARD_DIR, help="Zごとのシャード (.npz) の保存先")
+    parser.add_argument("--overwrite", action="store_true", help="既存のシャードを削除して作り直す")
+    parser.add_argument("--csv", default=None,
+                        help="結合CSVの出力先 (既定: generated_data/learning_data_Z_<min>_to_<max>.csv)")
+    parser.add_argument("--no-csv", action="store_true", help="結合CSVを作らずシャードだけを生成する")
+    return parser.parse_args(argv)
+
 # ===================== Main =====================
 if __name__ == "__main__":
+    args = parse_args()
     output_folder = "generated_data" # 出力フォルダの設定
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
@@ -123,53 +470,38 @@ if __name__ == "__main__":
     # Z_list = load_Z_list("Z_input.txt", maxn=2)
 
     # grids
-    t_hat  = np.geomspace(1e-10, 1e5, 1500)   # t/τe
-    omega  = np.geomspace(1e-12, 1e1, 1300)    # ωτe
-    n_terms = 200                              # Prony 項数
-
-    all_Z_data = []
+    t_hat  = np.geomspace(args.t_min, args.t_max, args.n_t)               # t/τe
+    omega  = np.geomspace(args.omega_min, args.omega_max, args.n_omega)   # ωτe
+    n_terms = args.n_terms                                                # Prony 項数
+    Z_values = list(range(args.z_min, args.z_max + 1, args.z_step))
 
     # プロット
     # fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4.6))
 
-    for Z_value in range(1, 101):
-        print(f"Processing Z = {Z_value} for Learning Data...")
-        try:
-            Gt = G_time_LM(t_hat, Z_value, Pmax2=5000)
-            taus, Gp_coeff = fit_maxwell(Gt, t_hat, n_terms=n_terms)
-            Gp_w, Gpp_w = storage_loss_from_prony(omega, taus, Gp_coeff)
-
-            df_temp = pd.DataFrame({
-                'omega_tau_e': omega,
-                'Gp_over_Ge': Gp_w,
-                'Gpp_over_Ge': Gpp_w
-            })
-            df_temp['Z'] = Z_value
-            all_Z_data.append(df_temp)
-        
-        except RuntimeError as e: # nnlsのRuntimeErrorをキャッチ
-            print(f"Error processing Z = {Z_value}: {e}. Skipping this Z value.")
-            continue # このZ値の処理をスキップして次のループへ
-        except Exception as e: # その他の予期せぬエラーもキャッチ
-            print(f"An unexpected error occurred for Z = {Z_value}: {e}. Skipping this Z value.")
-            continue
-
-    # 全てのZについてのデータを一つのDataFrameに結合
-    if all_Z_data: # データが1つでもあれば結合
-        combined_df = pd.concat(all_Z_data, ignore_index=True)
-
-        # 結合したDataFrameをCSVファイルとして保存 (学習用データとして特定)
-        final_output_csv_path = os.path.join(output_folder, 'learning_data_Z_1_to_100.csv')
-        combined_df.to_csv(final_output_csv_path, index=False)
-
-        print(f"\nZ=1から100までの学習用データ生成と結合が完了しました。")
-        print(f"ファイルは '{final_output_csv_path}' に保存されました。")
-        print("\n生成されたデータの最初の5行:")
-        print(combined_df.head())
-        print("\n生成されたデータの最後の5行:")
-        print(combined_df.tail())
-    else:
-        print("\nエラーにより、Z=1から100の範囲で有効なデータが一つも生成されませんでした。")
+    # Zごとにプロセスプールで計算し、1つずつシャードに保存する (途中で止まっても再実行で続きから生成)
+    start = time.perf_counter()
+    try:
+        failed = run_pipeline(Z_values, t_hat, omega, n_terms=n_terms, Pmax2=args.pmax2,
+                              shard_dir=args.shard_dir, workers=args.workers, overwrite=args.overwrite,
+                              reference_sums=args.reference_sums, batch_size=args.batch_size,
+                              qr_fit=args.qr_fit)
+    except ValueError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
+    print(f"\nシャードの生成が完了しました。({time.perf_counter() - start:.1f} s, 保存先: '{args.shard_dir}')")
+    if failed:
+        print(f"エラーにより生成できなかったZ: {failed}")
+
+    # シャードを結合したDataFrameをCSVファイルとして保存 (学習用データとして特定)
+    if not args.no_csv:
+        final_output_csv_path = args.csv or os.path.join(
+            output_folder, f'learning_data_Z_{args.z_min}_to_{args.z_max}.csv')
+        n_rows = shards_to_csv(final_output_csv_path, args.shard_dir, Z_values)
+        if n_rows:
+            print(f"\nZ={args.z_min}から{args.z_max}までの学習用データの結合が完了しました。(総データ件数: {n_rows})")
+            print(f"ファイルは '{final_output_csv_path}' に保存されました。")
+        else:
+            print(f"\nエラーにより、Z={args.z_min}から{args.z_max}の範囲で有効なデータが一つも生成されませんでした。")
     # for Z in Z_list:
         # Gt = G_time_LM(t_hat, Z, Pmax2=5000)
         # taus, Gp_coeff = fit_maxwell(Gt, t_hat, n_terms=n_terms)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# 測定した G', G'' (周波数スイープ) から Z と τe (と Ge) を推定する逆フィット
+# log-log 空間では τe の違いは横方向の平行移動、Ge の違いは縦方向の平行移動になる。そこで
+# ルックアップテーブル (generate_data.py の LM(2002) の曲線) を log ωτe 方向に細かくずらした「窓」を切り出し、
+# 各窓の log G'/Ge, log G''/Ge から平均を引いたもの (縦方向の移動によらない形) を最近傍探索の索引 (cKDTree) にしておく。
+# 測定曲線も同じ間隔の点に補間して平均を引けば、最も近い窓の (Z, ずらし量) から Z と τe が、平均の差から Ge が決まる。
+# 窓の点数 (測定範囲の広さ) ごとに索引を1つ作り、同じ点数の測定はまとめて1回の探索で処理する。
+
+# ---------- import library ----------
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+import rheo_parser
+
+# 窓の点の間隔 (log10 ω の decade 単位)
+STEP = 0.1
+# 窓をずらす間隔 (τe の分解能, decade 単位)。STEP はこの整数倍にする
+SHIFT_STEP = 0.02
+# 窓の点数の範囲。測定範囲が広い場合は点の間隔を STEP の整数倍に広げ、点数を MAX_POINTS 以下にする
+MIN_POINTS = 5
+MAX_POINTS = 41
+# 保持する索引 (窓の点数・間隔の組) の数
+MAX_INDEXES = 8
+
+# 測定ファイルの列 (rheo_parser.CANONICAL_COLUMNS で正規化した列名)
+OMEGA_COLUMN = 'angular_frequency'
+FREQUENCY_COLUMN = 'frequency'
+GP_COLUMN = 'storage_modulus'
+GPP_COLUMN = 'loss_modulus'
+
+# ---------- measurements ----------
+def measurement_curve(df):
+    """
+    (log10 ω, log10 G', log10 G'') of a parsed measurement, sorted by ω with repeated ω averaged.
+    Column names are matched through rheo_parser.CANONICAL_COLUMNS (Japanese or English headers).
+    Uses angular_frequency [rad/s], or frequency [Hz] converted to ω = 2πf. Raises ValueError when
+    the columns are missing or fewer than MIN_POINTS positive rows remain.
+    """
+    columns = {}
+    for column in df.columns:
+        name = str(column).strip()
+        columns.setdefault(rheo_parser.CANONICAL_COLUMNS.get(name, name), column)
+
+    def values(name):
+        return pd.to_numeric(df[columns[name]], errors='coerce').to_numpy(dtype=float)
+
+    if OMEGA_COLUMN in columns:
+        omega = values(OMEGA_COLUMN)
+    elif FREQUENCY_COLUMN in columns:
+        omega = 2 * np.pi * values(FREQUENCY_COLUMN)
+    else:
+        raise ValueError("角周波数 (または周波数) の列がありません。")
+    if GP_COLUMN not in columns or GPP_COLUMN not in columns:
+        raise ValueError("貯蔵弾性率・損失弾性率の列がありません。")
+    gp = values(GP_COLUMN)
+    gpp = values(GPP_COLUMN)
+
+    valid = np.isfinite(omega) & np.isfinite(gp) & np.isfinite(gpp) & (omega > 0) & (gp > 0) & (gpp > 0)
+    log_omega, inverse = np.unique(np.log10(omega[valid]), return_inverse=True)
+    if log_omega.size < MIN_POINTS:
+        raise ValueError(f"G', G'' が正の値の周波数が {log_omega.size} 点しかありません。({MIN_POINTS} 点以上が必要です)")
+    counts = np.bincount(inverse)
+    log_gp = np.bincount(inverse, np.log10(gp[valid])) / counts
+    log_gpp = np.bincount(inverse, np.log10(gpp[valid])) / counts
+    return log_omega, log_gp, log_gpp
+
+def window_shape(span):
+    """(number of points, stride in units of STEP) of the window for a measured span of span decades."""
+    n_steps = int(np.floor(span / STEP + 1e-9))
+    stride = max(1, -(-n_steps // (MAX_POINTS - 1)))
+    return n_steps // stride + 1, stride
+
+# ---------- index ----------
+class InverseIndex:
+    """
+    Nearest-neighbour indexes of mean-removed log G'/Ge, log G''/Ge windows of a LookupTable.
+    One cKDTree is built per window shape on first use and kept for the next fits.
+    """
+
+    def __init__(self, table, shift_step=SHIFT_STEP, max_indexes=MAX_INDEXES):
+        self.shift_step = shift_step
+        self.step_ratio = int(round(STEP / shift_step))
+        self.log_z = np.asarray(table.log_z, dtype=float)
+        # ωτe 方向をずらし幅の間隔に補間し直した曲線 [Z, 点]
+        self.log_omega = np.arange(table.log_omega[0], table.log_omega[-1] + shift_step / 2, shift_step)
+        self.log_gp = np.array([np.interp(self.log_omega, table.log_omega, row) for row in table.log_gp])
+        self.log_gpp = np.array([np.interp(self.log_omega, table.log_omega, row) for row in table.log_gpp])
+        self.max_indexes = max_indexes
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, n_points, stride):
+        key = (n_points, stride)
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry is not None:
+                self._indexes.move_to_end(key)
+                return entry
+        # 窓 (Z, 開始位置) ごとに n_points 点を stride * step_ratio おきに取り出す
+        offsets = np.arange(n_points) * stride * self.step_ratio
+        starts = np.arange(self.log_omega.size - offsets[-1])
+        columns = starts[:, None] + offsets[None, :]
+        windows = np.concatenate([self.log_gp[:, columns], self.log_gpp[:, columns]], axis=2)
+        windows = windows.reshape(-1, 2 * n_points)
+        means = windows.mean(axis=1)
+        entry = (cKDTree(windows - means[:, None]), means, starts.size)
+        with self._lock:
+            self._indexes[key] = entry
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return entry
+
+    def fit(self, curves):
+        """
+        Fit Z, τe and Ge to each curve (log10 ω, log10 G', log10 G'') from measurement_curve.
+        Curves with the same window shape are queried together. Returns one dict per curve:
+        Z, tau_e [s], Ge (units of the measured moduli), residual (RMS of log10 G', G'' over the
+        window), the fitted ω range, and at_edge when the match lies on the edge of the table.
+        """
+        results = [None] * len(curves)
+        groups = {}
+        for i, (log_omega, log_gp, log_gpp) in enumerate(curves):
+            span = log_omega[-1] - log_omega[0]
+            n_points, stride = window_shape(span)
+            if n_points < MIN_POINTS:
+                results[i] = {'error': f"周波数範囲が狭すぎます ({span:.2f} decade)。"}
+                continue
+            # 測定範囲の中央に窓を置き、同じ間隔の点に補間する
+            width = (n_points - 1) * stride * STEP
+            grid = log_omega[0] + (span - width) / 2 + np.arange(n_points) * stride * STEP
+            values = np.concatenate([np.interp(grid, log_omega, log_gp), np.interp(grid, log_omega, log_gpp)])
+            groups.setdefault((n_points, stride), []).append((i, grid, values))
+
+        for (n_points, stride), members in groups.items():
+            tree, means, n_starts = self._index(n_points, stride)
+            values = np.array([values for _, _, values in members])
+            measured_means = values.mean(axis=1)
+            distance, nearest = tree.query(values - measured_means[:, None])
+            z_index, start = np.divmod(nearest, n_starts)
+            for (i, grid, _), d, zi, s, k, m in zip(members, distance, z_index, start, nearest, measured_means):
+                log_omega_tau = self.log_omega[s]
+                results[i] = {
+                    'Z': float(10.0**self.log_z[zi]),
+                    'tau_e': float(10.0**(log_omega_tau - grid[0])),
+                    'Ge': float(10.0**(m - means[k])),
+                    'residual': float(d / np.sqrt(2 * n_points)),
+                    'n_points': int(n_points),
+                    'omega_min': float(10.0**grid[0]),
+                    'omega_max': float(10.0**grid[-1]),
+                    'at_edge': bool(zi in (0, self.log_z.size - 1) or s in (0, n_starts - 1)),
+                }
+        return results
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# バックグラウンドジョブ (外部のブローカーを使わないローカル実装)
+# ジョブの状態と結果は SQLite の jobs テーブル (schema_jobs.sql) に保存し、実行はプロセス内のスレッドプールで行う。
+# 同じ cache_key (クエリと入力ファイルの内容ハッシュから作る) の完了済みジョブがあれば、実行せずにその結果を返す。
+# 複数のワーカープロセスで同じテーブルを使える:
+#   キャンセルは jobs.cancel_requested を通じて、ジョブを実行しているプロセスに伝わる
+#   各プロセスは自分の待機中・実行中のジョブの heartbeat_at を定期的に更新し、更新が途絶えたジョブ
+#   (プロセスが異常終了したもの) は失敗として扱う (再利用の対象や実行待ちの件数に含めない)
+
+# ---------- import library ----------
+import json
+import time
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# ジョブの状態
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+# heartbeat_at を更新する間隔と、更新が途絶えたジョブを中断されたとみなすまでの秒数
+HEARTBEAT_SECONDS = 10.0
+STALE_SECONDS = 60.0
+
+class JobCancelled(Exception):
+    """Raised inside a running job when its cancellation has been requested."""
+
+class QueueFull(Exception):
+    """Raised by submit() when too many jobs are already queued or running."""
+
+class JobQueue:
+    """
+    SQLite-backed job table plus a thread pool.
+    connect() must return a new sqlite3 connection (row_factory=sqlite3.Row) to the database
+    holding the jobs table. Handlers are registered per job kind and called as
+    handler(params, check_cancelled) -> JSON-serialisable result.
+    """
+
+    def __init__(self, connect, max_workers=2, max_pending=20, max_stored=1000,
+                 heartbeat_seconds=HEARTBEAT_SECONDS, stale_seconds=STALE_SECONDS):
+        self.connect = connect
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_stored = max_stored
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._handlers = {}
+        self._futures = {}
+        self._cancel_requested = set()
+        self._lock = threading.Lock()
+        # スレッドは最初のジョブ投入時に作られる
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._heartbeat_thread = None
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    # ----- submit / cancel -----
+    def submit(self, kind, params, cache_key=None):
+        """
+        Queue a job and return (job_id, reused). If a job with the same kind and cache_key is
+        already done, queued or running, its id is returned instead (reused=True).
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"未登録のジョブの種類です: {kind}")
+        with self._lock:
+            db = self.connect()
+            try:
+                self._expire_stale(db)
+                if cache_key is not None:
+                    existing = db.execute(
+                        'SELECT id FROM jobs WHERE kind = ? AND cache_key = ? AND status IN (?, ?, ?) '
+                        'AND cancel_requested = 0 ORDER BY rowid DESC LIMIT 1',
+                        (kind, cache_key, DONE, QUEUED, RUNNING)
+                    ).fetchone()
+                    if existing is not None:
+                        return existing['id'], True
+
+                # 同時に受け付けるジョブ数 (実行中 + 待機中) の上限
+                pending = db.execute(
+                    'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)
+                ).fetchone()[0]
+                if pending >= self.max_pending:
+                    raise QueueFull(f"実行待ちのジョブが上限 ({self.max_pending} 件) に達しています。")
+
+                job_id = uuid.uuid4().hex
+                db.execute(
+                    'INSERT INTO jobs (id, kind, params_json, cache_key, status, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (job_id, kind, json.dumps(params, ensure_ascii=False), cache_key, QUEUED, time.time())
+                )
+                self._prune(db)
+                db.commit()
+            finally:
+                db.close()
+            self._futures[job_id] = self._executor.submit(self._run, job_id)
+            self._start_heartbeat()
+        return job_id, False
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs are cancelled immediately; running jobs stop at their next
+        check_cancelled() call. Returns the job's status afterwards, or None if it does not exist.
+        """
+        with self._lock:
+            db = self.connect()
+            try:
+                row = db.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if row is None:
+                    return None
+                status = row['status']
+                if status == QUEUED:
+                    future = self._futures.get(job_id)
+                    if future is not None:
+                        future.cancel()
+                    self._finish(db, job_id, CANCELLED, error='実行前にキャンセルされました。')
+                    status = CANCELLED
+                elif status == RUNNING:
+                    self._cancel_requested.add(job_id)
+                    db.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job_id,))
+                    db.commit()
+                return status
+            finally:
+                db.close()
+
+    # ----- status -----
+    def get(self, job_id):
+        """Return the job as a dict (params and result decoded), or None."""
+        db = self.connect()
+        try:
+            self._expire_stale(db)
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job.pop('params_json'))
+        result_json = job.pop('result_json')
+        job['result'] = json.loads(result_json) if result_json is not None else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def recover(self):
+        # 前回のプロセスで終わらなかったジョブは実行を再開できないため、失敗として記録する
+        # (1プロセスで動かす場合の起動時用。複数プロセスでは heartbeat_at が古いものだけを _expire_stale で扱う)
+        db = self.connect()
+        try:
+            db.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE status IN (?, ?)',
+                (FAILED, 'サーバーの再起動により中断されました。', QUEUED, RUNNING)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def stats(self):
+        db = self.connect()
+        try:
+            self._expire_stale(db)
+            counts = dict(db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        finally:
+            db.close()
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'counts': {status: counts.get(status, 0) for status in (QUEUED, RUNNING) + FINISHED_STATUSES},
+        }
+
+    def _expire_stale(self, db):
+        # heartbeat_at の更新が途絶えた待機中・実行中のジョブ (異常終了したプロセスのもの) を失敗にする
+        expired = db.execute(
+            'UPDATE jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP '
+            'WHERE status IN (?, ?) AND COALESCE(heartbeat_at, 0) < ?',
+            (FAILED, 'ジョブを実行していたプロセスが応答しないため中断しました。', QUEUED, RUNNING,
+             time.time() - self.stale_seconds)
+        ).rowcount
+        if expired:
+            db.commit()
+
+    # ----- heartbeat -----
+    def _start_heartbeat(self):
+        # self._lock を持った状態で呼ぶ
+        if self._heartbeat_thread is None:
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+            self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            with self._lock:
+                job_ids = list(self._futures)
+            if not job_ids:
+                continue
+            try:
+                db = self.connect()
+                try:
+                    db.execute(
+                        f'UPDATE jobs SET heartbeat_at = ? WHERE id IN ({",".join("?" * len(job_ids))})',
+                        [time.time()] + job_ids
+                    )
+                    db.commit()
+                finally:
+                    db.close()
+            except Exception:
+                # データベースが一時的にロックされている場合などは次の間隔で更新する
+                traceback.print_exc()
+
+    # ----- worker -----
+    def _check_cancelled(self, job_id):
+        # 同じプロセスでのキャンセルは _cancel_requested、別のプロセスからのキャンセルは cancel_requested 列で分かる
+        # (ハンドラーが別のスレッドから呼んでもよいよう、毎回新しい接続で読む)
+        if job_id in self._cancel_requested:
+            raise JobCancelled()
+        db = self.connect()
+        try:
+            row = db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            db.close()
+        if row is None or row['cancel_requested']:
+            raise JobCancelled()
+
+    def _run(self, job_id):
+        db = self.connect()
+        try:
+            # キャンセル済みのジョブは開始しない
+            started = db.execute(
+                'UPDATE jobs SET status = ?, started_at = CURRENT_TIMESTAMP, heartbeat_at = ? WHERE id = ? AND status = ?',
+                (RUNNING, time.time(), job_id, QUEUED)
+            ).rowcount
+            db.commit()
+            if not started:
+                return
+            row = db.execute('SELECT kind, params_json FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            handler = self._handlers[row['kind']]
+            try:
+                result = handler(json.loads(row['params_json']), lambda: self._check_cancelled(job_id))
+            except JobCancelled:
+                self._finish(db, job_id, CANCELLED, error='実行中にキャンセルされました。')
+            except Exception as e:
+                print(f"ジョブ {job_id} の実行中にエラーが発生しました:")
+                traceback.print_exc()
+                self._finish(db, job_id, FAILED, error=f"{type(e).__name__}: {e}")
+            else:
+                self._finish(db, job_id, DONE, result=result)
+        finally:
+            db.close()
+            with self._lock:
+                self._futures.pop(job_id, None)
+                self._cancel_requested.discard(job_id)
+
+    def _finish(self, db, job_id, status, result=None, error=None):
+        db.execute(
+            'UPDATE jobs SET status = ?, result_json = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, job_id)
+        )
+        db.commit()
+
+    def _prune(self, db):
+        # 終了したジョブは新しいものから max_stored 件だけ残す
+        db.execute(
+            f'DELETE FROM jobs WHERE status IN ({",".join("?" * len(FINISHED_STATUSES))}) '
+            'AND rowid <= (SELECT rowid FROM jobs ORDER BY rowid DESC LIMIT 1 OFFSET ?)',
+            FINISHED_STATUSES + (self.max_stored,)
+        )
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# (Z, ωτe) グリッド上の G'/Ge, G''/Ge ルックアップテーブル
+# generate_data.py の出力 (learning_data_Z_1_to_100.csv またはZごとのシャードのフォルダ) から float32 のテーブルを作成し、
+# log(Z)-log(ωτe) 空間の双線形補間で予測する。グリッド点上では学習データと一致する。
+# 使い方: python lookup_table.py [入力CSV またはシャードのフォルダ] [出力npz]
+
+# ---------- import library ----------
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# ---------- default paths ----------
+SOURCE_CSV_PATH = os.path.join('generated_data', 'learning_data_Z_1_to_100.csv')
+TABLE_PATH = os.path.join('trained_models', 'gp_gpp_table.npz')
+
+# log10 を取る前の下限値 (0 や負の値による -inf を防ぐ)
+_VALUE_FLOOR = 1e-300
+
+# ---------- build / save / load ----------
+def build_table(df):
+    """
+    Build log10 G'/Ge, G''/Ge tables on the (Z, ωτe) grid from a generate_data.py DataFrame.
+    Every Z must share the same ωτe grid. Returns a dict of numpy arrays.
+    """
+    df = df.sort_values(['Z', 'omega_tau_e'])
+    z_grid = np.unique(df['Z'].to_numpy(dtype=float))
+    omega_grid = np.unique(df['omega_tau_e'].to_numpy(dtype=float))
+    if len(df) != z_grid.size * omega_grid.size:
+        raise ValueError("学習データが (Z, ωτe) の規則グリッドになっていません。")
+
+    shape = (z_grid.size, omega_grid.size)
+    gp = df['Gp_over_Ge'].to_numpy(dtype=float).reshape(shape)
+    gpp = df['Gpp_over_Ge'].to_numpy(dtype=float).reshape(shape)
+    return {
+        'log_z': np.log10(z_grid).astype(np.float32),
+        'log_omega': np.log10(omega_grid).astype(np.float32),
+        'log_gp': np.log10(np.maximum(gp, _VALUE_FLOOR)).astype(np.float32),
+        'log_gpp': np.log10(np.maximum(gpp, _VALUE_FLOOR)).astype(np.float32),
+    }
+
+def save_table(table, path=TABLE_PATH):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    np.savez_compressed(path, **table)
+
+def load_table(path=TABLE_PATH):
+    with np.load(path) as data:
+        return LookupTable(data['log_z'], data['log_omega'], data['log_gp'], data['log_gpp'])
+
+# ---------- interpolation ----------
+def _bracket(grid, values):
+    # values を挟むグリッドの左端インデックスと、区間内の重み (0..1) を返す
+    idx = np.clip(np.searchsorted(grid, values, side='right') - 1, 0, grid.size - 2)
+    left = grid[idx]
+    width = grid[idx + 1] - left
+    weight = np.clip((values - left) / width, 0.0, 1.0)
+    return idx, weight
+
+class LookupTable:
+    """Bilinear interpolation of log10 G'/Ge, G''/Ge over (log10 Z, log10 ωτe)."""
+
+    def __init__(self, log_z, log_omega, log_gp, log_gpp):
+        self.log_z = np.asarray(log_z, dtype=np.float64)
+        self.log_omega = np.asarray(log_omega, dtype=np.float64)
+        self.log_gp = np.asarray(log_gp, dtype=np.float32)
+        self.log_gpp = np.asarray(log_gpp, dtype=np.float32)
+        if self.log_z.size < 2 or self.log_omega.size < 2:
+            raise ValueError("ルックアップテーブルには各軸2点以上のグリッドが必要です。")
+
+    @property
+    def z_range(self):
+        return 10.0**self.log_z[0], 10.0**self.log_z[-1]
+
+    @property
+    def omega_range(self):
+        return 10.0**self.log_omega[0], 10.0**self.log_omega[-1]
+
+    def in_range(self, z_values, omega_values):
+        # テーブルの範囲内 (端点を含む) にある点のマスク
+        z = np.asarray(z_values, dtype=float)
+        omega = np.asarray(omega_values, dtype=float)
+        z_min, z_max = self.z_range
+        omega_min, omega_max = self.omega_range
+        # float32 で保存した端点の丸め誤差を許容する
+        tol = 1e-6
+        return ((z >= z_min * (1 - tol)) & (z <= z_max * (1 + tol)) &
+                (omega >= omega_min * (1 - tol)) & (omega <= omega_max * (1 + tol)))
+
+    def predict(self, z_values, omega_values):
+        """
+        Interpolate G'/Ge and G''/Ge for points inside the table.
+        Inputs are 1-D arrays of equal length; points outside the table are clamped to its edge,
+        so callers should check in_range() first.
+        """
+        z = np.asarray(z_values, dtype=float)
+        omega = np.asarray(omega_values, dtype=float)
+        iz, wz = _bracket(self.log_z, np.log10(np.maximum(z, _VALUE_FLOOR)))
+        iw, ww = _bracket(self.log_omega, np.log10(np.maximum(omega, _VALUE_FLOOR)))
+
+        def interp(table):
+            v00 = table[iz, iw]
+            v01 = table[iz, iw + 1]
+            v10 = table[iz + 1, iw]
+            v11 = table[iz + 1, iw + 1]
+            low = v00 + (v01 - v00) * ww
+            high = v10 + (v11 - v10) * ww
+            return 10.0**(low + (high - low) * wz)
+
+        return interp(self.log_gp), interp(self.log_gpp)
+
+# ===================== Main =====================
+if __name__ == "__main__":
+    source_path = sys.argv[1] if len(sys.argv) > 1 else SOURCE_CSV_PATH
+    output_path = sys.argv[2] if len(sys.argv) > 2 else TABLE_PATH
+
+    if not os.path.exists(source_path):
+        print(f"エラー: 学習データが見つかりません。'{source_path}' を generate_data.py で生成してください。")
+        sys.exit(1)
+
+    if os.path.isdir(source_path):
+        # generate_data.py のシャード (Zごとの .npz) から直接作る
+        import generate_data
+        df = generate_data.load_shards(source_path)
+    else:
+        df = pd.read_csv(source_path)
+    table = build_table(df)
+    save_table(table, output_path)
+    print(f"ルックアップテーブルを '{output_path}' に保存しました。"
+          f" (Z: {table['log_z'].size}点, ωτe: {table['log_omega'].size}点)")
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# アップロードされた測定ファイルの解析結果キャッシュ
+# 各ファイルはアップロード時に一度だけ解析し、列ごとの配列を .npz (サイドカー) に保存する。
+# 分析時はサイドカーを読み込み、元ファイルの更新日時やサイズが変わった場合だけ再解析する。
+
+# ---------- import library ----------
+import os
+import json
+import hashlib
+import uuid
+import numpy as np
+import pandas as pd
+import rheo_parser
+
+# サイドカーの保存先フォルダ
+PARSED_FOLDER = 'parsed'
+
+# サイドカー内で列名の一覧と df.attrs (メタデータ・単位) を保存するキー
+_COLUMNS_KEY = '__columns__'
+_ATTRS_KEY = '__attrs__'
+
+# rheo_parser.sniff_encoding の結果を pandas の encoding 名に変換
+_PANDAS_ENCODINGS = {
+    'utf-16-le-bom': 'utf-16',
+    'utf-16-be-bom': 'utf-16',
+}
+
+class UnsupportedFileFormat(ValueError):
+    """Raised for files whose extension the parser does not handle."""
+
+# ---------- parsing ----------
+def parse_measurement_file(file_path):
+    # ファイルの拡張子に基づいて読み込み方法を判断
+    if file_path.endswith('.xlsx'):
+        return pd.read_excel(file_path)
+    if file_path.endswith(('.csv', '.txt')):
+        # 文字コードはBOM等から一度だけ判定し、装置のエクスポート形式なら専用パーサーで読む
+        # (サイドカーと要約統計には列全体が必要なため、インターバルごとに読んだ配列を1つの DataFrame にまとめる)
+        encoding = rheo_parser.sniff_encoding(file_path)
+        if rheo_parser.is_rheo_export(file_path, encoding):
+            return rheo_parser.to_dataframe(rheo_parser.read_rheo_file(file_path))
+        return pd.read_csv(file_path, encoding=_PANDAS_ENCODINGS.get(encoding, encoding))
+    raise UnsupportedFileFormat(f"未対応のファイル形式: {file_path}")
+
+# ---------- sidecar (.npz) ----------
+def file_signature(file_path):
+    # 再解析の要否を判断するための (更新日時, サイズ)
+    stat = os.stat(file_path)
+    return stat.st_mtime, stat.st_size
+
+def sidecar_path_for(file_path, parsed_folder=PARSED_FOLDER):
+    # 同名ファイルが別フォルダにあっても衝突しないよう、絶対パスのハッシュをファイル名にする
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(parsed_folder, f'{key}.npz')
+
+def write_sidecar(df, sidecar_path):
+    directory = os.path.dirname(sidecar_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    arrays = {
+        _COLUMNS_KEY: np.array([str(c) for c in df.columns]),
+        _ATTRS_KEY: np.array(json.dumps(df.attrs, ensure_ascii=False, default=str)),
+    }
+    for i, column in enumerate(df.columns):
+        values = df[column].to_numpy()
+        if not (np.issubdtype(values.dtype, np.number) or values.dtype == bool):
+            # 文字列などの列は pickle を使わずに保存できるよう固定長文字列に変換
+            values = df[column].astype(str).to_numpy(dtype=str)
+        arrays[f'col_{i}'] = values
+    # 書き込み途中のファイルを読まれないよう、一時ファイルに保存してから置き換える
+    # (同じファイルを複数のスレッドが同時に解析しても衝突しないよう、一時ファイル名は毎回変える)
+    tmp_path = f'{sidecar_path}.{uuid.uuid4().hex}.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, sidecar_path)
+
+def read_sidecar(sidecar_path, columns=None):
+    """Load a sidecar as a DataFrame. When columns (a set of names) is given, other columns are not read."""
+    with np.load(sidecar_path, allow_pickle=False) as data:
+        names = data[_COLUMNS_KEY].tolist()
+        # npz は列ごとに別の配列として保存されているため、必要な列だけ読み込める
+        selected = [(i, name) for i, name in enumerate(names) if columns is None or name in columns]
+        df = pd.DataFrame({name: data[f'col_{i}'] for i, name in selected}, columns=[name for _, name in selected])
+        if _ATTRS_KEY in data:
+            df.attrs.update(json.loads(data[_ATTRS_KEY].item()))
+        return df
+
+# ---------- cached loading ----------
+def parse_to_sidecar(file_path, parsed_folder=PARSED_FOLDER):
+    """
+    Parse file_path once and store the result as a columnar sidecar.
+    Returns (df, record) where record holds the parsed_path / parsed_mtime / parsed_size
+    values to store on the experiments row.
+    """
+    mtime, size = file_signature(file_path)
+    df = parse_measurement_file(file_path)
+    sidecar_path = sidecar_path_for(file_path, parsed_folder)
+    write_sidecar(df, sidecar_path)
+    record = {'parsed_path': sidecar_path, 'parsed_mtime': mtime, 'parsed_size': size}
+    return df, record
+
+def load_measurement(file_path, parsed_path=None, parsed_mtime=None, parsed_size=None,
+                     parsed_folder=PARSED_FOLDER):
+    """
+    Load a measurement file through its sidecar.
+    Returns (df, record); record is None when the stored sidecar was still valid, otherwise it
+    holds the new sidecar information that the caller should write back to the database.
+    """
+    if parsed_path and os.path.exists(parsed_path):
+        mtime, size = file_signature(file_path)
+        if mtime == parsed_mtime and size == parsed_size:
+            return read_sidecar(parsed_path), None
+    return parse_to_sidecar(file_path, parsed_folder)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# アップロードした測定データの中身による横断検索
+# 例: 「せん断速度 90〜110 1/s・温度 19〜21 ℃ の点で、粘度が 80 mPa·s を超えた測定」
+# 条件は測定列ごとの範囲 (min 以上 max 以下) で、同じ行 (測定点) ですべての条件を満たす点があるファイルを返す。
+#   1. ゾーンマップ (measurement_zones: ファイル・列ごとの最小値・最大値) で、範囲が重ならないファイルを SQL で除外する
+#   2. 残ったファイルだけ、サイドカー (.npz) から条件と出力に使う列だけを読み、NumPy の比較で一致する行を求める
+# 列名は rheo_parser.CANONICAL_COLUMNS で正規化した名前 (shear_rate など) か、ファイルの列名で指定する。
+# 値は各ファイルの単位のまま比較する (結果に各列の単位を付けて返す)。
+
+# ---------- import library ----------
+import math
+import numpy as np
+import pandas as pd
+
+import rheo_parser
+
+INTERVAL_COLUMN = 'インターバル'
+
+def canonical_name(name):
+    name = str(name).strip()
+    return rheo_parser.CANONICAL_COLUMNS.get(name, name)
+
+def raw_names(canonical_names):
+    """All file column names (Japanese, English or canonical) that normalize to one of canonical_names."""
+    names = set(canonical_names)
+    names.update(raw for raw, canonical in rheo_parser.CANONICAL_COLUMNS.items() if canonical in names)
+    return names
+
+# ---------- predicates ----------
+def parse_predicates(where):
+    """
+    Range predicates from {column: {"min": a, "max": b}} or {column: [a, b]} (either bound may be
+    omitted or null). Returns [(canonical column, low, high)]; raises ValueError for invalid input.
+    """
+    if not isinstance(where, dict) or not where:
+        raise ValueError("'where' に {列名: {\"min\": 値, \"max\": 値}} の形式で1つ以上の条件を指定してください。")
+    predicates = {}
+    for column, bounds in where.items():
+        if isinstance(bounds, dict):
+            unknown = set(bounds) - {'min', 'max'}
+            if unknown:
+                raise ValueError(f"'{column}' の条件には min と max だけを指定できます。({', '.join(sorted(unknown))})")
+            low, high = bounds.get('min'), bounds.get('max')
+        elif isinstance(bounds, list) and len(bounds) == 2:
+            low, high = bounds
+        else:
+            raise ValueError(f"'{column}' の条件は {{\"min\": 値, \"max\": 値}} または [min, max] で指定してください。")
+        for value in (low, high):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                      or not math.isfinite(value)):
+                raise ValueError(f"'{column}' の min, max には有限の数値か null を指定してください。")
+        low = -math.inf if low is None else float(low)
+        high = math.inf if high is None else float(high)
+        if low > high:
+            raise ValueError(f"'{column}' の min が max より大きくなっています。")
+        name = canonical_name(column)
+        # 同じ列の条件が重複した場合は範囲の共通部分にする
+        if name in predicates:
+            low, high = max(low, predicates[name][0]), min(high, predicates[name][1])
+        predicates[name] = (low, high)
+    return [(name, low, high) for name, (low, high) in predicates.items()]
+
+# ---------- zone maps ----------
+def zone_rows(summary):
+    """(column, min, max, count) per numeric column of a summary_stats summary, with normalized names."""
+    zones = {}
+    for column, stats in summary['columns'].items():
+        if stats['min'] is None or column == INTERVAL_COLUMN:
+            continue
+        name = canonical_name(column)
+        low, high, count = stats['min'], stats['max'], stats['count']
+        if name in zones:
+            low, high, count = min(low, zones[name][0]), max(high, zones[name][1]), count + zones[name][2]
+        zones[name] = (low, high, count)
+    return [(name, low, high, count) for name, (low, high, count) in zones.items()]
+
+def pushdown_clause(predicates):
+    """
+    SQL condition (and parameters) on experiments that keeps only rows whose zone map overlaps every predicate.
+    Experiments without a summary yet (summary_json IS NULL) have no zone map and are kept for scanning.
+    """
+    clauses, params = [], []
+    for name, low, high in predicates:
+        # 片側だけの条件では、もう一方の比較を省く
+        condition = ['column_name = ?']
+        params.append(name)
+        if low > -math.inf:
+            condition.append('max_value >= ?')
+            params.append(low)
+        if high < math.inf:
+            condition.append('min_value <= ?')
+            params.append(high)
+        clauses.append(f"id IN (SELECT experiment_id FROM measurement_zones WHERE {' AND '.join(condition)})")
+    return f"(summary_json IS NULL OR ({' AND '.join(clauses)}))", params
+
+# ---------- scan ----------
+def scan_frame(df, predicates, columns=(), max_rows=20):
+    """
+    Evaluate the predicates on every row of a parsed measurement with vectorized comparisons.
+    Returns {'n_rows', 'matched_rows', 'rows': {column: values of the first max_rows matches}, 'units'}.
+    The returned columns are the predicate columns followed by columns (file names of the columns).
+    """
+    by_name = {}
+    for column in df.columns:
+        by_name.setdefault(canonical_name(column), column)
+    mask = np.ones(len(df), dtype=bool)
+    for name, low, high in predicates:
+        column = by_name.get(name)
+        if column is None:
+            mask[:] = False
+            break
+        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+        # NaN は比較がすべて False になるため一致しない
+        mask &= (values >= low) & (values <= high)
+
+    rows = {}
+    units = df.attrs.get('units', {})
+    matched = np.flatnonzero(mask)[:max_rows]
+    output = [by_name[name] for name, _, _ in predicates if name in by_name]
+    output += [by_name[name] for name in map(canonical_name, columns) if name in by_name]
+    if INTERVAL_COLUMN in df.columns:
+        output.insert(0, INTERVAL_COLUMN)
+    for column in dict.fromkeys(output):
+        values = df[column].to_numpy()[matched]
+        if np.issubdtype(values.dtype, np.number):
+            values = [None if isinstance(v, float) and not math.isfinite(v) else v for v in values.tolist()]
+        else:
+            values = [str(v) for v in values]
+        rows[str(column)] = values
+    return {
+        'n_rows': int(len(df)),
+        'matched_rows': int(mask.sum()),
+        'rows': rows,
+        'units': {str(column): units[column] for column in rows if column in units},
+    }
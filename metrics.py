@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# リクエストの計測と Prometheus のテキスト形式での出力 (外部ライブラリを使わない最小限の実装)
+# カウンタ (inc) とヒストグラム (observe / span) をラベルの組ごとにメモリ上で集計し、render() で /metrics 用の文字列にする。
+# 値はプロセスごとに持つため、複数のワーカープロセスで動かす場合は各プロセスを個別に収集する。
+# enabled=False のときは inc / observe は何もせず、span は共有の空のコンテキストを返す。
+
+# ---------- import library ----------
+import math
+import time
+import bisect
+import threading
+import contextlib
+
+# レイテンシ用のヒストグラムの区切り (秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+_NULL_SPAN = contextlib.nullcontext()
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+class _Span:
+    """Context manager that observes its elapsed wall time into a histogram."""
+
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+class Metrics:
+    """
+    Thread-safe counters and histograms keyed by (name, labels).
+    Collectors registered with add_collector are called at render time and return
+    (name, kind, help, [(labels, value), ...]) tuples for values owned by other objects.
+    """
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        # le は「以下」なので、value と等しい区切りのバケットに入れる
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # 区切りごとの件数 (最後は +Inf), 合計, 件数
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def span(self, name, **labels):
+        """Time a with-block into the histogram name (e.g. one phase of a request)."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """Copy of the counters and histograms: ({(name, labels): value}, {(name, labels): [buckets, sum, count]})."""
+        with self._lock:
+            return (dict(self._counters),
+                    {key: [list(h[0]), h[1], h[2]] for key, h in self._histograms.items()})
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        counters, histograms = self.snapshot()
+        families = {}
+        for (name, key), value in counters.items():
+            families.setdefault((name, COUNTER), []).append((key, value))
+        for (name, key), value in histograms.items():
+            families.setdefault((name, HISTOGRAM), []).append((key, value))
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                self._help.setdefault(name, help_text)
+                families.setdefault((name, kind), []).extend(
+                    (_label_key(labels), value) for labels, value in samples)
+
+        lines = []
+        for (name, kind), samples in sorted(families.items()):
+            if name in self._help:
+                lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(samples, key=lambda sample: sample[0]):
+                if kind != HISTOGRAM:
+                    lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_format_labels(key, [("le", _format_value(float(bound)))])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(key)} {_format_value(float(total))}')
+                lines.append(f'{name}_count{_format_labels(key)} {count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# バージョン付きのモデル置き場と、無停止で切り替えるモデルレジストリ
+# run.py は訓練したモデルを trained_models/versions/<バージョン>/ に保存し (manifest.json に評価指標と内容のハッシュ)、
+# trained_models/versions/CURRENT に有効なバージョン名を書く。
+# アプリ (ModelRegistry) は CURRENT の変更を定期的に確認し、新しいバージョンを別スレッドで読み込み・ウォームアップしてから
+# 参照を1回の代入で差し替える。実行中のリクエストは取得済みの古いバージョンでそのまま完了する。
+# 使い方: python model_registry.py [list | activate <バージョン>] [--root trained_models]
+
+# ---------- import library ----------
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import numpy as np
+
+import compiled_model
+
+VERSIONS_DIR = 'versions'
+CURRENT_NAME = 'CURRENT'
+MANIFEST_NAME = 'manifest.json'
+MODEL_FILES = ('lgbm_gp_model.pkl', 'lgbm_gpp_model.pkl', 'scaler.pkl')
+
+# ---------- versions on disk ----------
+def versions_dir(root):
+    return os.path.join(root, VERSIONS_DIR)
+
+def read_current(root):
+    """Name of the active version written by activate(), or None."""
+    try:
+        with open(os.path.join(versions_dir(root), CURRENT_NAME), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def activate(root, version):
+    # 他のワーカーが途中まで書かれたファイルを読まないよう、一時ファイルに書いてから置き換える
+    if not os.path.exists(os.path.join(versions_dir(root), version, MANIFEST_NAME)):
+        raise ValueError(f"モデルのバージョンが見つかりません: {version}")
+    path = os.path.join(versions_dir(root), CURRENT_NAME)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, path)
+
+def read_manifest(root, version):
+    with open(os.path.join(versions_dir(root), version, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+def list_versions(root):
+    """Manifests of all saved versions, oldest first."""
+    directory = versions_dir(root)
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.exists(os.path.join(directory, name, MANIFEST_NAME)):
+            manifests.append(read_manifest(root, name))
+    return manifests
+
+def create_version(root, models, scaler, metrics, info=None):
+    """
+    Save models ({'gp': model, 'gpp': model}), the scaler and the compiled model as a new version
+    directory with a manifest (metrics, content hash, extra info). The directory is written under a
+    temporary name and renamed at the end. Returns the version name; it is not activated.
+    """
+    import joblib  # lightgbm / scikit-learn のオブジェクトを保存するのは run.py 側だけ
+    directory = versions_dir(root)
+    tmp_path = os.path.join(directory, f'.tmp-{os.getpid()}-{time.time_ns()}')
+    os.makedirs(tmp_path)
+    try:
+        paths = [os.path.join(tmp_path, name) for name in MODEL_FILES]
+        # 早期終了したモデルは best_iteration までの木で予測する (Booster.predict の既定)
+        joblib.dump(models['gp'], paths[0])
+        joblib.dump(models['gpp'], paths[1])
+        joblib.dump(scaler, paths[2])
+        content_hash = compiled_model.files_version(paths)
+        compiled_model.export_models(models, scaler, os.path.join(tmp_path, compiled_model.COMPILED_MODEL_NAME),
+                                     content_hash)
+        version = time.strftime('%Y%m%d-%H%M%S') + '-' + content_hash[:8]
+        manifest = {
+            'version': version,
+            'content_hash': content_hash,
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'files': list(MODEL_FILES) + [compiled_model.COMPILED_MODEL_NAME],
+            'metrics': metrics,
+        }
+        manifest.update(info or {})
+        with open(os.path.join(tmp_path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, os.path.join(directory, version))
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return version
+
+# ---------- loaded versions ----------
+class ModelVersion:
+    """One model version: its name, directory, manifest and (once loaded) the predictor."""
+
+    def __init__(self, name, path, content_hash, manifest=None):
+        self.name = name
+        self.path = path
+        self.content_hash = content_hash
+        self.manifest = manifest
+        self.predictor = None
+        self.loaded_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_registry(cls, root, version):
+        manifest = read_manifest(root, version)
+        return cls(version, os.path.join(versions_dir(root), version), manifest['content_hash'], manifest)
+
+    @classmethod
+    def from_legacy(cls, root):
+        # versions/ ができる前の trained_models/*.pkl (バージョン名は内容のハッシュ)
+        content_hash = compiled_model.files_version([os.path.join(root, name) for name in MODEL_FILES])
+        return cls(f'legacy-{content_hash[:8]}', root, content_hash)
+
+    def load(self):
+        """
+        Load the predictor once: the compiled model if it was built from these pkl files, otherwise
+        the pkl files. For registry versions the pkl contents must match the manifest's content hash.
+        """
+        with self._lock:
+            if self.predictor is not None:
+                return self.predictor
+            paths = [os.path.join(self.path, name) for name in MODEL_FILES]
+            if self.manifest is not None and compiled_model.files_version(paths) != self.content_hash:
+                raise ValueError(f"モデルファイルの内容が manifest のハッシュと一致しません: {self.name}")
+            predictor = None
+            compiled_path = os.path.join(self.path, compiled_model.COMPILED_MODEL_NAME)
+            if os.path.exists(compiled_path):
+                compiled = compiled_model.CompiledModel(compiled_path)
+                if compiled.format == compiled_model.FORMAT_VERSION and compiled.source_version == self.content_hash:
+                    predictor = compiled
+                else:
+                    print(f"コンパイル済みモデルが古い形式か、現在のモデルファイルと一致しないため、pkl ファイルを使います。"
+                          f"'python compiled_model.py {self.path}' で作り直してください。")
+            if predictor is None:
+                predictor = compiled_model.PickledModel(*paths)
+            self.predictor = predictor
+            self.loaded_at = time.strftime('%Y-%m-%d %H:%M:%S')
+            print(f"モデル {self.name} を読み込みました。({type(predictor).__name__})")
+            return predictor
+
+    def summary(self):
+        return {
+            'version': self.name,
+            'content_hash': self.content_hash,
+            'loaded': self.predictor is not None,
+            'loaded_at': self.loaded_at,
+            'metrics': (self.manifest or {}).get('metrics'),
+        }
+
+# ウォームアップ用の入力 (学習データの範囲の Z × ωτe)
+def warmup_batch():
+    z = np.arange(1.0, 101.0, 3.0)
+    omega = np.geomspace(1e-12, 1e1, 27)
+    return np.column_stack([np.repeat(z, omega.size), np.tile(omega, z.size)])
+
+class ModelRegistry:
+    """
+    Holds the active ModelVersion. active() never blocks on another version's load: a new version
+    is loaded and warmed up on a background thread, then swapped in with one assignment.
+    CURRENT is re-read at most every poll_interval seconds, so every worker process follows run.py.
+    """
+
+    def __init__(self, root, poll_interval=5.0):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._active = None
+        self._loading = None
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        self.last_error = None
+        self.swaps = 0
+        self._active = self._resolve(read_current(root))
+
+    def _resolve(self, version):
+        # 起動時は manifest を読むだけで、モデル本体は最初の予測時に読み込む (ModelVersion.load)
+        if version is not None:
+            try:
+                return ModelVersion.from_registry(self.root, version)
+            except (OSError, ValueError, KeyError) as e:
+                self.last_error = f"{version}: {e}"
+                print(f"モデル {version} の manifest を読み込めませんでした: {e}")
+        if all(os.path.exists(os.path.join(self.root, name)) for name in MODEL_FILES):
+            return ModelVersion.from_legacy(self.root)
+        return None
+
+    def active(self):
+        """The active ModelVersion (or None). Starts a background reload if CURRENT has changed."""
+        now = time.monotonic()
+        if self.poll_interval is not None and now - self._last_poll >= self.poll_interval:
+            self._last_poll = now
+            current = read_current(self.root)
+            active = self._active
+            if current is not None and (active is None or current != active.name):
+                self.reload(current)
+        return self._active
+
+    def reload(self, version=None, wait=False):
+        """
+        Load version (default: the one in CURRENT) in the background, warm it up and swap it in.
+        Returns False if that version is already active or being loaded.
+        """
+        with self._lock:
+            if version is None:
+                version = read_current(self.root)
+            if version is None or (self._active is not None and self._active.name == version) or \
+               self._loading == version:
+                return False
+            self._loading = version
+        thread = threading.Thread(target=self._load_and_swap, args=(version,), daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def _load_and_swap(self, version):
+        try:
+            candidate = ModelVersion.from_registry(self.root, version)
+            predictor = candidate.load()
+            gp, gpp = predictor.predict(warmup_batch())
+            if not (np.all(np.isfinite(gp)) and np.all(np.isfinite(gpp))):
+                raise ValueError("ウォームアップの予測に有限でない値が含まれています。")
+            # 参照の差し替えは1回の代入なので、読み込み中のリクエストは古いバージョンのまま完了する
+            self._active = candidate
+            self.swaps += 1
+            self.last_error = None
+            print(f"モデルをバージョン {version} に切り替えました。")
+        except Exception as e:
+            self.last_error = f"{version}: {e}"
+            print(f"モデル {version} の読み込みに失敗しました。現在のバージョンを使い続けます: {e}")
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def status(self):
+        active = self._active
+        return {
+            'active': active.summary() if active is not None else None,
+            'current': read_current(self.root),
+            'loading': self._loading,
+            'last_error': self.last_error,
+            'swaps': self.swaps,
+        }
+
+# ===================== Main =====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="保存済みモデルのバージョンの一覧表示・切り替え")
+    parser.add_argument('command', nargs='?', default='list', choices=('list', 'activate'))
+    parser.add_argument('version', nargs='?')
+    parser.add_argument('--root', default='trained_models')
+    args = parser.parse_args()
+
+    if args.command == 'activate':
+        if not args.version:
+            print("エラー: 有効にするバージョンを指定してください。")
+            sys.exit(1)
+        try:
+            activate(args.root, args.version)
+        except ValueError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        print(f"バージョン {args.version} を有効にしました。起動中のアプリは数秒以内に切り替わります。")
+    else:
+        current = read_current(args.root)
+        for manifest in list_versions(args.root):
+            mark = '*' if manifest['version'] == current else ' '
+            metrics = ', '.join(f"{target}: R2 {m['r2']:.4f} RMSE {m['rmse']:.3e}"
+                                for target, m in manifest.get('metrics', {}).items())
+            print(f"{mark} {manifest['version']}  {manifest['created_at']}  {metrics}")
+        if current is None:
+            print("有効なバージョンはありません。(trained_models/*.pkl を使います)")
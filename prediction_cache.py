@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# サロゲートモデル予測のメモ化キャッシュ
+# キーは (モデルバージョン, 量子化した Z, 量子化した ωτe)。プロセス内はLRUで件数上限を持ち、
+# 重複を除いたキーが max_batch_keys を超える大きなバッチはキャッシュを通さない。
+# 任意でSQLiteファイルの共有ディスク層を使うと、複数のワーカープロセス間で結果を再利用できる。
+
+# ---------- import library ----------
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# 1エントリあたりのおおよそのメモリ量 (キーのタプル + 値のタプル + OrderedDictのノード)
+_APPROX_ENTRY_BYTES = 360
+
+# ディスク層への1クエリあたりのキー数 (SQLiteのパラメータ数上限を超えないように分割)
+_DISK_QUERY_CHUNK = 400
+
+# ---------- quantization ----------
+def quantize(values, mantissa_bits=40):
+    """
+    Round values to `mantissa_bits` bits of relative precision so that inputs differing only
+    by float noise share a cache key.
+    """
+    values = np.asarray(values, dtype=float)
+    mantissa, exponent = np.frexp(values)
+    scale = 2.0**mantissa_bits
+    return np.ldexp(np.round(mantissa * scale) / scale, exponent)
+
+# ---------- cache ----------
+class PredictionCache:
+    """LRU cache of (G'/Ge, G''/Ge) predictions with an optional shared SQLite tier."""
+
+    def __init__(self, max_entries=200_000, max_bytes=None, disk_path=None, disk_max_entries=5_000_000,
+                 mantissa_bits=40, max_batch_keys=10_000):
+        # max_bytes を指定した場合は、おおよそのメモリ量から件数上限に換算して小さい方を使う
+        if max_bytes is not None:
+            max_entries = min(max_entries, max_bytes // _APPROX_ENTRY_BYTES)
+        self.max_entries = int(max_entries)
+        self.disk_path = disk_path
+        self.disk_max_entries = int(disk_max_entries)
+        self.mantissa_bits = mantissa_bits
+        self.max_batch_keys = int(max_batch_keys)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_writes = 0
+        self.bypassed = 0
+        if disk_path:
+            self._open_disk(disk_path)
+
+    # ----- disk tier -----
+    def _open_disk(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WALモードにして、他のワーカープロセスの読み書きと互いにブロックしないようにする
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS predictions (
+                model_version TEXT NOT NULL,
+                z REAL NOT NULL,
+                omega_tau_e REAL NOT NULL,
+                gp_over_ge REAL NOT NULL,
+                gpp_over_ge REAL NOT NULL,
+                PRIMARY KEY (model_version, z, omega_tau_e)
+            )
+        ''')
+        db.commit()
+        self._disk = db
+
+    def _disk_lookup(self, model_version, keys):
+        found = {}
+        with self._disk_lock:
+            for start in range(0, len(keys), _DISK_QUERY_CHUNK):
+                chunk = keys[start:start + _DISK_QUERY_CHUNK]
+                placeholders = ','.join(['(?, ?)'] * len(chunk))
+                params = [v for key in chunk for v in key]
+                rows = self._disk.execute(
+                    f'SELECT z, omega_tau_e, gp_over_ge, gpp_over_ge FROM predictions '
+                    f'WHERE model_version = ? AND (z, omega_tau_e) IN (VALUES {placeholders})',
+                    [model_version] + params,
+                ).fetchall()
+                for z, omega, gp, gpp in rows:
+                    found[(z, omega)] = (gp, gpp)
+        return found
+
+    def _disk_store(self, model_version, items):
+        with self._disk_lock:
+            self._disk.executemany(
+                'INSERT OR IGNORE INTO predictions (model_version, z, omega_tau_e, gp_over_ge, gpp_over_ge) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(model_version, z, omega, gp, gpp) for (z, omega), (gp, gpp) in items],
+            )
+            # 上限を超えたら古いものから削除 (行は常に古い順に消すので rowid の幅を件数とみなせる)
+            min_rowid, max_rowid = self._disk.execute('SELECT MIN(rowid), MAX(rowid) FROM predictions').fetchone()
+            if max_rowid is not None and max_rowid - min_rowid + 1 > self.disk_max_entries:
+                self._disk.execute(
+                    'DELETE FROM predictions WHERE rowid <= ?',
+                    (max_rowid - self.disk_max_entries,),
+                )
+            self._disk.commit()
+            self.disk_writes += len(items)
+
+    # ----- memory tier -----
+    def _store(self, model_version, items):
+        with self._lock:
+            for key, value in items:
+                full_key = (model_version,) + key
+                self._entries[full_key] = value
+                self._entries.move_to_end(full_key)
+            overflow = len(self._entries) - self.max_entries
+            for _ in range(max(overflow, 0)):
+                self._entries.popitem(last=False)
+            self.evictions += max(overflow, 0)
+
+    def get_or_compute(self, model_version, z_values, omega_values, compute):
+        """
+        Return (gp, gpp) arrays for the given points, calling compute(z, omega) only for
+        cache misses. compute receives the quantized inputs of each distinct missing key once.
+        Batches with more than max_batch_keys distinct keys bypass the cache and are computed directly.
+        """
+        z = quantize(z_values, self.mantissa_bits)
+        omega = quantize(omega_values, self.mantissa_bits)
+        # (Z, ωτe) の組を1つの複素数にまとめて np.unique で重複を除き、以降はユニークなキーごとに処理する
+        pairs = np.empty(z.size, dtype=complex)
+        pairs.real = z
+        pairs.imag = omega
+        unique, inverse = np.unique(pairs, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        predicted_gp = np.empty(unique.size)
+        predicted_gpp = np.empty(unique.size)
+
+        # 大きなスイープは Python でのキーの照合がモデルの計算より遅く、LRU 全体も追い出してしまうため、
+        # キャッシュを通さずにまとめて計算する
+        if unique.size > self.max_batch_keys:
+            predicted_gp[:], predicted_gpp[:] = compute(unique.real, unique.imag)
+            with self._lock:
+                self.bypassed += z.size
+            return predicted_gp[inverse], predicted_gpp[inverse]
+
+        keys = list(zip(unique.real.tolist(), unique.imag.tolist()))
+        rows_per_key = np.bincount(inverse, minlength=unique.size)
+
+        # 1) プロセス内のLRU
+        missing = []  # 見つからなかったキーの unique 内の番号
+        with self._lock:
+            for i, key in enumerate(keys):
+                full_key = (model_version,) + key
+                value = self._entries.get(full_key)
+                if value is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(full_key)
+                    predicted_gp[i], predicted_gpp[i] = value
+            self.hits += z.size - int(rows_per_key[missing].sum())
+
+        # 2) 共有ディスク層
+        if missing and self._disk is not None:
+            found = self._disk_lookup(model_version, [keys[i] for i in missing])
+            still_missing = []
+            disk_hits = 0
+            for i in missing:
+                value = found.get(keys[i])
+                if value is None:
+                    still_missing.append(i)
+                else:
+                    predicted_gp[i], predicted_gpp[i] = value
+                    disk_hits += int(rows_per_key[i])
+            missing = still_missing
+            with self._lock:
+                self.disk_hits += disk_hits
+            self._store(model_version, found.items())
+
+        # 3) 残りをまとめてモデルで計算
+        if missing:
+            index = np.array(missing)
+            computed_gp, computed_gpp = compute(unique.real[index], unique.imag[index])
+            predicted_gp[index] = computed_gp
+            predicted_gpp[index] = computed_gpp
+            items = list(zip([keys[i] for i in missing], zip(np.asarray(computed_gp).tolist(),
+                                                            np.asarray(computed_gpp).tolist())))
+            with self._lock:
+                self.misses += int(rows_per_key[index].sum())
+            self._store(model_version, items)
+            if self._disk is not None:
+                self._disk_store(model_version, items)
+
+        return predicted_gp[inverse], predicted_gpp[inverse]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'approx_bytes': entries * _APPROX_ENTRY_BYTES,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': ((self.hits + self.disk_hits) / lookups) if lookups else 0.0,
+                'disk_enabled': self._disk is not None,
+                'disk_hits': self.disk_hits,
+                'disk_writes': self.disk_writes,
+                'max_batch_keys': self.max_batch_keys,
+                'bypassed': self.bypassed,
+            }
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# 遅いリクエストの原因を調べるための、リクエスト単位のプロファイラー (有効にした場合だけ動く)
+# 記録方法は2種類:
+#   サンプリング: 別スレッドが一定間隔で対象のリクエストを処理しているスレッドのスタックを取り、同じスタックの回数を数える。
+#     処理への影響が小さいため全リクエストに掛けておき、処理時間がしきい値を超えたものだけ保存できる。
+#   決定的 (cProfile): 明示的に要求されたリクエストだけに使い、全関数の呼び出し回数と時間を .prof (pstats) に保存する。
+# 1件の記録は拡張子だけが違う次のファイルになる:
+#   .json      リクエストの情報 (ルート・ステータス・処理時間など) とサンプル数の多い関数
+#   .collapsed 「関数;関数;...;関数 サンプル数」の行 (flamegraph.pl や speedscope でフレームグラフにできる)
+#   .prof      決定的な記録の場合のみ (python -m pstats や snakeviz で開ける)
+# 保存数が max_captures を超えたら古いものから削除する。
+
+# ---------- import library ----------
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import cProfile
+import threading
+from collections import Counter
+
+EXTENSIONS = ('.json', '.collapsed', '.prof')
+# 一覧に表示する関数の数
+TOP_FUNCTIONS = 20
+_NAME_PATTERN = re.compile(r'^[0-9A-Za-z_-]+$')
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+def collapse(frame):
+    """The stack of frame as 'outermost;...;innermost' (the collapsed-stack format of flame graphs)."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+# ---------- sampling ----------
+class StackSampler:
+    """
+    One background thread that samples the stacks of registered threads every interval seconds.
+    The thread is started on first use and sleeps on an event while no thread is registered.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        counts = Counter()
+        with self._lock:
+            self._targets[ident] = counts
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return counts
+
+    def stop(self, ident):
+        with self._lock:
+            return self._targets.pop(ident, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._targets
+                if idle:
+                    self._wakeup.clear()
+            if idle:
+                self._wakeup.wait()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, counts in self._targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        counts[collapse(frame)] += 1
+            del frames
+
+class Capture:
+    """Profiling state of one request, created by RequestProfiler.begin()."""
+
+    def __init__(self, sampler, deterministic):
+        self.deterministic = deterministic
+        self.ident = threading.get_ident()
+        self.started_at = time.time()
+        self.duration = None
+        self.samples = Counter()
+        self.profile = None
+        self._sampler = sampler
+        if deterministic:
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError:
+                # 他のプロファイラーが動いている場合はサンプリングだけにする
+                self.profile = None
+        self._start = time.perf_counter()
+        self._sampler.start(self.ident)
+
+    def stop(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        if self.profile is not None:
+            self.profile.disable()
+        self.samples = self._sampler.stop(self.ident)
+
+# ---------- store ----------
+class RequestProfiler:
+    """Starts captures and keeps the newest max_captures of them as files in folder."""
+
+    def __init__(self, folder='profiles', max_captures=100, interval=0.005):
+        self.folder = folder
+        self.max_captures = int(max_captures)
+        self.sampler = StackSampler(interval)
+        self._lock = threading.Lock()
+
+    def begin(self, deterministic=False):
+        return Capture(self.sampler, deterministic)
+
+    def save(self, capture, info):
+        """Write the files of a stopped capture with the request info (a dict); returns its name."""
+        started = time.localtime(capture.started_at)
+        name = (time.strftime('%Y%m%d-%H%M%S', started) + f'_{int(capture.started_at * 1000) % 1000:03d}'
+                + '-' + uuid.uuid4().hex[:8])
+        os.makedirs(self.folder, exist_ok=True)
+        base = os.path.join(self.folder, name)
+
+        # 各スタックの末尾 (その時点で実行中だった関数) ごとのサンプル数
+        leaf_counts = Counter()
+        for stack, count in capture.samples.items():
+            leaf_counts[stack.rsplit(';', 1)[-1]] += count
+        files = ['.json']
+        if capture.samples:
+            with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+                for stack, count in capture.samples.most_common():
+                    f.write(f'{stack} {count}\n')
+            files.append('.collapsed')
+        if capture.profile is not None:
+            capture.profile.dump_stats(base + '.prof')
+            files.append('.prof')
+
+        meta = dict(info)
+        meta.update({
+            'name': name,
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', started),
+            'duration_s': capture.duration,
+            'mode': 'cprofile' if capture.profile is not None else 'sampling',
+            'sample_interval_s': self.sampler.interval,
+            'samples': sum(capture.samples.values()),
+            'top_functions': leaf_counts.most_common(TOP_FUNCTIONS),
+            'files': files,
+        })
+        # 一覧は .json を読むため最後に書く (一時ファイルから置き換え)
+        with open(base + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(base + '.json.tmp', base + '.json')
+        self.enforce_retention()
+        return name
+
+    def _names(self):
+        try:
+            entries = os.listdir(self.folder)
+        except FileNotFoundError:
+            return []
+        # 名前は開始時刻から始まるため、名前順が古い順になる
+        return sorted(entry[:-len('.json')] for entry in entries if entry.endswith('.json'))
+
+    def enforce_retention(self):
+        with self._lock:
+            names = self._names()
+            for name in names[:max(0, len(names) - self.max_captures)]:
+                for extension in EXTENSIONS:
+                    try:
+                        os.remove(os.path.join(self.folder, name + extension))
+                    except FileNotFoundError:
+                        pass
+
+    def list_captures(self, limit=None):
+        """Metadata of the saved captures, newest first."""
+        captures = []
+        for name in reversed(self._names()):
+            if limit is not None and len(captures) >= limit:
+                break
+            try:
+                with open(os.path.join(self.folder, name + '.json'), encoding='utf-8') as f:
+                    captures.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return captures
+
+    def file_name(self, name, extension):
+        """File name of one capture file, or None if the name or extension is not valid."""
+        if not _NAME_PATTERN.match(name) or extension not in EXTENSIONS:
+            return None
+        return name + extension
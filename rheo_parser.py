@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# レオメーター (粘度カーブ等) のエクスポートファイル専用パーサー
+# ファイル構成:
+#   プロジェクト: / テスト: / 結果: のメタデータ行
+#   インターバルとデータポイント:  <番号>  <点数>
+#   インターバルデータ:  ポイント No.  せん断速度  せん断応力  粘度  温度  トルク  ステータス
+#   (空行)
+#   単位行  [1/s]  [Pa]  [mPa·s]  [°C]  [mN·m]
+#   数値行 ...
+# 文字コードは先頭のBOMから判定し、1行ずつ読みながらインターバルごとに数値配列を作る。
+# メモリ使用量は一定ではなく、iter_intervals では読んでいる1インターバル分 (データ行の文字列と変換後の配列)、
+# read_rheo_file / to_dataframe (アップロード時のサイドカー作成) ではファイル全体の配列に比例する。
+
+# ---------- import library ----------
+import io
+import codecs
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+# ---------- format constants ----------
+METADATA_KEYS = {
+    'プロジェクト': 'project',
+    'テスト': 'test',
+    '結果': 'result',
+}
+INTERVAL_HEADER = 'インターバルとデータポイント'
+INTERVAL_COLUMNS = 'インターバルデータ'
+
+# 列名 (日本語/英語) から正規化した列名への対応
+CANONICAL_COLUMNS = {
+    'ポイント No.': 'point',
+    'せん断速度': 'shear_rate',
+    'せん断応力': 'shear_stress',
+    '粘度': 'viscosity',
+    '温度': 'temperature',
+    'トルク': 'torque',
+    'ステータス': 'status',
+    '時間': 'time',
+    '角周波数': 'angular_frequency',
+    '周波数': 'frequency',
+    'ひずみ': 'strain',
+    '貯蔵弾性率': 'storage_modulus',
+    '損失弾性率': 'loss_modulus',
+    '損失係数': 'loss_factor',
+    'Point No.': 'point',
+    'Shear Rate': 'shear_rate',
+    'Shear Stress': 'shear_stress',
+    'Viscosity': 'viscosity',
+    'Temperature': 'temperature',
+    'Torque': 'torque',
+    'Status': 'status',
+    'Time': 'time',
+    'Angular Frequency': 'angular_frequency',
+    'Frequency': 'frequency',
+    'Strain': 'strain',
+    'Storage Modulus': 'storage_modulus',
+    'Loss Modulus': 'loss_modulus',
+    'Loss Factor': 'loss_factor',
+}
+
+# 文字コード判定のために先頭から読むバイト数
+_SNIFF_BYTES = 64 * 1024
+
+@dataclass
+class Interval:
+    """One インターバル block: typed numeric columns, text columns and their units."""
+    index: int
+    declared_points: int
+    columns: list
+    units: dict
+    data: dict = field(default_factory=dict)   # 列名 -> np.ndarray (float64)
+    text: dict = field(default_factory=dict)   # 列名 -> list[str] (ステータス等)
+
+    @property
+    def n_points(self):
+        for values in self.data.values():
+            return len(values)
+        for values in self.text.values():
+            return len(values)
+        return 0
+
+@dataclass
+class RheoFile:
+    """Parsed export: structured metadata plus the list of intervals."""
+    encoding: str
+    metadata: dict
+    intervals: list
+
+# ---------- encoding ----------
+def sniff_encoding(path):
+    """
+    Detect the text encoding from the BOM; without a BOM, fall back to a NUL-byte check for
+    UTF-16 and then to UTF-8 / cp932.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(_SNIFF_BYTES)
+    if head.startswith(codecs.BOM_UTF16_LE):
+        return 'utf-16-le-bom'
+    if head.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16-be-bom'
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head and head.count(b'\x00') > len(head) // 4:
+        # BOMなしUTF-16: ASCII文字の上位バイトが0になる位置で判定
+        return 'utf-16-le' if head[1::2].count(b'\x00') > head[0::2].count(b'\x00') else 'utf-16-be'
+    try:
+        head.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # 読み込み範囲の末尾で多バイト文字が切れた場合はUTF-8とみなす
+        if e.start >= len(head) - 3:
+            return 'utf-8'
+        return 'cp932'
+
+def _open_text(path, encoding):
+    # BOM付きUTF-16はBOMを読み飛ばしてからデコードする
+    if encoding == 'utf-16-le-bom':
+        f = open(path, 'r', encoding='utf-16-le', newline='')
+        f.read(1)
+        return f
+    if encoding == 'utf-16-be-bom':
+        f = open(path, 'r', encoding='utf-16-be', newline='')
+        f.read(1)
+        return f
+    return open(path, 'r', encoding=encoding, newline='')
+
+def is_rheo_export(path, encoding=None, max_lines=20):
+    """Return True if the first lines look like the instrument export format."""
+    encoding = encoding or sniff_encoding(path)
+    try:
+        with _open_text(path, encoding) as f:
+            for _, line in zip(range(max_lines), f):
+                key = line.split('\t', 1)[0].strip().rstrip(':')
+                if key in METADATA_KEYS or key == INTERVAL_HEADER:
+                    return True
+    except UnicodeDecodeError:
+        return False
+    return False
+
+# ---------- streaming parser ----------
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            # 小数点にカンマを使う地域設定のエクスポートにも対応
+            return float(value.replace(',', '.'))
+        except ValueError:
+            return np.nan
+
+class _IntervalBuilder:
+    # 1インターバル分のデータ行を溜め、インターバルの終わりでまとめて数値配列に変換する
+    # (行ごとの float 変換を避け、pandas のCパーサーで一括変換する)
+    def __init__(self, index, declared_points):
+        self.index = index
+        self.declared_points = declared_points
+        self.columns = []
+        self.units = {}
+        self.lines = []
+
+    def set_columns(self, names):
+        columns = [name.strip() for name in names]
+        while columns and not columns[-1]:
+            columns.pop()
+        # 列名の重複は後ろに番号を付けて区別する
+        seen = {}
+        self.columns = []
+        for name in columns:
+            seen[name] = seen.get(name, 0) + 1
+            self.columns.append(name if seen[name] == 1 else f'{name}.{seen[name] - 1}')
+
+    def set_units(self, fields):
+        for name, unit in zip(self.columns, fields):
+            unit = unit.strip()
+            if unit.startswith('[') and unit.endswith(']'):
+                self.units[name] = unit[1:-1]
+
+    def add_row(self, line):
+        self.lines.append(line)
+
+    def build(self):
+        interval = Interval(self.index, self.declared_points, self.columns, self.units)
+        if not self.lines or not self.columns:
+            return interval
+        frame = pd.read_csv(io.StringIO('\n'.join(self.lines)), sep='\t', header=None,
+                            names=self.columns, index_col=False)
+        self.lines = []
+        for name in self.columns:
+            values = frame[name]
+            if not pd.api.types.is_numeric_dtype(values):
+                # 小数点にカンマを使う地域設定のエクスポートは、空欄以外がすべて数値に変換できれば数値列とする
+                text = values.fillna('').astype(str).str.strip()
+                first = next((v for v in text if v), '')
+                if not _is_number(first):
+                    interval.text[name] = text.tolist()
+                    continue
+                numbers = pd.to_numeric(text.str.replace(',', '.', regex=False), errors='coerce')
+                if not (numbers.notna().any() and numbers.notna().sum() == (text != '').sum()):
+                    interval.text[name] = text.tolist()
+                    continue
+                values = numbers
+            interval.data[name] = values.to_numpy(dtype=np.float64)
+        return interval
+
+def _is_number(value):
+    return not np.isnan(_to_float(value)) if value.strip() else False
+
+def iter_intervals(path, encoding=None, metadata=None):
+    """
+    Stream the intervals of an export file one at a time.
+    Only the interval being read is held in memory (its data lines until the interval ends, then its
+    arrays), so peak memory is bounded by the largest interval, not by the file. If a dict is passed as metadata, the
+    header fields (project / test / result and any other 'key:<TAB>value' lines) are stored in it.
+    """
+    encoding = encoding or sniff_encoding(path)
+    if metadata is None:
+        metadata = {}
+    metadata.setdefault('extra', {})
+    builder = None
+    expect = None   # インターバル内で次に来る行: 'columns' / 'units' / 'rows'
+
+    with _open_text(path, encoding) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            # データ行 (先頭が空欄で数値が続く行) は分割せずにそのまま溜める
+            if expect == 'rows' and line[:1] == '\t' and line[1:2] not in ('\t', ''):
+                builder.add_row(line[1:])
+                continue
+            fields = line.split('\t')
+            key = fields[0].strip()
+
+            if key.endswith(':'):
+                name = key[:-1]
+                if name == INTERVAL_HEADER:
+                    if builder is not None:
+                        yield builder.build()
+                    index = int(_to_float(fields[1])) if len(fields) > 1 and _is_number(fields[1]) else 0
+                    declared = int(_to_float(fields[2])) if len(fields) > 2 and _is_number(fields[2]) else -1
+                    builder = _IntervalBuilder(index, declared)
+                    expect = 'columns'
+                elif name == INTERVAL_COLUMNS and builder is not None:
+                    builder.set_columns(fields[1:])
+                    expect = 'units'
+                else:
+                    value = '\t'.join(fields[1:]).strip()
+                    if name in METADATA_KEYS:
+                        metadata[METADATA_KEYS[name]] = value
+                    else:
+                        metadata['extra'][name] = value
+                continue
+
+            if builder is None or not line.strip():
+                continue
+            if expect == 'units' and any(v.strip().startswith('[') for v in fields[1:]):
+                builder.set_units(fields[1:])
+                expect = 'rows'
+                continue
+            if expect in ('units', 'rows'):
+                # 先頭の空欄 (インターバルデータ: の見出し位置) を除いて保存
+                builder.add_row(line[1:] if line.startswith('\t') else line)
+                expect = 'rows'
+
+    if builder is not None:
+        yield builder.build()
+
+def read_rheo_file(path):
+    """Parse a whole export into a RheoFile (metadata + all intervals, all held in memory)."""
+    encoding = sniff_encoding(path)
+    metadata = {}
+    intervals = list(iter_intervals(path, encoding, metadata))
+    return RheoFile(encoding, metadata, intervals)
+
+# ---------- conversion ----------
+def to_dataframe(rheo):
+    """
+    Concatenate all intervals into one DataFrame with an 'インターバル' column.
+    Column units and header metadata are kept in df.attrs.
+    """
+    frames = []
+    units = {}
+    for interval in rheo.intervals:
+        if interval.n_points == 0:
+            continue
+        columns = {'インターバル': np.full(interval.n_points, interval.index)}
+        for name in interval.columns:
+            if name in interval.data:
+                columns[name] = interval.data[name]
+            elif name in interval.text:
+                columns[name] = interval.text[name]
+        frames.append(pd.DataFrame(columns))
+        units.update(interval.units)
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    df.attrs['metadata'] = dict(rheo.metadata)
+    df.attrs['units'] = units
+    return df
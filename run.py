@@ -1,6 +1,10 @@
 # ====================================================
 # 0. ライブラリのインポート
 # ====================================================
+# 使い方: python run.py [--data generated_data/learning_data_Z_1_to_100.csv] [--threads 4]
+#   学習データはスケーリング済み特徴量と LightGBM のバイナリ Dataset として generated_data/feature_store に保存し、
+#   学習データが変わらない限り2回目以降はCSVを読み直さない。
+#   python run.py --sweep --learning-rates 0.03,0.05,0.1 --num-leaves 15,31,63 でハイパーパラメータを探索する。
 import pandas as pd
 import numpy as np
 import lightgbm as lgb
@@ -8,124 +12,358 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler # オプションでスケーリングを試すため
 from sklearn.metrics import r2_score, mean_squared_error
 import joblib # モデルの保存・読み込み用
+import model_registry # バージョン付きのモデル置き場 (manifest とコンパイル済みモデルを含む)
 import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # ====================================================
-# 1. データの読み込み
+# 1. 設定
 # ====================================================
-print("--- ステップ1: データの読み込み ---")
-data_path = 'generated_data/learning_data_Z_1_to_100.csv'
+DATA_PATH = 'generated_data/learning_data_Z_1_to_100.csv'
+FEATURE_STORE_DIR = os.path.join('generated_data', 'feature_store')
+MODEL_OUTPUT_DIR = 'trained_models'
+# 特徴量ストアの形式を変えた場合は上げる (古いキャッシュを使わないようにする)
+FEATURE_STORE_VERSION = 1
 
-if not os.path.exists(data_path):
-    print(f"エラー: データファイルが見つかりません。'{data_path}'が存在することを確認してください。")
-    exit()
+FEATURES = ['Z', 'omega_tau_e']
+TARGETS = {'gp': 'Gp_over_Ge', 'gpp': 'Gpp_over_Ge'}
 
-df = pd.read_csv(data_path)
-print(f"データセットを読み込みました。総データ件数: {len(df)}")
-print("データセットの最初の5行:")
-print(df.head())
-print("-" * 30)
+# 分割: 20%をテストデータ (評価用)、残りの10%を早期終了の検証データにする
+TEST_SIZE = 0.2
+VALID_SIZE = 0.1
+RANDOM_STATE = 42
 
-# ====================================================
-# 2. データの前処理 (特徴量とターゲットの定義)
-# ====================================================
-print("--- ステップ2: データの前処理 ---")
-# 特徴量 (X): Z と omega_tau_e
-X = df[['Z', 'omega_tau_e']]
-# ターゲット (y): Gp_over_Ge と Gpp_over_Ge
-y_gp = df['Gp_over_Ge']
-y_gpp = df['Gpp_over_Ge']
-
-print(f"特徴量Xの形状: {X.shape}")
-print(f"ターゲットy_gpの形状: {y_gp.shape}")
-print(f"ターゲットy_gppの形状: {y_gpp.shape}")
-print("-" * 30)
-
-# オプション: 特徴量のスケーリング
-# LightGBMはスケーリングなしでも動作しますが、ここでは標準的な前処理として適用します。
-# スケーラー自体も予測時に必要なので保存します。
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X) # Xをスケーリングし、numpy配列になる
-X_scaled_df = pd.DataFrame(X_scaled, columns=X.columns) # 後続のためにDataFrameに戻す
-print("特徴量をStandardScalerでスケーリングしました。")
-print("スケーリング後の特徴量の最初の5行:")
-print(X_scaled_df.head())
-print("-" * 30)
+# ビン分割 (Dataset の構築) に関わるパラメータ。変えると特徴量ストアを作り直す
+DATASET_PARAMS = {'max_bin': 255, 'min_data_in_bin': 3, 'verbose': -1}
+
+# 訓練のパラメータ (従来の n_estimators=1000, learning_rate=0.05, num_leaves=31 を上限として早期終了する)
+TRAIN_PARAMS = {
+    'objective': 'regression',
+    'learning_rate': 0.05,
+    'num_leaves': 31,
+    'seed': RANDOM_STATE,
+    'verbose': -1,
+}
+NUM_BOOST_ROUND = 1000
+EARLY_STOPPING_ROUNDS = 50
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="G'/Ge, G''/Ge の LightGBM サロゲートモデルを訓練する")
+    parser.add_argument('--data', default=DATA_PATH, help="学習データのCSV、または generate_data.py のシャードのフォルダ")
+    parser.add_argument('--feature-store', default=FEATURE_STORE_DIR, help="特徴量ストアの保存先")
+    parser.add_argument('--rebuild', action='store_true', help="特徴量ストアを作り直す")
+    parser.add_argument('--model-dir', default=MODEL_OUTPUT_DIR,
+                        help="モデルの保存先 (<model-dir>/versions/<バージョン>/ に保存する)")
+    parser.add_argument('--no-save', action='store_true', help="モデルを保存しない (評価・探索のみ)")
+    parser.add_argument('--no-activate', action='store_true',
+                        help="保存したバージョンを有効にしない (後で python model_registry.py activate で切り替える)")
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                        help="LightGBM のスレッド数の合計 (2つのターゲットで半分ずつ使う)")
+    parser.add_argument('--sequential', action='store_true', help="2つのターゲットを並列ではなく順番に訓練する")
+    parser.add_argument('--num-boost-round', type=int, default=NUM_BOOST_ROUND, help="木の本数の上限")
+    parser.add_argument('--early-stopping-rounds', type=int, default=EARLY_STOPPING_ROUNDS,
+                        help="検証データの誤差がこの回数改善しなければ打ち切る (0 で早期終了しない)")
+    parser.add_argument('--learning-rate', type=float, default=TRAIN_PARAMS['learning_rate'])
+    parser.add_argument('--num-leaves', type=int, default=TRAIN_PARAMS['num_leaves'])
+    parser.add_argument('--sweep', action='store_true',
+                        help="--learning-rates と --num-leaves-list の全組み合わせを訓練し、ターゲットごとに最良のモデルを選ぶ")
+    parser.add_argument('--learning-rates', default='0.03,0.05,0.1', help="探索する学習率 (カンマ区切り)")
+    parser.add_argument('--num-leaves-list', default='15,31,63', help="探索する葉の数 (カンマ区切り)")
+    return parser.parse_args(argv)
+
+def parse_list(text, cast):
+    try:
+        values = [cast(v) for v in text.split(',') if v.strip()]
+    except ValueError:
+        raise ValueError(f"数値のカンマ区切りで指定してください: '{text}'")
+    if not values:
+        raise ValueError(f"値が指定されていません: '{text}'")
+    return values
+
+# 処理段階ごとの経過時間を記録し、最後にまとめて表示する
+class PhaseTimer:
+    def __init__(self):
+        self.phases = []
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    def run(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.record(name, time.perf_counter() - start)
+        return result
 
+    def report(self):
+        width = max(len(name) for name, _ in self.phases)
+        for name, seconds in self.phases:
+            print(f"  {name:<{width}} : {seconds:8.2f} s")
 
 # ====================================================
-# 3. 訓練データとテストデータへの分割
+# 2. 特徴量ストア (スケーリング済み特徴量 + バイナリ Dataset)
 # ====================================================
-print("--- ステップ3: 訓練データとテストデータへの分割 ---")
-# スケーリングした特徴量 X_scaled_df を使用
-X_train, X_test, y_gp_train, y_gp_test, y_gpp_train, y_gpp_test = train_test_split(
-    X_scaled_df, y_gp, y_gpp, test_size=0.2, random_state=42 # 20%をテストデータに
-)
+# 学習データ (ファイルまたはシャードのフォルダ) の大きさと更新時刻から、内容が変わったかを判定する
+def source_signature(path):
+    if os.path.isdir(path):
+        entries = sorted(name for name in os.listdir(path) if name.endswith('.npz') and '.tmp' not in name)
+        stats = [(name, os.path.getsize(os.path.join(path, name)), os.stat(os.path.join(path, name)).st_mtime_ns)
+                 for name in entries]
+    else:
+        stats = [(os.path.basename(path), os.path.getsize(path), os.stat(path).st_mtime_ns)]
+    return stats
+
+def feature_store_key(data_path):
+    spec = {
+        'version': FEATURE_STORE_VERSION,
+        'source': source_signature(data_path),
+        'features': FEATURES,
+        'targets': TARGETS,
+        'split': [TEST_SIZE, VALID_SIZE, RANDOM_STATE],
+        'dataset_params': DATASET_PARAMS,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def load_source(data_path):
+    if os.path.isdir(data_path):
+        # generate_data.py のシャード (Zごとの .npz) から直接読む
+        import generate_data
+        return generate_data.load_shards(data_path)
+    return pd.read_csv(data_path)
+
+def build_feature_store(df, store_path):
+    """
+    Scale the features, split rows into train / valid / test, and save the arrays, the scaler and
+    binary LightGBM Datasets (train, valid) to store_path. The directory is written under a
+    temporary name and renamed at the end, so an interrupted build is never picked up.
+    """
+    labels = {name: df[column].to_numpy(dtype=float) for name, column in TARGETS.items()}
+
+    # スケーラー自体も予測時に必要なので保存する (従来どおり全データで fit する)
+    scaler = StandardScaler()
+    scaler.fit(df[FEATURES])
+    X_scaled = scaler.transform(df[FEATURES])
+
+    # 従来と同じテストデータの分割に、早期終了用の検証データの分割を追加する
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=TEST_SIZE, random_state=RANDOM_STATE)
+    fit_idx, valid_idx = train_test_split(train_idx, test_size=VALID_SIZE, random_state=RANDOM_STATE)
+
+    tmp_path = store_path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    np.savez(os.path.join(tmp_path, 'features.npz'), X_scaled=X_scaled,
+             fit_idx=fit_idx, valid_idx=valid_idx, test_idx=test_idx,
+             **{f'y_{name}': y for name, y in labels.items()})
+    joblib.dump(scaler, os.path.join(tmp_path, 'scaler.pkl'))
+
+    # ビン分割は特徴量だけで決まるので、ラベルは gp で保存し、読み込み時にターゲットごとに差し替える
+    train_set = lgb.Dataset(X_scaled[fit_idx], label=labels['gp'][fit_idx], feature_name=FEATURES,
+                            params=DATASET_PARAMS, free_raw_data=False)
+    train_set.construct().save_binary(os.path.join(tmp_path, 'train.bin'))
+    valid_set = lgb.Dataset(X_scaled[valid_idx], label=labels['gp'][valid_idx], reference=train_set,
+                            params=DATASET_PARAMS, free_raw_data=False)
+    valid_set.construct().save_binary(os.path.join(tmp_path, 'valid.bin'))
 
-print(f"訓練データの件数: {len(X_train)}")
-print(f"テストデータの件数: {len(X_test)}")
-print("-" * 30)
+    if os.path.exists(store_path):
+        shutil.rmtree(store_path)
+    os.replace(tmp_path, store_path)
+
+class FeatureStore:
+    """Arrays, scaler and binary Dataset paths of one feature store directory."""
+
+    def __init__(self, store_path):
+        self.path = store_path
+        arrays = np.load(os.path.join(store_path, 'features.npz'))
+        self.X_scaled = arrays['X_scaled']
+        self.fit_idx = arrays['fit_idx']
+        self.valid_idx = arrays['valid_idx']
+        self.test_idx = arrays['test_idx']
+        self.labels = {name: arrays[f'y_{name}'] for name in TARGETS}
+        self.scaler = joblib.load(os.path.join(store_path, 'scaler.pkl'))
+
+    def datasets(self, target):
+        """(train, valid) Datasets loaded from the cached binary files with the labels of target."""
+        train_set = lgb.Dataset(os.path.join(self.path, 'train.bin'), params=DATASET_PARAMS)
+        train_set.construct().set_label(self.labels[target][self.fit_idx])
+        valid_set = lgb.Dataset(os.path.join(self.path, 'valid.bin'), reference=train_set, params=DATASET_PARAMS)
+        valid_set.construct().set_label(self.labels[target][self.valid_idx])
+        return train_set, valid_set
+
+def open_feature_store(data_path, store_dir, rebuild, timer):
+    store_path = os.path.join(store_dir, feature_store_key(data_path))
+    if rebuild or not os.path.exists(os.path.join(store_path, 'valid.bin')):
+        df = timer.run('データの読み込み', load_source, data_path)
+        print(f"データセットを読み込みました。総データ件数: {len(df)}")
+        if not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+        timer.run('特徴量ストアの作成', build_feature_store, df, store_path)
+        print(f"特徴量ストアを作成しました: '{store_path}'")
+    else:
+        print(f"特徴量ストアを再利用します: '{store_path}'")
+    store = timer.run('特徴量ストアの読み込み', FeatureStore, store_path)
+    print(f"訓練データ: {store.fit_idx.size} 件 / 検証データ (早期終了用): {store.valid_idx.size} 件"
+          f" / テストデータ: {store.test_idx.size} 件")
+    return store
 
 # ====================================================
-# 4. LightGBMモデルの訓練
+# 3. LightGBMモデルの訓練
 # ====================================================
-print("--- ステップ4: LightGBMモデルの訓練 ---")
+def train_target(datasets, params, num_boost_round, early_stopping_rounds):
+    """Train one target on its (train, valid) Datasets. Returns (booster, elapsed seconds)."""
+    train_set, valid_set = datasets
+    callbacks = [lgb.log_evaluation(0)]
+    if early_stopping_rounds > 0:
+        callbacks.append(lgb.early_stopping(early_stopping_rounds, verbose=False))
+    start = time.perf_counter()
+    booster = lgb.train(params, train_set, num_boost_round=num_boost_round,
+                        valid_sets=[valid_set], valid_names=['valid'], callbacks=callbacks)
+    return booster, time.perf_counter() - start
 
-# Gp_over_Ge 用モデルの訓練
-print("Gp_over_Ge (貯蔵弾性率) 予測モデルを訓練中...")
-model_gp = lgb.LGBMRegressor(random_state=42, n_estimators=1000, learning_rate=0.05, num_leaves=31) # ハイパーパラメータを少し調整
-model_gp.fit(X_train, y_gp_train)
-print("Gp_over_Ge 予測モデルの訓練が完了しました。")
+def train_targets(datasets, params, threads, sequential, num_boost_round, early_stopping_rounds):
+    """
+    Train every target with the same params. Targets run concurrently on threads with the
+    thread budget split between them (LightGBM releases the GIL while training).
+    Returns {target: (booster, elapsed seconds)}.
+    """
+    if sequential:
+        target_params = dict(params, num_threads=threads)
+        return {target: train_target(datasets[target], target_params, num_boost_round, early_stopping_rounds)
+                for target in TARGETS}
+    target_params = dict(params, num_threads=max(1, threads // len(TARGETS)))
+    with ThreadPoolExecutor(max_workers=len(TARGETS)) as executor:
+        futures = {target: executor.submit(train_target, datasets[target], target_params,
+                                           num_boost_round, early_stopping_rounds)
+                   for target in TARGETS}
+        return {target: future.result() for target, future in futures.items()}
 
-# Gpp_over_Ge 用モデルの訓練
-print("Gpp_over_Ge (損失弾性率) 予測モデルを訓練中...")
-model_gpp = lgb.LGBMRegressor(random_state=42, n_estimators=1000, learning_rate=0.05, num_leaves=31) # 同様のハイパーパラメータ
-model_gpp.fit(X_train, y_gpp_train)
-print("Gpp_over_Ge 予測モデルの訓練が完了しました。")
-print("-" * 30)
+def n_trees(booster):
+    # 早期終了した場合は最良の回までの木の本数
+    return booster.best_iteration or booster.current_iteration()
+
+def best_score(booster):
+    # 検証データでの最良の l2 (早期終了しない場合は最終の値)
+    return booster.best_score['valid']['l2']
+
+# ====================================================
+# 4. モデルの評価
+# ====================================================
+# テストデータでの評価指標を表示し、manifest に書けるように {ターゲット: 指標} で返す
+def evaluate(store, boosters):
+    X_test = store.X_scaled[store.test_idx]
+    metrics = {}
+    for target, column in TARGETS.items():
+        booster = boosters[target]
+        y_test = store.labels[target][store.test_idx]
+        y_pred = booster.predict(X_test)
+        metrics[target] = {
+            'n_trees': int(n_trees(booster)),
+            'r2': float(r2_score(y_test, y_pred)),
+            'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred))),
+            'valid_l2': float(best_score(booster)),
+        }
+        print(f"{column} モデルの評価:")
+        print(f"  木の本数: {metrics[target]['n_trees']}")
+        print(f"  R2スコア: {metrics[target]['r2']:.4f}")
+        print(f"  RMSE: {metrics[target]['rmse']:.4e}") # 指数表記で表示
+    return metrics
 
 # ====================================================
-# 5. モデルの評価
+# 5. 訓練済みモデルとスケーラーの保存
 # ====================================================
-print("--- ステップ5: モデルの評価 ---")
-
-# Gp_over_Ge モデルの評価
-y_gp_pred = model_gp.predict(X_test)
-r2_gp = r2_score(y_gp_test, y_gp_pred)
-rmse_gp = np.sqrt(mean_squared_error(y_gp_test, y_gp_pred))
-print(f"Gp_over_Ge モデルの評価:")
-print(f"  R2スコア: {r2_gp:.4f}")
-print(f"  RMSE: {rmse_gp:.4e}") # 指数表記で表示
-
-# Gpp_over_Ge モデルの評価
-y_gpp_pred = model_gpp.predict(X_test)
-r2_gpp = r2_score(y_gpp_test, y_gpp_pred)
-rmse_gpp = np.sqrt(mean_squared_error(y_gpp_test, y_gpp_pred))
-print(f"Gpp_over_Ge モデルの評価:")
-print(f"  R2スコア: {r2_gpp:.4f}")
-print(f"  RMSE: {rmse_gpp:.4e}") # 指数表記で表示
-print("-" * 30)
+# モデル・スケーラー・コンパイル済みモデル・manifest (評価指標と内容のハッシュ) を新しいバージョンとして保存する
+def save_models(boosters, scaler, metrics, info, model_output_dir, activate):
+    version = model_registry.create_version(model_output_dir, boosters, scaler, metrics, info)
+    path = os.path.join(model_registry.versions_dir(model_output_dir), version)
+    print(f"モデルとStandardScalerをバージョン {version} として '{path}' に保存しました。")
+    if activate:
+        # 起動中のアプリは versions/CURRENT の変更を検知し、再起動せずに切り替える
+        model_registry.activate(model_output_dir, version)
+        print(f"バージョン {version} を有効にしました。")
+    return version
 
 # ====================================================
-# 6. 訓練済みモデルとスケーラーの保存
+# 6. 実行
 # ====================================================
-print("--- ステップ6: 訓練済みモデルとスケーラーの保存 ---")
-model_output_dir = 'trained_models'
-if not os.path.exists(model_output_dir):
-    os.makedirs(model_output_dir)
-
-# Gpモデルの保存
-joblib.dump(model_gp, os.path.join(model_output_dir, 'lgbm_gp_model.pkl'))
-print(f"Gp予測モデルを '{os.path.join(model_output_dir, 'lgbm_gp_model.pkl')}' に保存しました。")
-
-# Gppモデルの保存
-joblib.dump(model_gpp, os.path.join(model_output_dir, 'lgbm_gpp_model.pkl'))
-print(f"Gpp予測モデルを '{os.path.join(model_output_dir, 'lgbm_gpp_model.pkl')}' に保存しました。")
-
-# スケーラーの保存 (予測時にも同じスケーラーを使うため)
-joblib.dump(scaler, os.path.join(model_output_dir, 'scaler.pkl'))
-print(f"StandardScalerを '{os.path.join(model_output_dir, 'scaler.pkl')}' に保存しました。")
-print("-" * 30)
-
-print("\n--- 機械学習モデルの構築と保存が完了しました！ ---")
-print(f"訓練済みモデルとスケーラーは '{model_output_dir}' フォルダに保存されています。")
\ No newline at end of file
+def main(argv=None):
+    args = parse_args(argv)
+    timer = PhaseTimer()
+
+    print("--- ステップ1: データの読み込みと特徴量ストア ---")
+    if not os.path.exists(args.data):
+        print(f"エラー: データファイルが見つかりません。'{args.data}'が存在することを確認してください。")
+        sys.exit(1)
+    store = open_feature_store(args.data, args.feature_store, args.rebuild, timer)
+    datasets = timer.run('Dataset の読み込み', lambda: {target: store.datasets(target) for target in TARGETS})
+    print("-" * 30)
+
+    print("--- ステップ2: LightGBMモデルの訓練 ---")
+    mode = '順番に' if args.sequential else '並列に'
+    print(f"2つのターゲットを{mode}訓練します。(スレッド数の合計: {args.threads},"
+          f" 木の本数の上限: {args.num_boost_round}, 早期終了: {args.early_stopping_rounds} 回)")
+    if args.sweep:
+        try:
+            grid = [(lr, leaves) for lr in parse_list(args.learning_rates, float)
+                    for leaves in parse_list(args.num_leaves_list, int)]
+        except ValueError as e:
+            print(f"エラー: {e}")
+            sys.exit(1)
+        # 同じバイナリ Dataset (ビン分割済み) を全ての組み合わせで使い回す
+        best = {}
+        print(f"{'学習率':>8} {'葉の数':>6} | " + " | ".join(f"{TARGETS[t]:>24}" for t in TARGETS))
+        start = time.perf_counter()
+        for lr, leaves in grid:
+            params = dict(TRAIN_PARAMS, learning_rate=lr, num_leaves=leaves)
+            results = train_targets(datasets, params, args.threads, args.sequential,
+                                    args.num_boost_round, args.early_stopping_rounds)
+            cells = []
+            for target, (booster, elapsed) in results.items():
+                score = best_score(booster)
+                cells.append(f"l2 {score:.3e} {n_trees(booster):5d}本 {elapsed:5.1f}s")
+                if target not in best or score < best_score(best[target][0]):
+                    best[target] = (booster, (lr, leaves))
+            print(f"{lr:8g} {leaves:6d} | " + " | ".join(f"{cell:>24}" for cell in cells))
+        timer.record(f'探索 ({len(grid)} 通り)', time.perf_counter() - start)
+        boosters = {target: booster for target, (booster, _) in best.items()}
+        for target, (_, (lr, leaves)) in best.items():
+            print(f"{TARGETS[target]} の最良の設定: 学習率 {lr:g}, 葉の数 {leaves}")
+    else:
+        params = dict(TRAIN_PARAMS, learning_rate=args.learning_rate, num_leaves=args.num_leaves)
+        start = time.perf_counter()
+        results = train_targets(datasets, params, args.threads, args.sequential,
+                                args.num_boost_round, args.early_stopping_rounds)
+        timer.record('訓練 (全体)', time.perf_counter() - start)
+        for target, (booster, elapsed) in results.items():
+            timer.record(f'  うち {TARGETS[target]}', elapsed)
+            print(f"{TARGETS[target]} 予測モデルの訓練が完了しました。(木の本数: {n_trees(booster)})")
+        boosters = {target: booster for target, (booster, _) in results.items()}
+    print("-" * 30)
+
+    print("--- ステップ3: モデルの評価 ---")
+    metrics = timer.run('評価', evaluate, store, boosters)
+    print("-" * 30)
+
+    if not args.no_save:
+        print("--- ステップ4: 訓練済みモデルとスケーラーの保存 ---")
+        info = {
+            'data': args.data,
+            'feature_store': os.path.basename(store.path),
+            'params': {target: {key: boosters[target].params.get(key) for key in ('learning_rate', 'num_leaves')}
+                       for target in TARGETS},
+        }
+        timer.run('保存', save_models, boosters, store.scaler, metrics, info, args.model_dir, not args.no_activate)
+        print("-" * 30)
+
+    print("--- 処理時間 ---")
+    timer.report()
+    if not args.no_save:
+        print("\n--- 機械学習モデルの構築と保存が完了しました！ ---")
+        print(f"訓練済みモデルとスケーラーは '{args.model_dir}' フォルダに保存されています。")
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
+DROP TABLE IF EXISTS experiments_fts;
 DROP TABLE IF EXISTS experiments;
+DROP TABLE IF EXISTS blobs;
+DROP TABLE IF EXISTS jobs;
+DROP TABLE IF EXISTS measurement_zones;
 
 CREATE TABLE experiments (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -7,5 +11,10 @@ CREATE TABLE experiments (
     experiment_date DATE NOT NULL,
     file_name TEXT NOT NULL,
     file_path TEXT NOT NULL,
-    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    parsed_path TEXT,
+    parsed_mtime REAL,
+    parsed_size INTEGER,
+    summary_json TEXT,
+    content_hash TEXT
 );
\ No newline at end of file
@@ -0,0 +1,20 @@
+-- コンテンツアドレス型ストレージ (blob_store.py) に保存したファイルと参照数
+-- schema.sql の後に実行する。既存のデータベースにも繰り返し適用できる。
+
+CREATE TABLE IF NOT EXISTS blobs (
+    content_hash TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_experiments_content_hash ON experiments (content_hash);
+
+-- 実験データの行を削除したら参照数を減らし、どこからも参照されなくなった blobs の行は削除する
+-- (ファイル自体はコミット後に app.discard_unreferenced_blob で削除する)
+CREATE TRIGGER IF NOT EXISTS experiments_blobs_ad AFTER DELETE ON experiments
+WHEN old.content_hash IS NOT NULL BEGIN
+    UPDATE blobs SET ref_count = ref_count - 1 WHERE content_hash = old.content_hash;
+    DELETE FROM blobs WHERE content_hash = old.content_hash AND ref_count <= 0;
+END;
@@ -0,0 +1,20 @@
+-- バックグラウンドジョブ (jobs.py) の状態と結果
+-- schema.sql の後に実行する。既存のデータベースにも繰り返し適用できる。
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params_json TEXT NOT NULL,
+    cache_key TEXT,
+    status TEXT NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    heartbeat_at REAL,
+    result_json TEXT,
+    error TEXT,
+    submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_cache_key ON jobs (kind, cache_key, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
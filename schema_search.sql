@@ -0,0 +1,32 @@
+-- experiments テーブルの検索用インデックスと全文検索 (FTS5) テーブル
+-- schema.sql の後に実行する。既存のデータベースにも繰り返し適用できる。
+
+CREATE INDEX IF NOT EXISTS idx_experiments_uploaded_at ON experiments (uploaded_at, id);
+CREATE INDEX IF NOT EXISTS idx_experiments_device_name ON experiments (device_name);
+CREATE INDEX IF NOT EXISTS idx_experiments_sample_name ON experiments (sample_name);
+
+-- trigram トークナイザーで3文字以上の部分一致検索をインデックスで処理する
+CREATE VIRTUAL TABLE IF NOT EXISTS experiments_fts USING fts5(
+    device_name,
+    sample_name,
+    content='experiments',
+    content_rowid='id',
+    tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS experiments_fts_ai AFTER INSERT ON experiments BEGIN
+    INSERT INTO experiments_fts (rowid, device_name, sample_name)
+    VALUES (new.id, new.device_name, new.sample_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS experiments_fts_ad AFTER DELETE ON experiments BEGIN
+    INSERT INTO experiments_fts (experiments_fts, rowid, device_name, sample_name)
+    VALUES ('delete', old.id, old.device_name, old.sample_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS experiments_fts_au AFTER UPDATE OF device_name, sample_name ON experiments BEGIN
+    INSERT INTO experiments_fts (experiments_fts, rowid, device_name, sample_name)
+    VALUES ('delete', old.id, old.device_name, old.sample_name);
+    INSERT INTO experiments_fts (rowid, device_name, sample_name)
+    VALUES (new.id, new.device_name, new.sample_name);
+END;
@@ -0,0 +1,14 @@
+-- 測定データの列ごとの最小値・最大値 (ゾーンマップ)。measurement_query.py の検索で、条件の範囲と重ならないファイルを読まずに除外する
+-- column_name は rheo_parser.CANONICAL_COLUMNS で正規化した列名。値は各ファイルの単位のまま保存する
+-- schema.sql の後に実行する。既存のデータベースにも繰り返し適用できる。
+
+CREATE TABLE IF NOT EXISTS measurement_zones (
+    experiment_id INTEGER NOT NULL,
+    column_name TEXT NOT NULL,
+    min_value REAL NOT NULL,
+    max_value REAL NOT NULL,
+    n_values INTEGER NOT NULL,
+    PRIMARY KEY (experiment_id, column_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_measurement_zones_range ON measurement_zones (column_name, min_value, max_value);
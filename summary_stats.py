@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# ファイルごとの要約統計 (マージ可能)
+# アップロード時に数値列ごとの 件数・合計・二乗和・最小・最大 と分位点スケッチを計算して保存しておき、
+# 検索条件に一致する複数ファイルの describe() を、元ファイルを読まずに要約同士のマージで求める。
+# 分位点スケッチは対数バケットのヒストグラム (DDSketch 方式) で、相対誤差 RELATIVE_ACCURACY 以内の値を返す。
+
+# ---------- import library ----------
+import math
+import numpy as np
+import pandas as pd
+
+# 分位点の相対誤差
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+# 1つのスケッチが持つバケット数の上限 (超えた場合は絶対値の小さい側のバケットをまとめる)
+MAX_BUCKETS = 2048
+
+# describe() と同じ分位点
+PERCENTILES = (0.25, 0.5, 0.75)
+
+# ---------- sketch ----------
+def _bucket_counts(magnitudes):
+    keys, counts = np.unique(np.ceil(np.log(magnitudes) / _LOG_GAMMA).astype(np.int64), return_counts=True)
+    return {str(k): int(c) for k, c in zip(keys.tolist(), counts.tolist())}
+
+def _collapse(store):
+    # バケット数が上限を超えたら、絶対値の小さいバケットを1つにまとめる
+    if len(store) <= MAX_BUCKETS:
+        return store
+    keys = sorted(store, key=int)
+    cut = len(keys) - MAX_BUCKETS + 1
+    merged = sum(store[k] for k in keys[:cut])
+    collapsed = {k: store[k] for k in keys[cut:]}
+    collapsed[keys[cut - 1]] = merged
+    return collapsed
+
+def build_sketch(values):
+    values = values[np.isfinite(values)]
+    return {
+        'pos': _collapse(_bucket_counts(values[values > 0])),
+        'neg': _collapse(_bucket_counts(-values[values < 0])),
+        'zero': int(np.count_nonzero(values == 0)),
+    }
+
+def merge_sketches(a, b):
+    merged = {'pos': dict(a['pos']), 'neg': dict(a['neg']), 'zero': a['zero'] + b['zero']}
+    for side in ('pos', 'neg'):
+        for key, count in b[side].items():
+            merged[side][key] = merged[side].get(key, 0) + count
+        merged[side] = _collapse(merged[side])
+    return merged
+
+def _bucket_value(key):
+    # バケット (γ^(k-1), γ^k] の代表値
+    return 2.0 * _GAMMA**int(key) / (_GAMMA + 1.0)
+
+def sketch_quantile(sketch, q):
+    total = sketch['zero'] + sum(sketch['pos'].values()) + sum(sketch['neg'].values())
+    if total == 0:
+        return np.nan
+    rank = q * (total - 1)
+    seen = 0
+    # 負の値 (絶対値の大きい順) → 0 → 正の値 (小さい順) の順に累積する
+    for key in sorted(sketch['neg'], key=int, reverse=True):
+        seen += sketch['neg'][key]
+        if seen > rank:
+            return -_bucket_value(key)
+    seen += sketch['zero']
+    if seen > rank:
+        return 0.0
+    for key in sorted(sketch['pos'], key=int):
+        seen += sketch['pos'][key]
+        if seen > rank:
+            return _bucket_value(key)
+    return _bucket_value(max(sketch['pos'], key=int)) if sketch['pos'] else 0.0
+
+# ---------- per-file summary ----------
+def summarize_frame(df):
+    """
+    Mergeable summary of every numeric column of df:
+    {'n_rows': int, 'columns': {name: {count, sum, sumsq, min, max, sketch}}}.
+    """
+    columns = {}
+    for name in df.select_dtypes(include='number').columns:
+        values = df[name].to_numpy(dtype=np.float64)
+        finite = values[np.isfinite(values)]
+        columns[str(name)] = {
+            'count': int(finite.size),
+            'sum': float(finite.sum()),
+            'sumsq': float(np.square(finite).sum()),
+            'min': float(finite.min()) if finite.size else None,
+            'max': float(finite.max()) if finite.size else None,
+            'sketch': build_sketch(finite),
+        }
+    return {'n_rows': int(len(df)), 'columns': columns}
+
+def merge_summaries(summaries):
+    merged = {'n_rows': 0, 'columns': {}}
+    for summary in summaries:
+        merged['n_rows'] += summary['n_rows']
+        for name, stats in summary['columns'].items():
+            current = merged['columns'].get(name)
+            if current is None:
+                merged['columns'][name] = dict(stats)
+                continue
+            current['count'] += stats['count']
+            current['sum'] += stats['sum']
+            current['sumsq'] += stats['sumsq']
+            if stats['min'] is not None:
+                current['min'] = stats['min'] if current['min'] is None else min(current['min'], stats['min'])
+                current['max'] = stats['max'] if current['max'] is None else max(current['max'], stats['max'])
+            current['sketch'] = merge_sketches(current['sketch'], stats['sketch'])
+    return merged
+
+def describe(summary):
+    """Build a DataFrame shaped like DataFrame.describe() from a (merged) summary."""
+    index = ['count', 'mean', 'std', 'min'] + [f'{int(p * 100)}%' for p in PERCENTILES] + ['max']
+    result = {}
+    for name, stats in summary['columns'].items():
+        n = stats['count']
+        mean = stats['sum'] / n if n else np.nan
+        # 標本標準偏差 (describe と同じく ddof=1)
+        variance = (stats['sumsq'] - n * mean * mean) / (n - 1) if n > 1 else np.nan
+        std = math.sqrt(max(variance, 0.0)) if n > 1 else np.nan
+        low = stats['min'] if stats['min'] is not None else np.nan
+        high = stats['max'] if stats['max'] is not None else np.nan
+        # スケッチの推定値は実際の最小値・最大値の範囲に収める
+        quantiles = [min(max(sketch_quantile(stats['sketch'], p), low), high) if n else np.nan
+                     for p in PERCENTILES]
+        result[name] = [n, mean, std, low] + quantiles + [high]
+    return pd.DataFrame(result, index=index)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# app.py を使うテストの共通フィクスチャ
+# データベース・保存先フォルダを一時ディレクトリに切り替え、リポジトリの database.db や uploads/ には書き込まない
+
+import os
+import sys
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def isolated_app(tmp_path, monkeypatch):
+    """app module using a fresh database and upload folders under tmp_path."""
+    import app as web_app
+    # スキーマファイルは相対パスで読むため、リポジトリのルートで実行する
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(web_app, 'DATABASE', str(tmp_path / 'database.db'))
+    monkeypatch.setitem(web_app.app.config, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setitem(web_app.app.config, 'OBJECTS_FOLDER', str(tmp_path / 'uploads' / 'objects'))
+    monkeypatch.setitem(web_app.app.config, 'PARSED_FOLDER', str(tmp_path / 'parsed'))
+    monkeypatch.setitem(web_app.app.config, 'TESTING', True)
+    web_app.init_ex_db()
+    web_app.upgrade_ex_db()
+    return web_app
+
+@pytest.fixture
+def client(isolated_app):
+    """Test client that is already logged in."""
+    client = isolated_app.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    return client
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# コンテンツアドレス型ストレージ (blob_store.py と blobs テーブル) の重複排除と参照数の確認
+# リポジトリのルートで実行する: python -m pytest tests
+
+import io
+import os
+import shutil
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uploads', '20250421_CMC_1wt%_shiratsuji_01.csv')
+
+def upload(client, data, name='sample.csv'):
+    return client.post('/upload', data={
+        'experiment_device': 'MCR 302', 'sample_name': 'CMC', 'experiment_date': '2025-04-21',
+        'file': (io.BytesIO(data), name),
+    }, content_type='multipart/form-data')
+
+def blob_rows(web_app):
+    db = web_app.connect_db()
+    try:
+        return [dict(row) for row in db.execute('SELECT content_hash, file_path, ref_count FROM blobs')]
+    finally:
+        db.close()
+
+def test_reupload_of_legacy_file_reuses_it(isolated_app, client, tmp_path):
+    # 以前のアップロード: objects/ の外にファイル名で保存され、content_hash のない行
+    legacy_path = os.path.join(isolated_app.app.config['UPLOAD_FOLDER'], 'legacy.csv')
+    os.makedirs(os.path.dirname(legacy_path), exist_ok=True)
+    shutil.copy(SAMPLE, legacy_path)
+    db = isolated_app.connect_db()
+    db.execute(
+        'INSERT INTO experiments (device_name, sample_name, experiment_date, file_name, file_path) VALUES (?, ?, ?, ?, ?)',
+        ('MCR 302', 'CMC', '2025-04-21', 'legacy.csv', legacy_path))
+    db.commit()
+    db.close()
+    isolated_app.upgrade_ex_db()
+    assert [(row['file_path'], row['ref_count']) for row in blob_rows(isolated_app)] == [(legacy_path, 1)]
+
+    with open(SAMPLE, 'rb') as f:
+        assert upload(client, f.read()).status_code == 302
+    assert [(row['file_path'], row['ref_count']) for row in blob_rows(isolated_app)] == [(legacy_path, 2)]
+    objects = isolated_app.app.config['OBJECTS_FOLDER']
+    assert not any(files for _, _, files in os.walk(objects))
+
+def test_delete_releases_blob(isolated_app, client):
+    with open(SAMPLE, 'rb') as f:
+        data = f.read()
+    upload(client, data, 'a.csv')
+    upload(client, data, 'b.csv')
+    [blob] = blob_rows(isolated_app)
+    assert blob['ref_count'] == 2
+
+    db = isolated_app.connect_db()
+    first, second = [row['id'] for row in db.execute('SELECT id FROM experiments ORDER BY id')]
+    parsed_path = db.execute('SELECT parsed_path FROM experiments WHERE id = ?', (first,)).fetchone()[0]
+    db.close()
+
+    assert client.post(f'/data/{first}/delete').status_code == 302
+    assert [row['ref_count'] for row in blob_rows(isolated_app)] == [1]
+    assert os.path.exists(blob['file_path']) and os.path.exists(parsed_path)
+
+    # 最後の参照を削除すると、blobs の行・ファイル・サイドカーも削除する
+    client.post(f'/data/{second}/delete')
+    assert blob_rows(isolated_app) == []
+    assert not os.path.exists(blob['file_path'])
+    assert not os.path.exists(parsed_path)
+
+def test_delete_requires_login(isolated_app):
+    response = isolated_app.app.test_client().post('/data/1/delete')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# 一括登録 (bulk_import.py と app.run_bulk_import) の確認
+# 実際のレオメーターのエクスポート (uploads/20250421_CMC_1wt%_shiratsuji_01.csv) を一時データベースに登録する
+# リポジトリのルートで実行する: python -m pytest tests
+
+import io
+import os
+import sys
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import bulk_import
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uploads', '20250421_CMC_1wt%_shiratsuji_01.csv')
+
+def memory_source(name, data):
+    return bulk_import.Source(name, lambda: io.BytesIO(data), len(data))
+
+def run(web_app, sources, defaults, manifest=None):
+    with web_app.app.app_context():
+        return web_app.run_bulk_import(web_app.get_db(), sources, defaults, manifest)
+
+def test_date_prefix():
+    assert bulk_import.date_prefix('20250421_CMC_1wt%_shiratsuji_01') == datetime.date(2025, 4, 21)
+    assert bulk_import.date_prefix('20250421.csv') == datetime.date(2025, 4, 21)
+    assert bulk_import.date_prefix('202504211_CMC') is None
+    assert bulk_import.date_prefix('20251341_CMC') is None
+    assert bulk_import.date_prefix('CMC_20250421') is None
+    assert bulk_import.date_prefix(None) is None
+
+def test_date_from_test_name_and_file_name():
+    header = {'extra': {}, 'project': 'Shear_Viscosity', 'test': '20250421_CMC_1wt%_shiratsuji_01'}
+    values, sources, error = bulk_import.resolve_metadata(
+        'day/CMC.csv', header, {}, {'device_name': 'MCR', 'experiment_date': '2024-01-01'})
+    assert error is None
+    assert values['experiment_date'] == datetime.date(2025, 4, 21)
+    assert sources['experiment_date'] == 'header'
+
+    # ヘッダーにテスト名がなければファイル名から読む
+    values, sources, error = bulk_import.resolve_metadata(
+        'day/20250422_CMC.csv', {'extra': {}}, {}, {'device_name': 'MCR', 'sample_name': 'CMC'})
+    assert error is None
+    assert values['experiment_date'] == datetime.date(2025, 4, 22)
+    assert sources['experiment_date'] == 'file_name'
+
+def test_import_real_export(isolated_app):
+    outcomes, counts = run(isolated_app, bulk_import.path_sources([SAMPLE]), {'device_name': 'MCR 302'})
+    assert counts == {'imported': 1, 'skipped': 0, 'error': 0}, outcomes
+    outcome = outcomes[0]
+    assert outcome['experiment_date'] == datetime.date(2025, 4, 21)
+    assert outcome['sample_name'] == '20250421_CMC_1wt%_shiratsuji_01'
+    assert outcome['metadata_source'] == {'device_name': 'default', 'sample_name': 'header', 'experiment_date': 'header'}
+
+    db = isolated_app.connect_db()
+    try:
+        row = db.execute('SELECT * FROM experiments WHERE id = ?', (outcome['id'],)).fetchone()
+        assert row['experiment_date'] == '2025-04-21'
+        assert row['summary_json'] is not None
+        assert os.path.exists(row['file_path']) and os.path.exists(row['parsed_path'])
+        assert db.execute('SELECT ref_count FROM blobs WHERE content_hash = ?',
+                          (row['content_hash'],)).fetchone()[0] == 1
+        assert db.execute('SELECT COUNT(*) FROM measurement_zones WHERE experiment_id = ?',
+                          (outcome['id'],)).fetchone()[0] > 0
+    finally:
+        db.close()
+
+def test_failed_row_keeps_blob_used_by_another_row(isolated_app):
+    with open(SAMPLE, 'rb') as f:
+        data = f.read()
+    # 同じ内容の2ファイルのうち、先に処理される方だけ日付の指定が正しくない
+    sources = [memory_source('a.csv', data), memory_source('b.csv', data)]
+    manifest = {'a.csv': {'experiment_date': 'not a date'}}
+    outcomes, counts = run(isolated_app, sources, {'device_name': 'MCR 302'}, manifest)
+    assert [outcome['status'] for outcome in outcomes] == ['error', 'imported']
+
+    db = isolated_app.connect_db()
+    try:
+        row = db.execute('SELECT file_path, content_hash FROM experiments').fetchone()
+        assert os.path.exists(row['file_path'])
+        assert db.execute('SELECT ref_count FROM blobs WHERE content_hash = ?',
+                          (row['content_hash'],)).fetchone()[0] == 1
+    finally:
+        db.close()
+
+def test_failed_row_alone_leaves_no_blob(isolated_app):
+    outcomes, counts = run(isolated_app, [memory_source('x.csv', b'a,b\n1,2\n')], {})
+    assert counts['error'] == 1
+    objects = isolated_app.app.config['OBJECTS_FOLDER']
+    assert not any(files for _, _, files in os.walk(objects))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# コンパイル済みモデル (compiled_model.CompiledModel) が pkl のモデル (PickledModel) と同じ予測を返すことの確認
+# セルの表による評価と木をたどる評価の両方を、学習データの格子上の点 (分岐の境界になりやすい値) と乱数の点で比べる
+# リポジトリのルートで実行する: python -m pytest tests
+
+import os
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import compiled_model
+
+MODEL_DIR = os.path.join(ROOT, 'trained_models')
+PATHS = [os.path.join(MODEL_DIR, name) for name in ('lgbm_gp_model.pkl', 'lgbm_gpp_model.pkl', 'scaler.pkl')]
+
+pytest.importorskip('lightgbm')
+joblib = pytest.importorskip('joblib')
+if not all(os.path.exists(path) for path in PATHS):
+    pytest.skip("trained_models の pkl ファイルがありません ('run.py' で生成する)", allow_module_level=True)
+
+def inputs():
+    rng = np.random.default_rng(0)
+    # 学習データの Z (整数) と ωτe (対数等間隔) の格子、その中間の値、範囲外・NaN を含む行
+    z = np.concatenate([np.arange(1, 101), np.arange(1, 100) + 0.5, [0.0, -1.0, 150.0]])
+    omega = np.geomspace(1e-8, 1e4, 61)
+    grid = np.array(np.meshgrid(z, omega)).reshape(2, -1).T
+    random = np.column_stack([rng.uniform(0.5, 110, 5000), 10 ** rng.uniform(-9, 5, 5000)])
+    missing = np.array([[np.nan, 1.0], [10.0, np.nan], [np.nan, np.nan]])
+    return np.vstack([grid, random, missing])
+
+@pytest.fixture(scope='module')
+def pickled():
+    return compiled_model.PickledModel(*PATHS)
+
+def export(tmp_path, pickled):
+    path = str(tmp_path / compiled_model.COMPILED_MODEL_NAME)
+    compiled_model.export_models({'gp': pickled.gp_model, 'gpp': pickled.gpp_model}, pickled.scaler, path,
+                                 compiled_model.files_version(PATHS))
+    return compiled_model.CompiledModel(path)
+
+def assert_same(compiled, pickled, X):
+    for actual, expected in zip(compiled.predict(X), pickled.predict(X)):
+        # 木の出力の足し合わせの順序だけが異なるため、丸め誤差の範囲で一致する
+        np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-12)
+
+def test_cell_table_matches_pickled(tmp_path, pickled):
+    compiled = export(tmp_path, pickled)
+    assert compiled.format == compiled_model.FORMAT_VERSION
+    assert compiled.source_version == compiled_model.files_version(PATHS)
+    assert_same(compiled, pickled, inputs())
+
+def test_tree_walk_matches_pickled(tmp_path, pickled, monkeypatch):
+    # セルの表を作らない場合 (木が多く表が大きすぎる場合) の評価
+    monkeypatch.setattr(compiled_model, 'TABLE_MAX_CELLS', 0)
+    compiled = export(tmp_path, pickled)
+    assert all(trees.cell_values is None for trees in compiled.trees.values())
+    # 木をたどる評価は遅いため、点を間引いて比べる (NaN の行は残す)
+    X = inputs()
+    assert_same(compiled, pickled, np.vstack([X[:-3:7], X[-3:]]))
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# G_time_LM_fast (チャンク + 打ち切り + Euler–Maclaurin) が G_time_LM (全行列) と一致することの確認
+# リポジトリのルートで実行する: python -m pytest tests
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import generate_data
+
+TOLERANCE = 1e-12
+
+# t/τe の範囲: 短時間 (Rouse モードの和が支配的)・長時間 (管の緩和) と学習データと同じ全範囲
+T_RANGES = {
+    'small_t': np.geomspace(1e-10, 1e-4, 200),
+    'large_t': np.geomspace(1e0, 1e5, 200),
+    'full': np.geomspace(1e-10, 1e5, 300),
+}
+
+def relative_error(value, reference):
+    # 0 付近の点は全体の大きさを基準にした誤差で比べる (benchmarks/bench_g_time.py と同じ)
+    scale = np.maximum(np.abs(reference), 1e-12 * np.abs(reference).max())
+    return float(np.max(np.abs(value - reference) / scale))
+
+@pytest.mark.parametrize('t_range', sorted(T_RANGES))
+@pytest.mark.parametrize('Z', [1, 2, 10, 100])
+def test_integer_z(Z, t_range):
+    t_hat = T_RANGES[t_range]
+    assert relative_error(generate_data.G_time_LM_fast(t_hat, Z), generate_data.G_time_LM(t_hat, Z)) < TOLERANCE
+
+@pytest.mark.parametrize('t_range', sorted(T_RANGES))
+@pytest.mark.parametrize('Z', [0.5, 2.5, 37.3])
+def test_non_integer_z(Z, t_range):
+    t_hat = T_RANGES[t_range]
+    assert relative_error(generate_data.G_time_LM_fast(t_hat, Z), generate_data.G_time_LM(t_hat, Z)) < TOLERANCE
+
+@pytest.mark.parametrize('Z', [10, 37.3])
+def test_small_chunks(Z):
+    # チャンクの境界をまたぐ場合も結果は変わらない
+    t_hat = T_RANGES['full']
+    reference = generate_data.G_time_LM(t_hat, Z, Pmax2=20000)
+    fast = generate_data.G_time_LM_fast(t_hat, Z, Pmax2=20000, chunk_elems=1 << 12)
+    assert relative_error(fast, reference) < TOLERANCE
+
+def test_scalar_input():
+    assert generate_data.G_time_LM_fast(1e-3, 10).shape == (1,)
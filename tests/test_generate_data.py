@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# generate_data.py の学習データが、従来の逐次実行で作った learning_data_Z_1_to_100.csv と一致することの確認
+# tests/data/learning_data_baseline.csv はその CSV から Z = 1, 10, 50, 75, 100 の 100点おきの ωτe を抜き出したもの
+# リポジトリのルートで実行する: python -m pytest tests
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import generate_data
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'learning_data_baseline.csv')
+# 学習データの既定のグリッド (generate_data.py の引数の既定値)
+T_HAT = np.geomspace(1e-10, 1e5, 1500)
+OMEGA = np.geomspace(1e-12, 1e1, 1300)
+
+@pytest.fixture(scope='module')
+def baseline():
+    return pd.read_csv(BASELINE_PATH)
+
+def generated(baseline, Z, **kwargs):
+    rows = baseline[baseline['Z'] == Z]
+    result = generate_data.generate_Z(Z, T_HAT, OMEGA, **kwargs)
+    index = rows['omega_index'].to_numpy()
+    np.testing.assert_allclose(result['omega_tau_e'][index], rows['omega_tau_e'], rtol=1e-12)
+    return rows, result['Gp_over_Ge'][index], result['Gpp_over_Ge'][index]
+
+@pytest.mark.parametrize('Z', [1, 10, 50, 75, 100])
+def test_reference_sums_reproduce_baseline(baseline, Z):
+    # 従来と同じ G_time_LM + fit_maxwell は CSV の桁数 (有効数字15桁程度) の範囲で一致する
+    rows, gp, gpp = generated(baseline, Z, reference_sums=True)
+    np.testing.assert_allclose(gp, rows['Gp_over_Ge'], rtol=1e-10, atol=0)
+    np.testing.assert_allclose(gpp, rows['Gpp_over_Ge'], rtol=1e-10, atol=0)
+
+@pytest.mark.parametrize('Z', [1, 10, 50, 75, 100])
+def test_default_pipeline_close_to_baseline(baseline, Z):
+    # 既定の G_time_LM_fast は G(t) の丸め誤差 (1e-13 程度) がフィットで拡大し、大きなZで 2e-6 程度ずれる
+    rows, gp, gpp = generated(baseline, Z)
+    assert np.max(np.abs(gp - rows['Gp_over_Ge'])) < 1e-5
+    assert np.max(np.abs(gpp - rows['Gpp_over_Ge'])) < 1e-5
+
+@pytest.mark.parametrize('Z', [1, 10, 50])
+def test_qr_fit_matches_for_small_z(baseline, Z):
+    # --qr-fit は Z <= 50 では一致するが、大きなZでは別の解になる (Z = 100 で G'/Ge が最大 0.05 ずれる)
+    rows, gp, gpp = generated(baseline, Z, reference_sums=True, qr_fit=True)
+    assert np.max(np.abs(gp - rows['Gp_over_Ge'])) < 1e-9
+    assert np.max(np.abs(gpp - rows['Gpp_over_Ge'])) < 1e-9
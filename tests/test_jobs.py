@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# バックグラウンドジョブ (jobs.JobQueue) の再利用・キャンセル・heartbeat による中断の扱いの確認
+# リポジトリのルートで実行する: python -m pytest tests
+
+import os
+import sys
+import sqlite3
+import threading
+import time
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import jobs
+
+@pytest.fixture
+def connect(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+
+    def connect():
+        db = sqlite3.connect(path, timeout=10)
+        db.row_factory = sqlite3.Row
+        return db
+
+    db = connect()
+    with open(os.path.join(ROOT, 'schema_jobs.sql'), encoding='utf-8') as f:
+        db.executescript(f.read())
+    db.close()
+    return connect
+
+def wait_for(queue, job_id, statuses=jobs.FINISHED_STATUSES, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"ジョブ {job_id} が {statuses} になりませんでした: {queue.get(job_id)['status']}")
+
+def test_done_job_is_reused_by_cache_key(connect):
+    calls = []
+    queue = jobs.JobQueue(connect)
+    queue.register('echo', lambda params, check_cancelled: calls.append(params) or {'x': params['x']})
+
+    job_id, reused = queue.submit('echo', {'x': 1}, cache_key='k1')
+    assert not reused
+    assert wait_for(queue, job_id)['result'] == {'x': 1}
+
+    again, reused = queue.submit('echo', {'x': 1}, cache_key='k1')
+    assert (again, reused) == (job_id, True)
+    other, reused = queue.submit('echo', {'x': 2}, cache_key='k2')
+    assert not reused and other != job_id
+    wait_for(queue, other)
+    assert calls == [{'x': 1}, {'x': 2}]
+
+def test_cancel_from_another_process_stops_running_job(connect):
+    started = threading.Event()
+
+    def handler(params, check_cancelled):
+        started.set()
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    worker = jobs.JobQueue(connect)
+    worker.register('loop', handler)
+    job_id, _ = worker.submit('loop', {}, cache_key='loop')
+    assert started.wait(5)
+
+    # 別のワーカープロセスに相当する、同じデータベースを使う別の JobQueue からキャンセルする
+    other = jobs.JobQueue(connect)
+    assert other.cancel(job_id) == jobs.RUNNING
+    job = wait_for(worker, job_id)
+    assert job['status'] == jobs.CANCELLED
+    assert job['cancel_requested']
+
+    # キャンセルされたジョブは同じ cache_key でも再利用しない
+    worker.register('loop', lambda params, check_cancelled: 'ok')
+    again, reused = worker.submit('loop', {}, cache_key='loop')
+    assert not reused and again != job_id
+
+def test_stale_jobs_are_not_reused_or_counted(connect):
+    # heartbeat_at の古い実行中のジョブ (異常終了したプロセスのもの) を作る
+    db = connect()
+    db.execute(
+        'INSERT INTO jobs (id, kind, params_json, cache_key, status, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?)',
+        ('dead', 'echo', '{}', 'k', jobs.RUNNING, time.time() - 3600)
+    )
+    db.commit()
+    db.close()
+
+    queue = jobs.JobQueue(connect, max_pending=1)
+    queue.register('echo', lambda params, check_cancelled: 'ok')
+    job_id, reused = queue.submit('echo', {}, cache_key='k')
+    assert not reused and job_id != 'dead'
+    assert queue.get('dead')['status'] == jobs.FAILED
+    assert wait_for(queue, job_id)['result'] == 'ok'
+
+def test_heartbeat_keeps_running_job_alive(connect):
+    release = threading.Event()
+    queue = jobs.JobQueue(connect, heartbeat_seconds=0.05, stale_seconds=0.5)
+    queue.register('wait', lambda params, check_cancelled: release.wait(5) and 'ok')
+    job_id, _ = queue.submit('wait', {})
+    time.sleep(1.0)
+    assert queue.get(job_id)['status'] == jobs.RUNNING
+    release.set()
+    assert wait_for(queue, job_id)['status'] == jobs.DONE
+
+def test_queue_full(connect):
+    release = threading.Event()
+    queue = jobs.JobQueue(connect, max_workers=1, max_pending=1)
+    queue.register('wait', lambda params, check_cancelled: release.wait(5) and 'ok')
+    job_id, _ = queue.submit('wait', {})
+    with pytest.raises(jobs.QueueFull):
+        queue.submit('wait', {'n': 2})
+    release.set()
+    wait_for(queue, job_id)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# 測定データの中身による検索 (measurement_query.py と /api/query) の条件・ゾーンマップによる除外・走査の確認
+# リポジトリのルートで実行する: python -m pytest tests
+
+import io
+import os
+import sys
+import math
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import measurement_query
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'uploads', '20250421_CMC_1wt%_shiratsuji_01.csv')
+
+def test_parse_predicates():
+    predicates = measurement_query.parse_predicates({
+        'せん断速度': {'min': 90, 'max': 110},
+        'Viscosity': [None, 80],
+        'shear_rate': {'min': 100},
+    })
+    # 列名は正規化し、同じ列の条件は範囲の共通部分にする
+    assert predicates == [('shear_rate', 100.0, 110.0), ('viscosity', -math.inf, 80.0)]
+
+    for where in (None, {}, {'粘度': {'min': 2, 'max': 1}}, {'粘度': {'low': 1}},
+                  {'粘度': [1, 2, 3]}, {'粘度': {'min': float('nan')}}, {'粘度': {'min': True}}):
+        with pytest.raises(ValueError):
+            measurement_query.parse_predicates(where)
+
+def test_pushdown_clause_keeps_overlapping_zones_only():
+    db = sqlite3.connect(':memory:')
+    db.execute('CREATE TABLE experiments (id INTEGER PRIMARY KEY, summary_json TEXT)')
+    db.execute('CREATE TABLE measurement_zones (experiment_id, column_name, min_value, max_value, n_values)')
+    db.executemany('INSERT INTO experiments VALUES (?, ?)', [(1, '{}'), (2, '{}'), (3, None)])
+    db.executemany('INSERT INTO measurement_zones VALUES (?, ?, ?, ?, 10)', [
+        (1, 'shear_rate', 1, 300), (1, 'viscosity', 58, 92),
+        (2, 'shear_rate', 500, 1000), (2, 'viscosity', 1, 5),
+    ])
+
+    def matching(where):
+        clause, params = measurement_query.pushdown_clause(measurement_query.parse_predicates(where))
+        return [row[0] for row in db.execute(f'SELECT id FROM experiments WHERE {clause} ORDER BY id', params)]
+
+    # 要約統計のない行 (3) はゾーンマップがないため、常に走査の対象に残す
+    assert matching({'shear_rate': [90, 110]}) == [1, 3]
+    assert matching({'shear_rate': {'min': 400}}) == [2, 3]
+    assert matching({'shear_rate': [90, 110], 'viscosity': {'max': 10}}) == [3]
+    # ゾーンマップにない列の条件では除外される
+    assert matching({'torque': {'min': 0}}) == [3]
+
+def test_scan_frame_matches_rows_in_file_units():
+    df = pd.DataFrame({'インターバル': [1, 1, 2, 2], 'せん断速度': [1.0, 100.0, 100.0, np.nan],
+                       '粘度': [90.0, 70.0, 85.0, 60.0], 'ステータス': ['a', 'b', 'c', 'd']})
+    df.attrs['units'] = {'せん断速度': '1/s', '粘度': 'mPa·s'}
+    predicates = measurement_query.parse_predicates({'shear_rate': [90, 110], 'viscosity': {'min': 80}})
+    result = measurement_query.scan_frame(df, predicates, columns=['status'])
+    assert result['n_rows'] == 4 and result['matched_rows'] == 1
+    assert result['rows'] == {'インターバル': [2], 'せん断速度': [100.0], '粘度': [85.0], 'ステータス': ['c']}
+    assert result['units'] == {'せん断速度': '1/s', '粘度': 'mPa·s'}
+
+    missing = measurement_query.scan_frame(df, measurement_query.parse_predicates({'torque': [0, 1]}))
+    assert missing['matched_rows'] == 0
+
+def test_api_query_skips_files_by_zone_map(client):
+    with open(SAMPLE, 'rb') as f:
+        data = f.read()
+    response = client.post('/upload', data={
+        'experiment_device': 'MCR 302', 'sample_name': 'CMC', 'experiment_date': '2025-04-21',
+        'file': (io.BytesIO(data), 'sample.csv'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+
+    # 粘度の範囲 (58.5〜92.3 mPa·s) の中の条件は走査し、外の条件はファイルを読まずに除外する
+    hit = client.post('/api/query', json={'where': {'shear_rate': [80, 90], 'viscosity': {'min': 50}}}).get_json()
+    assert hit['files'] == {'experiments': 1, 'skipped': 0, 'scanned': 1, 'failed': 0, 'matched': 1}
+    assert hit['results'][0]['matched_rows'] == 2
+    assert hit['results'][0]['rows']['せん断速度'] == [84.4, 84.4]
+
+    miss = client.post('/api/query', json={'where': {'viscosity': {'min': 1000}}}).get_json()
+    assert miss['files'] == {'experiments': 1, 'skipped': 1, 'scanned': 0, 'failed': 0, 'matched': 0}
+
+    assert client.post('/api/query', json={'where': {}}).status_code == 400
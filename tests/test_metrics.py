@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# /metrics の認証 (ログイン、または METRICS_TOKEN の Bearer トークン) の確認
+# リポジトリのルートで実行する: python -m pytest tests
+
+def test_metrics_requires_login_without_token(isolated_app, monkeypatch):
+    monkeypatch.setitem(isolated_app.app.config, 'METRICS_TOKEN', None)
+    response = isolated_app.app.test_client().get('/metrics')
+    assert response.status_code == 401
+
+def test_metrics_for_logged_in_user(client, isolated_app, monkeypatch):
+    monkeypatch.setitem(isolated_app.app.config, 'METRICS_TOKEN', None)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+def test_metrics_with_token(isolated_app, monkeypatch):
+    monkeypatch.setitem(isolated_app.app.config, 'METRICS_TOKEN', 'secret')
+    anonymous = isolated_app.app.test_client()
+    assert anonymous.get('/metrics').status_code == 401
+    assert anonymous.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert anonymous.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
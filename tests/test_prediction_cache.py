@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# 予測キャッシュ (prediction_cache.PredictionCache) の量子化・LRU・ディスク層・大きなバッチの扱いの確認
+# リポジトリのルートで実行する: python -m pytest tests
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from prediction_cache import PredictionCache, quantize
+
+class CountingModel:
+    """compute(z, omega) for the cache that records the inputs of every call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, z, omega):
+        self.calls.append((np.array(z), np.array(omega)))
+        return z * 10.0 + omega, z - omega
+
+def test_quantize_merges_float_noise():
+    values = np.array([0.1, 0.1 + 1e-17, 0.1 * (1 + 1e-14)])
+    quantized = quantize(values)
+    assert quantized[0] == quantized[1] == quantized[2]
+    # 量子化の幅 (2^-40 程度) より離れた値は区別する
+    assert quantize(0.1) != quantize(0.1 * (1 + 1e-10))
+
+def test_duplicates_are_computed_once_and_cached():
+    cache = PredictionCache()
+    model = CountingModel()
+    z = np.array([1.0, 2.0, 1.0, 2.0, 3.0])
+    omega = np.array([0.5, 0.5, 0.5, 0.5, 0.5])
+    gp, gpp = cache.get_or_compute('v1', z, omega, model)
+    np.testing.assert_array_equal(gp, z * 10.0 + omega)
+    np.testing.assert_array_equal(gpp, z - omega)
+    assert len(model.calls) == 1 and model.calls[0][0].size == 3
+
+    gp_again, _ = cache.get_or_compute('v1', z, omega, model)
+    np.testing.assert_array_equal(gp_again, gp)
+    assert len(model.calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (5, 5, 3)
+
+def test_model_version_is_part_of_the_key():
+    cache = PredictionCache()
+    model = CountingModel()
+    cache.get_or_compute('v1', np.array([1.0]), np.array([0.5]), model)
+    cache.get_or_compute('v2', np.array([1.0]), np.array([0.5]), model)
+    assert len(model.calls) == 2
+
+def test_lru_evicts_oldest_entries():
+    cache = PredictionCache(max_entries=3)
+    model = CountingModel()
+    cache.get_or_compute('v1', np.array([1.0, 2.0, 3.0]), np.full(3, 0.5), model)
+    # 1 を使ってから 4 を追加すると、最も古い 2 が追い出される
+    cache.get_or_compute('v1', np.array([1.0]), np.array([0.5]), model)
+    cache.get_or_compute('v1', np.array([4.0]), np.array([0.5]), model)
+    cache.get_or_compute('v1', np.array([1.0, 2.0]), np.full(2, 0.5), model)
+    np.testing.assert_array_equal(model.calls[-1][0], [2.0])
+    assert cache.stats()['evictions'] == 2
+
+def test_large_batches_bypass_the_cache():
+    cache = PredictionCache(max_batch_keys=4)
+    model = CountingModel()
+    cache.get_or_compute('v1', np.array([1.0]), np.array([0.5]), model)
+    z = np.arange(1.0, 11.0).repeat(2)
+    gp, _ = cache.get_or_compute('v1', z, np.full(z.size, 0.5), model)
+    np.testing.assert_array_equal(gp, z * 10.0 + 0.5)
+    # 重複を除いた10点をまとめて1回計算し、既存のエントリは追い出さない
+    assert model.calls[-1][0].size == 10
+    stats = cache.stats()
+    assert (stats['entries'], stats['bypassed']) == (1, 20)
+
+def test_disk_tier_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / 'predictions.sqlite')
+    model = CountingModel()
+    PredictionCache(disk_path=path).get_or_compute('v1', np.array([1.0, 2.0]), np.full(2, 0.5), model)
+    other = PredictionCache(disk_path=path)
+    gp, _ = other.get_or_compute('v1', np.array([2.0, 1.0, 3.0]), np.full(3, 0.5), model)
+    np.testing.assert_array_equal(gp, [20.5, 10.5, 30.5])
+    np.testing.assert_array_equal(model.calls[-1][0], [3.0])
+    assert other.stats()['disk_hits'] == 2
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# 実験データ一覧の検索 (3文字以上は全文検索 experiments_fts、短い語は LIKE) とページ送りの確認
+# リポジトリのルートで実行する: python -m pytest tests
+
+import pytest
+
+ROWS = [
+    ('MCR 302', 'CMC 1wt%'),
+    ('MCR 302', 'CMC 2wt%'),
+    ('MCR 502', 'PEO "A" 0.5wt%'),
+    ('HAAKE', 'xanthan'),
+]
+
+@pytest.fixture
+def populated(isolated_app):
+    db = isolated_app.connect_db()
+    db.executemany(
+        "INSERT INTO experiments (device_name, sample_name, experiment_date, file_name, file_path) "
+        "VALUES (?, ?, '2025-04-21', 'f.csv', 'f.csv')", ROWS)
+    db.commit()
+    db.close()
+    return isolated_app
+
+def search(web_app, device='', sample='', page_size=50, cursor=None):
+    db = web_app.connect_db()
+    try:
+        page = web_app.query_experiment_page(db, device, sample, cursor, page_size)
+        rows = [(row['device_name'], row['sample_name']) for row in page]
+        return rows, page.next_cursor
+    finally:
+        db.close()
+
+def test_search_clause_uses_fts_for_long_terms_and_like_for_short(isolated_app):
+    where, params = isolated_app.experiment_search_clause('MCR', 'wt')
+    assert 'experiments_fts MATCH ?' in where and 'sample_name LIKE ?' in where
+    assert params == ['device_name : "MCR"', '%wt%']
+    assert isolated_app.experiment_search_clause() == ('1=1', [])
+
+def test_fts_and_like_search(populated):
+    rows, _ = search(populated, device='MCR')
+    assert sorted(rows) == sorted(ROWS[:3])
+    # 部分一致 (trigram) と大文字・小文字の区別なし
+    assert search(populated, sample='anth')[0] == [ROWS[3]]
+    assert search(populated, device='mcr 5')[0] == [ROWS[2]]
+    # 2文字以下は LIKE で絞り込む
+    assert sorted(search(populated, sample='2w')[0]) == [ROWS[1]]
+    # 検索語の二重引用符は FTS の構文として解釈しない
+    assert search(populated, sample='"A"')[0] == [ROWS[2]]
+    assert sorted(search(populated, device='MCR 302', sample='wt')[0]) == sorted(ROWS[:2])
+    assert search(populated, device='zzz')[0] == []
+
+def test_fts_follows_updates_and_deletes(populated):
+    db = populated.connect_db()
+    db.execute("UPDATE experiments SET sample_name = 'guar gum' WHERE sample_name = 'xanthan'")
+    db.execute("DELETE FROM experiments WHERE sample_name = 'CMC 2wt%'")
+    db.commit()
+    db.close()
+    assert search(populated, sample='xanthan')[0] == []
+    assert search(populated, sample='guar')[0] == [('HAAKE', 'guar gum')]
+    assert search(populated, sample='CMC')[0] == [ROWS[0]]
+
+def test_cursor_pagination(populated):
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = search(populated, page_size=3, cursor=cursor)
+        seen += rows
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(ROWS)
+    with pytest.raises(ValueError):
+        search(populated, cursor='not-a-cursor')